@@ -0,0 +1,74 @@
+import os
+import wave
+
+import numpy as np
+
+# 口パクアニメーションのフレームレート
+ANIMATION_FPS = 20
+
+# VOICEVOXの母音ごとの口の開き具合
+VOWEL_OPENNESS = {
+    "a": 1.0, "o": 0.9, "e": 0.7, "i": 0.5, "u": 0.5,
+    "A": 0.5, "I": 0.3, "U": 0.3, "E": 0.4, "O": 0.5,  # 無声化母音
+    "N": 0.2, "cl": 0.0, "pau": 0.0,
+}
+
+
+def envelope_cache_path(wav_path, fps=ANIMATION_FPS):
+    return f"{os.path.splitext(wav_path)[0]}.env{fps}.npy"
+
+
+def compute_envelope(wav_path, fps=ANIMATION_FPS):
+    """WAVをフレームごとのRMS振幅（0〜1）に変換する"""
+    with wave.open(wav_path, "rb") as wf:
+        channels = wf.getnchannels()
+        sample_width = wf.getsampwidth()
+        rate = wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    if sample_width != 2:
+        raise ValueError(f"16bit PCMのみ対応しています: {wav_path}")
+    samples = np.frombuffer(raw, dtype=np.int16).astype(np.float32)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    frame_size = max(1, rate // fps)
+    frame_count = -(-len(samples) // frame_size)
+    padded = np.zeros(frame_count * frame_size, dtype=np.float32)
+    padded[:len(samples)] = samples
+    rms = np.sqrt(np.mean(padded.reshape(frame_count, frame_size) ** 2, axis=1))
+    peak = rms.max() if frame_count else 0.0
+    return (rms / peak if peak > 0 else rms).astype(np.float32)
+
+
+def envelope_from_query(query, fps=ANIMATION_FPS):
+    """VOICEVOXのaudio_queryのモーラ長から口の開きを見積もる（WAVを読まずに済む）"""
+    speed = query.get("speedScale", 1.0) or 1.0
+    segments = [(query.get("prePhonemeLength", 0.1), 0.0)]
+    for phrase in query.get("accent_phrases", []):
+        moras = list(phrase.get("moras", []))
+        if phrase.get("pause_mora"):
+            moras.append(phrase["pause_mora"])
+        for mora in moras:
+            if mora.get("consonant_length"):
+                segments.append((mora["consonant_length"], 0.3))
+            segments.append((mora.get("vowel_length", 0.0), VOWEL_OPENNESS.get(mora.get("vowel"), 0.6)))
+    segments.append((query.get("postPhonemeLength", 0.1), 0.0))
+
+    durations = np.array([d for d, _ in segments], dtype=np.float64) / speed
+    levels = np.array([v for _, v in segments], dtype=np.float32)
+    ends = np.cumsum(durations)
+    frame_times = (np.arange(int(np.ceil(ends[-1] * fps))) + 0.5) / fps
+    return levels[np.minimum(np.searchsorted(ends, frame_times), len(levels) - 1)]
+
+
+def save_envelope(wav_path, envelope, fps=ANIMATION_FPS):
+    np.save(envelope_cache_path(wav_path, fps), envelope.astype(np.float32))
+
+
+def load_envelope(wav_path, fps=ANIMATION_FPS):
+    """キャッシュ済みのエンベロープを読む。なければWAVから計算して保存する"""
+    cache_path = envelope_cache_path(wav_path, fps)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(wav_path):
+        return np.load(cache_path)
+    envelope = compute_envelope(wav_path, fps)
+    save_envelope(wav_path, envelope, fps)
+    return envelope
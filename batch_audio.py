@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from voicevox_api import clear_skit_audio, parse_skit_dialogue, save_line_audio, write_skit_info
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_AUDIO_ROOT = os.path.join(SCRIPT_DIR, "skit_audio")
+BATCH_WORKERS = 8
+# 回収前に先行して投入するセリフ数（ワーカー1つあたり）。合成済みのWAVがメモリにたまり続けないように
+PREFETCH_PER_WORKER = 4
+
+
+def skit_audio_dir(skit_id, root=BATCH_AUDIO_ROOT):
+    return os.path.join(root, str(skit_id))
+
+
+class BatchAudioGenerator:
+    """保存済みトークの音声をまとめて生成する
+
+    全トークの全セリフを1つのスレッドプールに流し、同じ (キャラ, セリフ) の合成は1回にまとめる。
+    投入は回収位置からワーカー数×PREFETCH_PER_WORKER件先までにとどめ、回収し終えたセリフの
+    Future（WAVのバイト列）はキャッシュから外す。
+    """
+
+    def __init__(self, voicevox, db, output_root=BATCH_AUDIO_ROOT, workers=BATCH_WORKERS):
+        self.voicevox = voicevox
+        self.db = db
+        self.output_root = output_root
+        self.workers = workers
+        self.cache = {}
+        # まだ回収していない使用回数（0になったらcacheから外す）
+        self.pending_uses = Counter()
+        self.cache_lock = threading.Lock()
+        self.cache_hits = 0
+
+    def _synthesize(self, executor, character, text):
+        """同じセリフの合成Futureを共有する"""
+        key = (character, text)
+        with self.cache_lock:
+            future = self.cache.get(key)
+            if future is None:
+                future = executor.submit(self.voicevox.text_to_speech, text, character)
+                self.cache[key] = future
+            else:
+                self.cache_hits += 1
+        return future
+
+    def _take(self, character, text):
+        """合成結果を待って受け取る。このセリフの最後の使用ならキャッシュから外す"""
+        key = (character, text)
+        with self.cache_lock:
+            future = self.cache[key]
+            self.pending_uses[key] -= 1
+            if self.pending_uses[key] <= 0:
+                del self.cache[key]
+                del self.pending_uses[key]
+        return future.result()
+
+    def generate(self, skit_ids, default_mapping=None, progress=None):
+        """skit_idsの音声を生成し、結果を {skit_id: {...}} で返す
+
+        progress(done, total) はワーカースレッドから呼ばれる。
+        """
+        default_mapping = default_mapping or {}
+        jobs = []
+        for skit_id in skit_ids:
+            skit = self.db.get_skit(skit_id)
+            if not skit:
+                continue
+            mapping = {
+                "A": skit['char_a'] or default_mapping.get("A"),
+                "B": skit['char_b'] or default_mapping.get("B"),
+            }
+            jobs.append((skit_id, parse_skit_dialogue(skit['content'], mapping, self.voicevox.catalog)))
+
+        lines = [(character, text) for _, dialogue in jobs for _, character, text in dialogue]
+        total = len(lines)
+        with self.cache_lock:
+            self.pending_uses.update(lines)
+        prefetch = self.workers * PREFETCH_PER_WORKER
+        submitted = 0
+        done = 0
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # 回収位置より prefetch 件先まで投入しておき、トークごとに順に回収する
+            for skit_id, dialogue in jobs:
+                output_dir = skit_audio_dir(skit_id, self.output_root)
+                clear_skit_audio(output_dir)
+                self.db.set_skit_audio(skit_id, output_dir, 'running')
+                audio_files = []
+                error = None
+                for _, character, text in dialogue:
+                    while submitted < min(done + prefetch, total):
+                        self._synthesize(executor, *lines[submitted])
+                        submitted += 1
+                    result = self._take(character, text)
+                    done += 1
+                    if progress:
+                        progress(done, total)
+                    if not result["success"]:
+                        error = error or f"{character}「{text[:20]}」: {result['error']}"
+                        continue
+                    audio_files.append(save_line_audio(output_dir, len(audio_files), character, text, result))
+                write_skit_info(output_dir, audio_files)
+                status = 'done' if error is None else 'error'
+                self.db.set_skit_audio(skit_id, output_dir, status, error, len(audio_files))
+                results[skit_id] = {'status': status, 'output_dir': output_dir, 'files': len(audio_files), 'error': error}
+        return results
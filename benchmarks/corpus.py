@@ -0,0 +1,217 @@
+"""規模検証用の合成コーパスを作る
+
+authors / videos / transcripts / analyses / generated_skits（と字幕の整形版、重複検出用のMinHash、Geminiの呼び出し記録）を、
+実データに近い文字数の日本語っぽい合成テキストで埋める。投入はBATCH_SIZE件ずつのトランザクションでexecutemanyする。
+
+    python benchmarks/corpus.py corpus_100k.db --videos 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from dedupe import band_hashes, minhash
+from transcript_cleaner import clean_transcript
+
+from fakes import WORDS, make_sentence, make_skit
+
+# 1件あたりの目安の文字数（10分前後の動画の字幕、Geminiの分析結果、ショートコント）
+TRANSCRIPT_CHARS = 4000
+ANALYSIS_CHARS = 1500
+VIDEOS_PER_AUTHOR = 20
+SKITS_PER_AUTHOR = 5
+BATCH_SIZE = 5000
+
+# 字幕のうち自動生成字幕の割合（残りは手動字幕）
+GENERATED_TRACK_RATE = 0.7
+# コントのうち、同じ作者の直前のコントをほぼそのまま使い回したもの（重複検出の候補ペアを作る）の割合
+NEAR_DUPLICATE_RATE = 0.1
+
+
+def make_text(rng, chars, separator="\n"):
+    """おおよそchars文字になるまで文をつなげる（±30%でばらつかせる）"""
+    target = int(chars * rng.uniform(0.7, 1.3))
+    parts = []
+    length = 0
+    while length < target:
+        sentence = make_sentence(rng)
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return separator.join(parts)
+
+
+def make_analysis(rng, chars=ANALYSIS_CHARS):
+    headings = ["擦り続けている概念/言葉", "ボケのパターン", "ツッコミのパターン", "構造", "このコンテンツの公式"]
+    per_section = chars // len(headings)
+    return "\n\n".join(f"## {i + 1}. {h}\n{make_text(rng, per_section, '')}" for i, h in enumerate(headings))
+
+
+def make_minhash(text):
+    """dedupe.py と同じMinHash署名（保存する形のバイト列）とバンドのハッシュ"""
+    signature = minhash(text)
+    return signature.tobytes(), band_hashes(signature)
+
+
+def make_transcript(rng, video_id, chars=TRANSCRIPT_CHARS):
+    """アプリが保存するのと同じ形の字幕の行（add_transcript と同じく整形版と文字数も入れる）"""
+    content = make_text(rng, chars)
+    track = "generated" if rng.random() < GENERATED_TRACK_RATE else "manual"
+    cleaned = clean_transcript(content, track)
+    return video_id, content, "ja", track, cleaned['text'], cleaned['original_chars'], cleaned['cleaned_chars']
+
+
+def minhash_rows(table, rows):
+    """(行ID, 本文) から minhash_signatures と lsh_buckets に入れる行を作る"""
+    signatures = []
+    buckets = []
+    for row_id, content in rows:
+        signature, bands = make_minhash(content)
+        signatures.append((table, row_id, signature))
+        buckets.extend((table, band, bucket, row_id) for band, bucket in enumerate(bands))
+    return signatures, buckets
+
+
+def insert_minhash(conn, signatures, buckets):
+    conn.executemany("INSERT OR REPLACE INTO minhash_signatures (source_table, row_id, signature) VALUES (?, ?, ?)", signatures)
+    conn.executemany("INSERT INTO lsh_buckets (source_table, band, bucket, row_id) VALUES (?, ?, ?, ?)", buckets)
+
+
+def make_near_duplicate(rng, skit):
+    """タイトルを変え、1行だけ語尾を足したコント（署名の類似度が重複の閾値を超える程度の違い）"""
+    lines = skit.split("\n")
+    lines[0] = f"タイトル: {rng.choice(WORDS)}"
+    n = rng.randrange(2, len(lines))
+    lines[n] += "（笑）"
+    return "\n".join(lines)
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_corpus(db, videos, videos_per_author=VIDEOS_PER_AUTHOR, skits_per_author=SKITS_PER_AUTHOR,
+                    transcript_chars=TRANSCRIPT_CHARS, analysis_chars=ANALYSIS_CHARS, seed=0, progress=None):
+    """dbに合成データを投入して件数を返す（既存データには追記）"""
+    rng = random.Random(seed)
+    conn = db.conn
+    author_count = max(1, videos // videos_per_author)
+    base_time = datetime(2024, 1, 1)
+
+    def timestamp(i, total):
+        # 作成日時を2年間に散らす（ORDER BY created_at を現実的にするため）
+        return (base_time + timedelta(seconds=int(i / max(1, total) * 2 * 365 * 86400) + rng.randint(0, 3600))).strftime("%Y-%m-%d %H:%M:%S")
+
+    with conn:
+        first_author = conn.execute("SELECT COALESCE(MAX(id), 0) FROM authors").fetchone()[0] + 1
+        conn.executemany("INSERT INTO authors (name, channel_url) VALUES (?, ?)", (
+            (f"合成作者{seed}_{first_author + i:06d}", f"https://www.youtube.com/@synthetic{first_author + i}")
+            for i in range(author_count)))
+    author_ids = [row[0] for row in conn.execute("SELECT id FROM authors WHERE id >= ? ORDER BY id", (first_author,))]
+
+    first_video = conn.execute("SELECT COALESCE(MAX(id), 0) FROM videos").fetchone()[0] + 1
+    video_rows = ((f"syn{seed}_{first_video + i:09d}", make_sentence(rng), None, rng.choice(author_ids), timestamp(i, videos))
+                  for i in range(videos))
+    for batch in _batches(video_rows):
+        with conn:
+            conn.executemany("INSERT INTO videos (video_id, title, url, author_id, created_at) VALUES (?, ?, ?, ?, ?)", batch)
+        if progress:
+            progress("videos", len(batch))
+    video_ids = [row[0] for row in conn.execute("SELECT id FROM videos WHERE id >= ? ORDER BY id", (first_video,))]
+
+    # 整形版と重複検出の署名も作る（アプリで保存した後と同じ状態にする）
+    for batch in _batches(make_transcript(rng, video_id, transcript_chars) for video_id in video_ids):
+        signatures, buckets = minhash_rows("transcripts", ((row[0], row[1]) for row in batch))
+        with conn:
+            conn.executemany("INSERT INTO transcripts (video_id, content, language, track, cleaned_content, original_chars, cleaned_chars) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            insert_minhash(conn, signatures, buckets)
+        if progress:
+            progress("transcripts", len(batch))
+
+    for batch in _batches((video_id, make_analysis(rng, analysis_chars)) for video_id in video_ids):
+        with conn:
+            conn.executemany("INSERT INTO analyses (video_id, raw_analysis) VALUES (?, ?)", batch)
+        if progress:
+            progress("analyses", len(batch))
+
+    with conn:
+        conn.executemany("INSERT INTO author_patterns (author_id, common_patterns, analysis_summary) VALUES (?, ?, ?)",
+                         ((author_id, "", make_analysis(rng, analysis_chars)) for author_id in author_ids))
+
+    def skits(author_id):
+        previous = None
+        for _ in range(skits_per_author):
+            if previous and rng.random() < NEAR_DUPLICATE_RATE:
+                content = make_near_duplicate(rng, previous)
+            else:
+                content = previous = make_skit(rng, rng.randint(6, 16))
+            yield author_id, make_sentence(rng, 1, 3), content, None, "ずんだもん", "四国めたん"
+
+    skit_rows = (row for author_id in author_ids for row in skits(author_id))
+    skit_count = 0
+    for batch in _batches(skit_rows):
+        with conn:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM generated_skits").fetchone()[0]
+            conn.executemany("INSERT INTO generated_skits (author_id, title, content, theme, char_a, char_b) VALUES (?, ?, ?, ?, ?, ?)", batch)
+            rows = conn.execute("SELECT id, content FROM generated_skits WHERE id > ? ORDER BY id", (last_id,)).fetchall()
+            insert_minhash(conn, *minhash_rows("generated_skits", rows))
+        skit_count += len(batch)
+        if progress:
+            progress("generated_skits", len(batch))
+
+    # Geminiの呼び出し記録（動画ごとの分析、作者ごとのパターン分析とコント生成）
+    def llm_call(operation, author_id, prompt_chars, output_chars):
+        return (operation, author_id, "gemini-2.5-flash", prompt_chars + rng.randint(0, 500),
+                prompt_chars // 2, output_chars // 2, rng.uniform(1.0, 20.0))
+
+    call_rows = [llm_call("analysis", author_id, transcript_chars, analysis_chars)
+                 for (author_id,) in conn.execute("SELECT author_id FROM videos WHERE id >= ? ORDER BY id", (first_video,))]
+    call_rows += [llm_call("author_pattern", author_id, analysis_chars * videos_per_author, analysis_chars) for author_id in author_ids]
+    call_rows += [llm_call("generate_skit", author_id, transcript_chars * 5, 600)
+                  for author_id in author_ids for _ in range(skits_per_author)]
+    for batch in _batches(call_rows):
+        with conn:
+            conn.executemany("INSERT INTO llm_calls (operation, author_id, model, prompt_chars, prompt_tokens, output_tokens, latency) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        if progress:
+            progress("llm_calls", len(batch))
+
+    return {"authors": len(author_ids), "videos": len(video_ids), "transcripts": len(video_ids),
+            "analyses": len(video_ids), "generated_skits": skit_count, "llm_calls": len(call_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成コーパスでDBを埋める")
+    parser.add_argument("path", help="作成するSQLiteファイル")
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--videos-per-author", type=int, default=VIDEOS_PER_AUTHOR)
+    parser.add_argument("--skits-per-author", type=int, default=SKITS_PER_AUTHOR)
+    parser.add_argument("--transcript-chars", type=int, default=TRANSCRIPT_CHARS)
+    parser.add_argument("--analysis-chars", type=int, default=ANALYSIS_CHARS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    db = Database(args.path)
+    counts = generate_corpus(db, args.videos, args.videos_per_author, args.skits_per_author,
+                             args.transcript_chars, args.analysis_chars, args.seed,
+                             progress=lambda table, n: print(f"  {table}: +{n}", flush=True))
+    db.close()
+    size_mb = os.path.getsize(args.path) / 1024 / 1024
+    print(f"完了: {counts}（{time.perf_counter() - start:.1f}秒, {size_mb:.1f}MB）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Database の全公開メソッドを合成コーパス上で計測する
+
+規模ごとに corpus.py でDBを作り（--keep-dir を指定すると再利用）、各メソッドを代表的な引数で繰り返し呼ぶ。
+書き込み系も同じDBで計測するため、DBは計測用の使い捨てとして扱う。
+
+    python benchmarks/db_bench.py --sizes 1000,10000,100000 --output db.json
+    python benchmarks/db_bench.py --sizes 1000,10000,100000 --compare db.json
+"""
+import argparse
+import inspect
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+import prompts
+
+from corpus import generate_corpus, make_analysis, make_minhash, make_text
+from fakes import make_skit
+import report
+
+# 全件を読むメソッドは大規模だと1回が長いので回数を減らす
+DEFAULT_REPEAT = 200
+FULL_SCAN_REPEAT = 3
+FULL_SCAN_METHODS = {"get_all_videos", "get_all_skits", "iter_indexable_texts", "get_indexable_row_ids", "get_minhash_row_ids",
+                     "get_minhash_signatures", "get_lsh_candidate_pairs",
+                     "clean_transcripts", "get_transcript_cleaning_stats",
+                     "get_stale_analyses", "get_stale_author_patterns", "count_stale_results",
+                     "get_llm_usage_by_operation", "get_llm_usage_by_author"}
+# 計測しないメソッド（接続の後片付けやコールバック登録）
+SKIPPED_METHODS = {"close", "add_listener", "init_db"}
+
+
+def build_cases(db, rng):
+    """メソッド名 → 引数なしで1回呼ぶ関数"""
+    conn = db.conn
+    author_ids = [row[0] for row in conn.execute("SELECT id FROM authors")]
+    video_ids = [row[0] for row in conn.execute("SELECT id FROM videos")]
+    youtube_ids = [row[0] for row in conn.execute("SELECT video_id FROM videos")]
+    skit_ids = [row[0] for row in conn.execute("SELECT id FROM generated_skits")]
+    transcript = make_text(rng, 4000)
+    analysis = make_analysis(rng)
+    skit = make_skit(rng)
+    signature, bands = make_minhash(skit)
+    existing_bands = [row[0] for row in conn.execute(
+        "SELECT bucket FROM lsh_buckets WHERE source_table = 'generated_skits' ORDER BY band LIMIT 16")]
+    counter = iter(range(10 ** 9))
+    llm_call = dict(operation="analysis", model="gemini-2.5-flash", prompt_tokens=2000, output_tokens=800, latency=3.5,
+                    author_id=author_ids[0], prompt_version=prompts.ANALYSIS.version, prompt_chars=4000)
+
+    def new_video():
+        return db.add_video(f"bench_{next(counter)}", "計測用", None, rng.choice(author_ids))
+
+    def delete_video():
+        db.delete_video(new_video())
+
+    def delete_skit():
+        db.delete_skit(db.save_skit(rng.choice(author_ids), "計測用", skit))
+
+    return {
+        "add_author": lambda: db.add_author(f"計測作者{next(counter)}"),
+        "get_authors": lambda: db.get_authors(),
+        "add_video": new_video,
+        "get_video": lambda: db.get_video(rng.choice(video_ids)),
+        "get_videos_by_author": lambda: db.get_videos_by_author(rng.choice(author_ids)),
+        "get_all_videos": lambda: db.get_all_videos(),
+        "add_transcript": lambda: db.add_transcript(rng.choice(video_ids), transcript),
+        "get_transcript": lambda: db.get_transcript(rng.choice(video_ids)),
+        # コーパスは整形済みなので、毎回全件を整形し直す（未整形分だけだと2回目以降は何もしない）
+        "clean_transcripts": lambda: db.clean_transcripts(only_missing=False),
+        "get_transcript_cleaning_stats": lambda: db.get_transcript_cleaning_stats(),
+        "get_transcript_by_youtube_id": lambda: db.get_transcript_by_youtube_id(rng.choice(youtube_ids)),
+        "add_analysis": lambda: db.add_analysis(rng.choice(video_ids), analysis),
+        "get_analysis": lambda: db.get_analysis(rng.choice(video_ids)),
+        "get_analyses_by_author": lambda: db.get_analyses_by_author(rng.choice(author_ids)),
+        "save_author_pattern": lambda: db.save_author_pattern(rng.choice(author_ids), "", analysis),
+        "get_author_pattern": lambda: db.get_author_pattern(rng.choice(author_ids)),
+        "get_stale_analyses": lambda: db.get_stale_analyses(prompts.ANALYSIS.version),
+        "get_stale_author_patterns": lambda: db.get_stale_author_patterns(prompts.AUTHOR_PATTERN.version),
+        "count_stale_results": lambda: db.count_stale_results(prompts.versions()),
+        "get_transcripts_by_author": lambda: db.get_transcripts_by_author(rng.choice(author_ids)),
+        "delete_video": delete_video,
+        "iter_indexable_texts": lambda: sum(1 for _ in db.iter_indexable_texts()),
+        "get_indexable_row_ids": lambda: db.get_indexable_row_ids("transcripts"),
+        "iter_indexable_texts_by_id": lambda: sum(1 for _ in db.iter_indexable_texts_by_id("transcripts", rng.sample(video_ids, 20))),
+        "iter_texts_without_minhash": lambda: sum(1 for _ in db.iter_texts_without_minhash("generated_skits")),
+        "save_minhash": lambda: db.save_minhash("generated_skits", rng.choice(skit_ids), signature, bands),
+        "delete_minhash": lambda: db.delete_minhash("generated_skits", -1),
+        "get_minhash_row_ids": lambda: db.get_minhash_row_ids("generated_skits"),
+        "get_minhash_signatures": lambda: db.get_minhash_signatures("generated_skits"),
+        "find_lsh_candidates": lambda: db.find_lsh_candidates("generated_skits", existing_bands or bands),
+        "get_lsh_candidate_pairs": lambda: db.get_lsh_candidate_pairs("generated_skits"),
+        "add_llm_call": lambda: db.add_llm_call("analysis", "gemini-2.5-flash", 2000, 800, 3.5,
+                                                author_id=rng.choice(author_ids), prompt_version=prompts.ANALYSIS.version,
+                                                prompt_chars=4000),
+        "add_llm_calls": lambda: db.add_llm_calls([llm_call] * 20),
+        "get_llm_usage_by_operation": lambda: db.get_llm_usage_by_operation(),
+        "get_llm_usage_by_author": lambda: db.get_llm_usage_by_author(10),
+        "get_setting": lambda: db.get_setting("reject_duplicate_skits"),
+        "set_setting": lambda: db.set_setting("bench", str(next(counter))),
+        "save_skit": lambda: db.save_skit(rng.choice(author_ids), "計測用", skit),
+        "get_skits_by_author": lambda: db.get_skits_by_author(rng.choice(author_ids)),
+        "get_all_skits": lambda: db.get_all_skits(),
+        "get_skit": lambda: db.get_skit(rng.choice(skit_ids)),
+        "set_skit_audio": lambda: db.set_skit_audio(rng.choice(skit_ids), "/tmp/bench", "done", None, 8),
+        "get_skit_audio": lambda: db.get_skit_audio(rng.choice(skit_ids)),
+        "delete_skit": delete_skit,
+    }
+
+
+def public_methods():
+    return sorted(name for name, value in vars(Database).items()
+                  if not name.startswith("_") and inspect.isfunction(value) and name not in SKIPPED_METHODS)
+
+
+def bench_database(db, repeat=DEFAULT_REPEAT, full_scan_repeat=FULL_SCAN_REPEAT, seed=0, only=None):
+    rng = random.Random(seed)
+    cases = build_cases(db, rng)
+    missing = [name for name in public_methods() if name not in cases]
+    if missing:
+        print(f"警告: 計測対象に入っていないメソッド: {', '.join(missing)}", file=sys.stderr)
+
+    results = {}
+    for name, call in cases.items():
+        if only and name not in only:
+            continue
+        count = full_scan_repeat if name in FULL_SCAN_METHODS else repeat
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(count):
+            t = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - t)
+        results[name] = report.stage_result(latencies, time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Databaseの各メソッドを合成コーパスで計測する")
+    parser.add_argument("--sizes", default="1000,10000", help="動画数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--full-scan-repeat", type=int, default=FULL_SCAN_REPEAT)
+    parser.add_argument("--transcript-chars", type=int, default=4000)
+    parser.add_argument("--methods", help="計測するメソッド（カンマ区切り、省略時は全部）")
+    parser.add_argument("--keep-dir", help="生成したコーパスDBを置いて再利用するディレクトリ")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果のJSONを保存するパス")
+    parser.add_argument("--compare", help="比較する前回のJSON")
+    parser.add_argument("--threshold", type=float, default=report.DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    only = set(args.methods.split(",")) if args.methods else None
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold", "keep_dir")}
+    result = report.new_report("database", config)
+
+    with tempfile.TemporaryDirectory(prefix="comedy_dbbench_") as temp_dir:
+        directory = args.keep_dir or temp_dir
+        os.makedirs(directory, exist_ok=True)
+        for size in sizes:
+            path = os.path.join(directory, f"corpus_{size}_{args.transcript_chars}_{args.seed}.db")
+            fresh = not os.path.exists(path)
+            db = Database(path)
+            if fresh:
+                start = time.perf_counter()
+                generate_corpus(db, size, transcript_chars=args.transcript_chars, seed=args.seed)
+                print(f"コーパス生成 {size}件: {time.perf_counter() - start:.1f}秒", file=sys.stderr)
+            result["results"][str(size)] = bench_database(db, args.repeat, args.full_scan_repeat, args.seed, only)
+            db.close()
+
+    print(report.format_results(result))
+    if args.output:
+        report.save_report(result, args.output)
+    if args.compare:
+        rows, regressed = report.compare_reports(report.load_report(args.compare), result, args.threshold)
+        print()
+        print(report.format_comparison(rows))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""ベンチマーク用の代役: VOICEVOX HTTPサーバー、Geminiクライアント、字幕取得元
+
+いずれもネットワークや外部サービスに出ず、指定した遅延だけ待ってから合成データを返す。
+"""
+import asyncio
+import io
+import json
+import math
+import random
+import struct
+import threading
+import time
+import wave
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+# 合成テキスト用の語彙（ひらがな・カタカナ・漢字が混ざる程度の日本語っぽさ）
+WORDS = [
+    "コンビニ", "店員", "お客さん", "電話", "面接", "先輩", "後輩", "温めますか", "レシート", "ポイントカード",
+    "なんで", "ちょっと待って", "おかしいでしょ", "いやいや", "そういうこと", "だから", "すみません",
+    "今日", "明日", "昨日", "急に", "ずっと", "本当に", "絶対", "たぶん", "やっぱり", "とりあえず",
+    "お弁当", "袋", "お箸", "自動ドア", "レジ", "店長", "マニュアル", "新人", "研修", "常連",
+]
+ENDINGS = ["。", "！", "？", "…", "ね。", "よ。", "のだ。", "じゃん。", "ですか？"]
+
+
+def make_sentence(rng, min_words=3, max_words=9):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return "".join(words) + rng.choice(ENDINGS)
+
+
+def make_transcript(rng, lines=120):
+    """字幕っぽい1行1発話のテキスト"""
+    return "\n".join(make_sentence(rng) for _ in range(lines))
+
+
+def make_skit(rng, lines=8):
+    """A/B交互のショートコント（プロンプトの出力形式どおり）"""
+    body = [f"{'AB'[i % 2]}: {make_sentence(rng)}" for i in range(lines)]
+    return f"タイトル: {rng.choice(WORDS)}\n\n" + "\n".join(body)
+
+
+def make_wav(seconds, rate=24000, frequency=200):
+    """seconds秒のサイン波WAV（16bitモノラル）。1周期分を作って繰り返す"""
+    frames = max(1, int(seconds * rate))
+    period = max(1, rate // frequency)
+    cycle = struct.pack(f"<{period}h", *(int(8000 * math.sin(2 * math.pi * i / period)) for i in range(period)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes((cycle * (frames // period + 1))[:frames * 2])
+    return buffer.getvalue()
+
+
+def make_audio_query(text, speaker):
+    """1文字1モーラとして見積もったaudio_query"""
+    moras = [{"text": c, "consonant": "k", "consonant_length": 0.04, "vowel": "a", "vowel_length": 0.08, "pitch": 5.5}
+             for c in text if not c.isspace()]
+    return {
+        "accent_phrases": [{"moras": moras, "accent": 1, "pause_mora": None, "is_interrogative": False}],
+        "speedScale": 1.0, "pitchScale": 0.0, "intonationScale": 1.0, "volumeScale": 1.0,
+        "prePhonemeLength": 0.1, "postPhonemeLength": 0.1,
+        "outputSamplingRate": 24000, "outputStereo": False, "kana": text, "speaker": speaker,
+    }
+
+
+def query_duration(query):
+    seconds = query.get("prePhonemeLength", 0.1) + query.get("postPhonemeLength", 0.1)
+    for phrase in query.get("accent_phrases", []):
+        for mora in phrase.get("moras", []):
+            seconds += (mora.get("consonant_length") or 0) + mora.get("vowel_length", 0)
+    return seconds / (query.get("speedScale", 1.0) or 1.0)
+
+
+class _Server(ThreadingHTTPServer):
+    # 既定のlisten backlog（5）だと、接続を張り直すクライアントが並列に来た時に取りこぼし、
+    # 再送までの約1秒を計測してしまう
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeVoicevoxServer:
+    """localhostで動くVOICEVOXエンジンの代役
+
+    /version, /speakers, /audio_query, /synthesis, /multi_synthesis に応答する。latency は1リクエストあたりの待ち時間（秒）。
+    capacity を指定すると同時に処理するリクエスト数をそこまでに抑える（CPUを使い切るエンジン1プロセスの再現）。
+    multi_synthesis=False で /multi_synthesis のない古いエンジンとして振る舞う。
+    """
+
+    def __init__(self, latency=0.0, synthesis_latency=None, port=0, capacity=None, multi_synthesis=True):
+        self.latency = latency
+        self.synthesis_latency = latency if synthesis_latency is None else synthesis_latency
+        self.slots = threading.BoundedSemaphore(capacity) if capacity else None
+        self.multi_synthesis = multi_synthesis
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.wav_cache = {}
+        self.server = _Server(("127.0.0.1", port), self._handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self):
+        with self.lock:
+            self.requests += 1
+
+    def _work(self, seconds):
+        if self.slots is None:
+            time.sleep(seconds)
+            return
+        with self.slots:
+            time.sleep(seconds)
+
+    def _wav(self, seconds):
+        # 長さごとにキャッシュ（WAV生成そのものを計測に含めない）
+        key = round(seconds, 2)
+        wav = self.wav_cache.get(key)
+        if wav is None:
+            wav = self.wav_cache[key] = make_wav(key)
+        return wav
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダーと本文を別々に書くので、接続を使い回すクライアントだとNagleと遅延ACKで1往復40ms待たされる
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data, status=200):
+                self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+
+            def do_GET(self):
+                fake._count()
+                path = urlparse(self.path).path
+                if path == "/version":
+                    self._send_json("0.0.0-fake")
+                elif path == "/speakers":
+                    self._send_json([
+                        {"name": "ずんだもん", "speaker_uuid": "fake-zundamon", "styles": [{"name": "ノーマル", "id": 3}]},
+                        {"name": "四国めたん", "speaker_uuid": "fake-metan", "styles": [{"name": "ノーマル", "id": 2}]},
+                        {"name": "春日部つむぎ", "speaker_uuid": "fake-tsumugi", "styles": [{"name": "ノーマル", "id": 8}]},
+                    ])
+                else:
+                    self._send_json({"detail": "Not Found"}, 404)
+
+            def do_POST(self):
+                fake._count()
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if url.path == "/audio_query":
+                    fake._work(fake.latency)
+                    self._send_json(make_audio_query(params.get("text", ""), int(params.get("speaker", 0))))
+                elif url.path == "/synthesis":
+                    fake._work(fake.synthesis_latency)
+                    self._send(200, fake._wav(query_duration(json.loads(body or b"{}"))), "audio/wav")
+                elif url.path == "/multi_synthesis" and fake.multi_synthesis:
+                    # 本物と同じく、1リクエスト内のクエリは順番に合成する
+                    queries = json.loads(body or b"[]")
+                    fake._work(fake.synthesis_latency * len(queries))
+                    archive = io.BytesIO()
+                    with zipfile.ZipFile(archive, "w") as zf:
+                        for i, query in enumerate(queries, 1):
+                            zf.writestr(f"{i:03d}.wav", fake._wav(query_duration(query)))
+                    self._send(200, archive.getvalue(), "application/zip")
+                else:
+                    self._send_json({"detail": "Not Found"}, 404)
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeGeminiClient:
+    """google.genai.Client の代役（models.generate_content と aio.models.generate_content だけ）"""
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.models = SimpleNamespace(generate_content=self._generate)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate_async))
+
+    def _respond(self, contents):
+        with self.lock:
+            self.calls += 1
+            # 出力形式にA/Bのセリフがあるプロンプト（生成・口調変換）にはコント形式で、それ以外は分析っぽい文章で返す
+            text = make_skit(self.rng) if "\nA: " in contents else "\n".join(
+                make_sentence(self.rng) for _ in range(12))
+        prompt_tokens = len(contents)
+        output_tokens = len(text)
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+                                total_token_count=prompt_tokens + output_tokens)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _generate(self, model, contents, **kwargs):
+        time.sleep(self.latency)
+        return self._respond(contents)
+
+    async def _generate_async(self, model, contents, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._respond(contents)
+
+
+class FakeTranscript:
+    """youtube_transcript_api の Transcript（字幕の一覧の1件）の代役"""
+
+    def __init__(self, source, video_id, language_code, is_generated, translated_from=None):
+        self.source = source
+        self.video_id = video_id
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.is_translatable = translated_from is None
+        self.translation_languages = [{"language": "", "language_code": "ja"}, {"language": "", "language_code": "en"}]
+
+    def translate(self, language_code):
+        return FakeTranscript(self.source, self.video_id, language_code, self.is_generated, self.language_code)
+
+    def fetch(self):
+        return self.source.fetch(self.video_id)
+
+
+class FakeTranscriptSource:
+    """YouTubeTranscriptApi の代役。動画IDごとに決まった字幕を返す
+
+    tracks は一覧に出す字幕の (言語コード, 自動生成か) のリスト。
+    """
+
+    def __init__(self, latency=0.0, lines=120, tracks=(("ja", False),)):
+        self.latency = latency
+        self.lines = lines
+        self.tracks = tracks
+
+    def list(self, video_id):
+        time.sleep(self.latency)
+        return [FakeTranscript(self, video_id, code, generated) for code, generated in self.tracks]
+
+    def fetch(self, video_id, languages=("ja",)):
+        time.sleep(self.latency)
+        rng = random.Random(video_id)
+        return [SimpleNamespace(text=make_sentence(rng), start=i * 2.0, duration=2.0) for i in range(self.lines)]
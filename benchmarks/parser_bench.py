@@ -0,0 +1,112 @@
+"""コント解析の計測: skit_parser.parse_skit と、以前の行ごとの re.match 実装との比較
+
+    python benchmarks/parser_bench.py --skits 10000 --output parser.json
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from skit_parser import parse_skit
+
+from fakes import make_skit, make_sentence
+import report
+
+
+def legacy_parse(skit_text):
+    """以前の voicevox_api / player の実装（行ごとに re.match）"""
+    dialogue = []
+    for i, line in enumerate(skit_text.strip().split("\n")):
+        match = re.match(r'^(.+?)[:：]\s*(.+)$', line)
+        if match:
+            dialogue.append((i, match.group(1).strip(), match.group(2).strip()))
+    return dialogue
+
+
+LEGACY_DIALOGUE = re.compile(r'^\s*([AB])\s*[:：]\s*(.+)$')
+LEGACY_SPEAKER = re.compile(r'^\s*([^:：\s]{1,12})\s*[:：]\s*(.+)$')
+LEGACY_TITLE = re.compile(r'^\s*タイトル\s*[:：]')
+
+
+def legacy_score_parse(skit_text):
+    """以前の skit_scorer の行分類"""
+    dialogue, other_speakers, other_lines = [], 0, 0
+    for line in skit_text.split('\n'):
+        if not line.strip() or LEGACY_TITLE.match(line):
+            continue
+        match = LEGACY_DIALOGUE.match(line)
+        if match:
+            dialogue.append((match.group(1), match.group(2).strip()))
+        elif LEGACY_SPEAKER.match(line):
+            other_speakers += 1
+        else:
+            other_lines += 1
+    return dialogue, other_speakers, other_lines
+
+
+def legacy_all(skit_text):
+    """生成→採点→合成→再生で、以前は同じコントを3通りに解析していた"""
+    legacy_score_parse(skit_text)
+    legacy_parse(skit_text)
+    legacy_parse(skit_text)
+
+
+def make_corpus(count, seed=0):
+    rng = random.Random(seed)
+    skits = []
+    for _ in range(count):
+        skit = make_skit(rng, rng.randint(6, 16))
+        # ト書きと装飾付きの話者も混ぜる
+        skit += f"\n（{make_sentence(rng, 1, 3)}）\n**A**：（笑いながら）{make_sentence(rng)}"
+        skits.append(skit)
+    return skits
+
+
+def measure(func, skits, rounds):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        t = time.perf_counter()
+        for skit in skits:
+            func(skit)
+        latencies.append((time.perf_counter() - t) / len(skits))
+    wall = time.perf_counter() - start
+    result = report.stage_result(latencies, wall)
+    result["throughput"] = round(len(skits) * rounds / wall, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コント解析の速度を計測する")
+    parser.add_argument("--skits", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", help="結果のJSONを保存するパス")
+    parser.add_argument("--compare", help="比較する前回のJSON")
+    parser.add_argument("--threshold", type=float, default=report.DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    skits = make_corpus(args.skits)
+    result = report.new_report("parser", {"skits": args.skits, "rounds": args.rounds})
+    result["results"][str(args.skits)] = {
+        "legacy_re_match": measure(legacy_parse, skits, args.rounds),
+        "legacy_all_modules": measure(legacy_all, skits, args.rounds),
+        "parse_skit": measure(parse_skit, skits, args.rounds),
+    }
+    print(report.format_results(result))
+    print("（件/秒はコント数、レイテンシは1コントあたり）")
+    if args.output:
+        report.save_report(result, args.output)
+    if args.compare:
+        rows, regressed = report.compare_reports(report.load_report(args.compare), result, args.threshold)
+        print()
+        print(report.format_comparison(rows))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
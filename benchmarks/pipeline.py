@@ -0,0 +1,170 @@
+"""取り込み→分析→作者パターン→生成→音声合成の一連の流れを、外部サービスの代役相手に計測する
+
+YouTube・Gemini・VOICEVOXはすべて benchmarks/fakes.py の代役に置き換え、DBは一時ディレクトリに作る。
+レイテンシは引数で変えられるので、アプリ側の処理（DB・パース・ファイル書き込み・並列化）だけの性能を比べられる。
+config.py（GEMINI_MODEL など）が読み込める状態で実行すること。
+
+    python benchmarks/pipeline.py --sizes 10,100,1000 --output bench.json
+    python benchmarks/pipeline.py --sizes 10,100,1000 --compare bench.json
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from gemini_api import GeminiAPI
+from rate_limiter import AdaptiveRateLimiter
+from voicevox_api import VoicevoxAPI
+from youtube_api import YouTubeAPI
+
+from fakes import FakeGeminiClient, FakeTranscriptSource, FakeVoicevoxServer
+import report
+
+VIDEOS_PER_AUTHOR = 10
+CHAR_MAPPING = {"A": "ずんだもん", "B": "四国めたん"}
+
+
+def run_stage(items, work, store=None, concurrency=1):
+    """work(item) をスレッドプールで実行して1件ごとの時間を測る。store(item, result) は呼び出し元スレッドで実行"""
+    latencies = []
+    errors = 0
+
+    def timed(item):
+        start = time.perf_counter()
+        result = work(item)
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for item, (result, elapsed) in zip(items, executor.map(timed, items)):
+            latencies.append(elapsed)
+            if isinstance(result, dict) and not result.get("success", True):
+                errors += 1
+            elif store:
+                store(item, result)
+    return report.stage_result(latencies, time.perf_counter() - start, errors)
+
+
+def run_size(size, args, voicevox_urls, work_dir):
+    db = Database(os.path.join(work_dir, f"bench_{size}.db"))
+    yt = YouTubeAPI(api=FakeTranscriptSource(latency=args.youtube_latency, lines=args.transcript_lines),
+                    db=db, cache_dir=os.path.join(work_dir, f"transcript_cache_{size}"))
+    limiter = AdaptiveRateLimiter(args.gemini_rpm, max_concurrency=args.concurrency)
+    gemini = GeminiAPI(client=FakeGeminiClient(latency=args.gemini_latency), limiter=limiter, db=db)
+    voicevox = VoicevoxAPI(voicevox_urls)
+    results = {}
+
+    # 取り込み: 字幕取得 → videos / transcripts に保存
+    author_ids = [db.add_author(f"作者{i:04d}") for i in range(max(1, size // VIDEOS_PER_AUTHOR))]
+    videos = [(f"vid{size:06d}_{i:06d}", author_ids[i % len(author_ids)]) for i in range(size)]
+    video_db_ids = {}
+
+    def store_transcript(video, result):
+        video_id, author_id = video
+        video_db_id = db.add_video(video_id, None, f"https://www.youtube.com/watch?v={video_id}", author_id)
+        db.add_transcript(video_db_id, result["transcript"], result.get("language"), result.get("track"))
+        video_db_ids[video_id] = video_db_id
+
+    results["ingest"] = run_stage(videos, lambda v: yt.fetch_transcript(v[0]), store_transcript, args.concurrency)
+    # 再取り込み: 保存済みの動画はDBから読むのでネットワークに出ない
+    results["reingest"] = run_stage(videos, lambda v: yt.fetch_transcript(v[0]), concurrency=args.concurrency)
+
+    # 分析: 字幕ごとにGeminiで分析 → analyses に保存
+    video_rows = [(video_db_ids[video_id], db.get_transcript(video_db_ids[video_id], cleaned=True), author_id)
+                  for video_id, author_id in videos]
+    results["analyze"] = run_stage(
+        video_rows, lambda row: gemini.analyze_video(row[1], author_id=row[2]),
+        lambda row, result: db.add_analysis(row[0], result["analysis"], result["prompt_version"]), args.concurrency)
+
+    # 作者パターン: 作者ごとの分析結果をまとめて分析 → author_patterns に保存
+    def pattern_work(author_id):
+        analyses = db.get_analyses_by_author(author_id)
+        analyses_text = "\n\n---\n\n".join([f"### {a['youtube_id']}\n\n{a['raw_analysis']}" for a in analyses])
+        return gemini.analyze_author_patterns(analyses_text, author_id=author_id)
+
+    results["pattern"] = run_stage(
+        author_ids, pattern_work,
+        lambda author_id, result: db.save_author_pattern(author_id, "", result["analysis"], result["prompt_version"]), args.concurrency)
+
+    # 生成: 作者ごとにショートコントを生成 → generated_skits に保存
+    def generate_work(author_id):
+        transcripts = db.get_transcripts_by_author(author_id)
+        analyses = db.get_analyses_by_author(author_id)
+        pattern = db.get_author_pattern(author_id)
+        transcripts_text = "\n\n---\n\n".join([f"【{t['youtube_id']}】\n{t['content']}" for t in transcripts])
+        analyses_text = "\n\n---\n\n".join([f"【{a['youtube_id']}】\n{a['raw_analysis']}" for a in analyses])
+        return gemini.generate_short_skit(f"作者{author_id}", pattern['analysis_summary'] if pattern else "",
+                                          transcripts_text, analyses_text, author_id=author_id)
+
+    skit_ids = []
+    results["generate"] = run_stage(
+        author_ids, generate_work,
+        lambda author_id, result: skit_ids.append(db.save_skit(author_id, "ベンチマーク", result["skit"],
+                                                                      prompt_version=result["prompt_version"])),
+        args.concurrency)
+
+    # 音声合成: 生成したコントを1本ずつVOICEVOXで合成してWAVを書き出す
+    skits = [(skit_id, db.get_skit(skit_id)['content']) for skit_id in skit_ids[:args.max_skits]]
+    results["synthesize"] = run_stage(
+        skits, lambda skit: voicevox.generate_skit_audio(skit[1], os.path.join(work_dir, f"audio_{size}_{skit[0]}"),
+                                                         CHAR_MAPPING, multi_synthesis=args.multi_synthesis),
+        concurrency=args.concurrency)
+
+    gemini.flush_usage()
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代役サービス相手にパイプライン全体を計測する")
+    parser.add_argument("--sizes", default="10,100", help="動画数（カンマ区切り）")
+    parser.add_argument("--concurrency", type=int, default=4, help="各段階の並列数")
+    parser.add_argument("--youtube-latency", type=float, default=0.01)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-rpm", type=float, default=60000, help="代役Gemini用のレート上限")
+    parser.add_argument("--voicevox-latency", type=float, default=0.01)
+    parser.add_argument("--voicevox-engines", type=int, default=1, help="起動する代役VOICEVOXエンジンの数")
+    parser.add_argument("--multi-synthesis", action="store_true", help="合成を話者ごとの /multi_synthesis にまとめる")
+    parser.add_argument("--engine-capacity", type=int, help="代役エンジン1つあたりの同時処理数（省略時は無制限）")
+    parser.add_argument("--transcript-lines", type=int, default=120)
+    parser.add_argument("--max-skits", type=int, default=20, help="音声合成するコント数の上限")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果のJSONを保存するパス")
+    parser.add_argument("--compare", help="比較する前回のJSON")
+    parser.add_argument("--threshold", type=float, default=report.DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    logging.getLogger("voicevox_api").setLevel(logging.ERROR)
+    random.seed(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold")}
+    result = report.new_report("pipeline", config)
+
+    with ExitStack() as stack:
+        servers = [stack.enter_context(FakeVoicevoxServer(latency=args.voicevox_latency, capacity=args.engine_capacity))
+                   for _ in range(args.voicevox_engines)]
+        work_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="comedy_bench_"))
+        for size in sizes:
+            result["results"][str(size)] = run_size(size, args, [server.base_url for server in servers], work_dir)
+
+    print(report.format_results(result))
+    if args.output:
+        report.save_report(result, args.output)
+    if args.compare:
+        rows, regressed = report.compare_reports(report.load_report(args.compare), result, args.threshold)
+        print()
+        print(report.format_comparison(rows))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""ベンチマーク結果の集計・保存・前回との比較"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# この割合以上スループットが落ちる / p95が伸びると退行とみなす
+DEFAULT_THRESHOLD = 0.2
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def stage_result(latencies, wall, errors=0):
+    """1段階分の結果（件数、所要時間、スループット、レイテンシ分布）"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "wall": round(wall, 6),
+        "throughput": round(len(values) / wall, 3) if wall > 0 else None,
+        "latency": {
+            "mean": round(sum(values) / len(values), 6) if values else None,
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "max": values[-1] if values else None,
+        },
+    }
+
+
+def git_revision():
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=REPO_DIR)
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def new_report(name, config):
+    return {
+        "benchmark": name,
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "config": config,
+        "results": {},
+    }
+
+
+def save_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_report(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """同じ規模・同じ段階どうしを比べ、(行のリスト, 退行があるか) を返す"""
+    rows = []
+    regressed = False
+    for size, stages in current["results"].items():
+        for stage, result in stages.items():
+            base = baseline["results"].get(size, {}).get(stage)
+            if not base:
+                continue
+            throughput_change = _change(base.get("throughput"), result.get("throughput"))
+            p95_change = _change(base["latency"].get("p95"), result["latency"].get("p95"))
+            bad = ((throughput_change is not None and throughput_change < -threshold)
+                   or (p95_change is not None and p95_change > threshold))
+            regressed = regressed or bad
+            rows.append({"size": size, "stage": stage, "throughput_change": throughput_change,
+                         "p95_change": p95_change, "regressed": bad})
+    return rows, regressed
+
+
+def _change(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before
+
+
+def format_results(report):
+    width = max([14] + [len(stage) + 2 for stages in report["results"].values() for stage in stages])
+    lines = [f"{'規模':>8} {'段階':<{width}}{'件数':>7}{'秒':>9}{'件/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}"]
+    for size, stages in report["results"].items():
+        for stage, r in stages.items():
+            lat = r["latency"]
+            lines.append(f"{size:>8} {stage:<{width}}{r['count']:>7}{r['wall']:>9.3f}{r['throughput'] or 0:>10.1f}"
+                         f"{_ms(lat['p50']):>10}{_ms(lat['p95']):>10}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows):
+    width = max([14] + [len(row["stage"]) + 2 for row in rows])
+    lines = [f"{'規模':>8} {'段階':<{width}}{'件/秒':>10}{'p95':>10}"]
+    for row in rows:
+        mark = "  ← 退行" if row["regressed"] else ""
+        lines.append(f"{row['size']:>8} {row['stage']:<{width}}{_pct(row['throughput_change']):>10}{_pct(row['p95_change']):>10}{mark}")
+    return "\n".join(lines)
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def _pct(value):
+    return "-" if value is None else f"{value:+.0%}"
@@ -0,0 +1,79 @@
+"""起動時間の計測: main を読み込んでウィンドウが表示されるまでの時間
+
+毎回新しいプロセスで計測し、起動時点で読み込まれてしまった重いモジュールも報告する。
+
+    python benchmarks/startup.py --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時には読み込まれていてほしくないモジュール
+HEAVY_MODULES = ["google.genai", "requests", "youtube_transcript_api", "pygame", "aiohttp", "numpy", "PIL"]
+
+CHILD_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {repo!r})
+import main
+imported = time.perf_counter()
+result = {{"import": imported - start}}
+try:
+    app = main.ComedyAnalyzer()
+    app.root.update()
+    result["window"] = time.perf_counter() - start
+    app.root.destroy()
+    app.db.close()
+except Exception as e:  # ディスプレイがない環境など
+    result["window_error"] = f"{{type(e).__name__}}: {{e}}"
+result["loaded"] = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps(result))
+'''
+
+
+def measure_once(python=sys.executable):
+    script = CHILD_SCRIPT.format(repo=REPO_DIR, heavy=HEAVY_MODULES)
+    completed = subprocess.run([python, "-c", script], capture_output=True, text=True, cwd=REPO_DIR)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip()[-1000:])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {"min": min(values), "median": statistics.median(values), "max": max(values)}
+
+
+def run(runs=5):
+    samples = [measure_once() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "import": summarize([s["import"] for s in samples]),
+        "time_to_window": summarize([s["window"] for s in samples if "window" in s]),
+        "window_error": next((s["window_error"] for s in samples if "window_error" in s), None),
+        "heavy_modules_loaded": sorted({name for s in samples for name in s["loaded"]}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間を計測する")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="結果のJSONを保存するパス")
+    args = parser.parse_args()
+
+    report = run(args.runs)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
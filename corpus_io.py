@@ -0,0 +1,290 @@
+import argparse
+import base64
+import gzip
+import importlib.util
+import json
+import os
+import sys
+import time
+
+from database import Database
+
+# 列指向形式（Parquet）用。なければgzip圧縮のJSONLで書き出す
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_PARQUET = "parquet"
+FORMAT_JSONL = "jsonl"
+
+# fetchmany / executemany の1回あたりの行数（メモリに載るのはこの行数分だけ）
+BATCH_ROWS = 2000
+
+# 外部キーの親を先に入れる順番（ここにないテーブルは後ろに名前順で続く）
+TABLE_ORDER = [
+    "authors", "videos", "transcripts", "analyses", "author_patterns",
+    "generated_skits", "skit_audio", "settings", "minhash_signatures", "lsh_buckets",
+]
+
+# 取り込み時の各テーブルの扱い
+#   match: 取り込み先の既存行と同じ行とみなす列（一致すれば既存行を残して取り込まない）
+#   refs:  {列名: 親テーブル}。書き出し元のIDを取り込み先のIDに付け替える（親が取り込まれていない行は捨てる）
+# idは取り込み先で振り直す。ここにないテーブルは取り込まない:
+#   minhash_signatures / lsh_buckets は取り込んだ本文から作り直し、llm_calls は書き出し元の環境の記録なので持ち込まない
+IMPORT_TABLES = {
+    "authors": {"match": ("name",), "refs": {}},
+    "videos": {"match": ("video_id",), "refs": {"author_id": "authors"}},
+    "transcripts": {"match": ("video_id",), "refs": {"video_id": "videos"}},
+    "analyses": {"match": ("video_id",), "refs": {"video_id": "videos"}},
+    "author_patterns": {"match": ("author_id",), "refs": {"author_id": "authors"}},
+    "generated_skits": {"match": ("author_id", "created_at", "content"), "refs": {"author_id": "authors"}},
+    "skit_audio": {"match": ("skit_id",), "refs": {"skit_id": "generated_skits"}},
+    "settings": {"match": ("key",), "refs": {}},
+}
+
+
+def list_tables(conn):
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    known = [name for name in TABLE_ORDER if name in names]
+    return known + sorted(name for name in names if name not in TABLE_ORDER)
+
+
+def table_columns(conn, table):
+    """[(列名, 型)]。型は integer / real / blob / text のいずれか"""
+    columns = []
+    for row in conn.execute(f"PRAGMA table_info({table})"):
+        declared = (row[2] or "").upper()
+        if "INT" in declared:
+            kind = "integer"
+        elif any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+            kind = "real"
+        elif "BLOB" in declared:
+            kind = "blob"
+        else:
+            kind = "text"
+        columns.append((row[1], kind))
+    return columns
+
+
+def _arrow_schema(columns):
+    types = {"integer": pa.int64(), "real": pa.float64(), "blob": pa.binary(), "text": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _export_parquet(cursor, columns, path):
+    schema = _arrow_schema(columns)
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                break
+            arrays = [pa.array([row[i] for row in batch], type=schema.field(i).type) for i in range(len(columns))]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def _export_jsonl(cursor, columns, path):
+    names = [name for name, _ in columns]
+    blobs = [i for i, (_, kind) in enumerate(columns) if kind == "blob"]
+    rows = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                break
+            for row in batch:
+                values = list(row)
+                for i in blobs:
+                    if values[i] is not None:
+                        values[i] = base64.b64encode(values[i]).decode("ascii")
+                f.write(json.dumps(dict(zip(names, values)), ensure_ascii=False))
+                f.write("\n")
+            rows += len(batch)
+    return rows
+
+
+def export_corpus(db, output_dir, fmt=None, tables=None, progress=None):
+    """全テーブル（またはtables）をoutput_dirにテーブルごとのファイルとして書き出す
+
+    行はカーソルからBATCH_ROWS件ずつ読むので、DB全体をメモリに載せない。
+    """
+    fmt = fmt or (FORMAT_PARQUET if PYARROW_AVAILABLE else FORMAT_JSONL)
+    if fmt == FORMAT_PARQUET and not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquetで書き出すにはpyarrowが必要です")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"format": fmt, "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "tables": {}}
+
+    for table in tables or list_tables(db.conn):
+        columns = table_columns(db.conn, table)
+        filename = f"{table}.parquet" if fmt == FORMAT_PARQUET else f"{table}.jsonl.gz"
+        column_list = ", ".join(name for name, _ in columns)
+        writer = _export_parquet if fmt == FORMAT_PARQUET else _export_jsonl
+        with db.lock:
+            cursor = db.conn.execute(f"SELECT {column_list} FROM {table} ORDER BY rowid")
+            rows = writer(cursor, columns, os.path.join(output_dir, filename))
+        manifest["tables"][table] = {"file": filename, "rows": rows, "columns": [list(c) for c in columns]}
+        if progress:
+            progress(table, rows)
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _read_parquet(path, columns):
+    names = [name for name, _ in columns]
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=BATCH_ROWS, columns=names):
+        data = batch.to_pydict()
+        yield list(zip(*(data[name] for name in names)))
+
+
+def _read_jsonl(path, columns):
+    names = [name for name, _ in columns]
+    blobs = {name for name, kind in columns if kind == "blob"}
+    batch = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            for name in blobs:
+                if record.get(name) is not None:
+                    record[name] = base64.b64decode(record[name])
+            batch.append(tuple(record.get(name) for name in names))
+            if len(batch) >= BATCH_ROWS:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _import_rows(conn, table, spec, names, batch, id_maps):
+    """1バッチ分を取り込み、挿入した行数を返す。id_maps[table] に 書き出し元ID → 取り込み先ID を記録する"""
+    id_map = id_maps.setdefault(table, {})
+    columns = [name for name in names if name != "id"]
+    match = [name for name in spec["match"] if name in columns]
+    insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    find_sql = f"SELECT id FROM {table} WHERE " + " AND ".join(f"{name} IS ?" for name in match)
+    inserted = 0
+    for values in batch:
+        row = dict(zip(names, values))
+        orphan = False
+        for column, parent in spec["refs"].items():
+            if row.get(column) is not None:
+                row[column] = id_maps.get(parent, {}).get(row[column])
+                orphan = orphan or row[column] is None
+        if orphan:
+            continue
+        existing = conn.execute(find_sql, [row[name] for name in match]).fetchone() if match else None
+        if existing is None:
+            cursor = conn.execute(insert_sql, [row[name] for name in columns])
+            inserted += 1
+            new_id = cursor.lastrowid
+        else:
+            new_id = existing[0]
+        if row.get("id") is not None:
+            id_map[row["id"]] = new_id
+    return inserted
+
+
+def import_corpus(db, input_dir, tables=None, progress=None):
+    """export_corpusの出力をdbに取り込み、テーブルごとの挿入した行数を返す
+
+    IDは取り込み先で振り直し、参照（videos.author_id など）も付け替えるので、データのあるDBにも取り込める。
+    IMPORT_TABLES の match が一致する既存行は上書きせずにそのまま残す（同じコーパスを2回取り込んでも増えない）。
+    BATCH_ROWS件ずつ1トランザクションで入れる。取り込み後は rebuild_indexes で重複検出・類似検索を作り直す。
+    """
+    with open(os.path.join(input_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest["format"] == FORMAT_PARQUET and not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquetを読み込むにはpyarrowが必要です")
+    reader = _read_parquet if manifest["format"] == FORMAT_PARQUET else _read_jsonl
+
+    existing = set(list_tables(db.conn))
+    counts = {}
+    id_maps = {}
+    ordered = sorted(manifest["tables"], key=lambda t: TABLE_ORDER.index(t) if t in TABLE_ORDER else len(TABLE_ORDER))
+    for table in ordered:
+        if (tables and table not in tables) or table not in existing or table not in IMPORT_TABLES:
+            continue
+        info = manifest["tables"][table]
+        # 取り込み先にある列だけを入れる（古い/新しいスキーマとの差を吸収）
+        target_columns = {name for name, _ in table_columns(db.conn, table)}
+        columns = [tuple(c) for c in info["columns"]]
+        keep = [i for i, (name, _) in enumerate(columns) if name in target_columns]
+        names = [columns[i][0] for i in keep]
+
+        count = 0
+        for batch in reader(os.path.join(input_dir, info["file"]), columns):
+            if len(keep) != len(columns):
+                batch = [tuple(row[i] for i in keep) for row in batch]
+            with db.lock, db.conn:
+                count += _import_rows(db.conn, table, IMPORT_TABLES[table], names, batch, id_maps)
+        counts[table] = count
+        if progress:
+            progress(table, count)
+    return counts
+
+
+def rebuild_indexes(db):
+    """取り込んだ本文の整形版・重複検出の署名・類似検索インデックスを作り直す。作り直した対象の名前を返す"""
+    rebuilt = []
+    if db.clean_transcripts():
+        rebuilt.append("字幕の整形版")
+    # 重複検出と類似検索はnumpyが必要（アプリと同じく、なければ次回起動時に作られる）
+    if importlib.util.find_spec("numpy") is None:
+        return rebuilt
+    from dedupe import NearDuplicateDetector
+    from embedding_index import EmbeddingIndex
+    NearDuplicateDetector(db).sync()
+    rebuilt.append("重複検出")
+    EmbeddingIndex().rebuild(db)
+    rebuilt.append("類似検索インデックス")
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コーパス（全テーブル）の一括書き出し・取り込み")
+    parser.add_argument("--db", help="対象のSQLiteファイル（省略時はconfig.DATABASE_PATH）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="テーブルごとのファイルに書き出す")
+    export_parser.add_argument("output_dir")
+    export_parser.add_argument("--format", choices=[FORMAT_PARQUET, FORMAT_JSONL])
+    export_parser.add_argument("--tables", help="カンマ区切り（省略時は全テーブル）")
+    import_parser = sub.add_parser("import", help="書き出したファイルを取り込む")
+    import_parser.add_argument("input_dir")
+    import_parser.add_argument("--tables", help="カンマ区切り（省略時は全テーブル）")
+    import_parser.add_argument("--no-index", action="store_true", help="重複検出・類似検索インデックスを作り直さない")
+    args = parser.parse_args()
+
+    db = Database(args.db) if args.db else Database()
+    tables = args.tables.split(",") if args.tables else None
+    start = time.perf_counter()
+    report = lambda table, rows: print(f"  {table}: {rows}行", flush=True)
+    try:
+        if args.command == "export":
+            manifest = export_corpus(db, args.output_dir, args.format, tables, report)
+            print(f"書き出し完了（{manifest['format']}, {time.perf_counter() - start:.1f}秒）: {args.output_dir}")
+        else:
+            counts = import_corpus(db, args.input_dir, tables, report)
+            print(f"取り込み完了（{sum(counts.values())}行, {time.perf_counter() - start:.1f}秒）")
+            if not args.no_index:
+                rebuilt = rebuild_indexes(db)
+                print(f"作り直し: {'、'.join(rebuilt) or 'なし'}（{time.perf_counter() - start:.1f}秒）")
+    except RuntimeError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
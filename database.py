@@ -1,122 +1,433 @@
 ﻿import sqlite3
 import os
+import threading
 from config import DATABASE_PATH
+from metrics import instrument_methods
+from transcript_cleaner import clean_transcript
 
 # スクリプトのディレクトリを基準にパスを解決
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+@instrument_methods('db', exclude=('add_listener', 'close'))
 class Database:
-    def __init__(self):
-        os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-        self.conn = sqlite3.connect(DATABASE_PATH)
+    def __init__(self, path=DATABASE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Tkのスレッド、一括音声生成のワーカー、共有イベントループから同じ接続を使うため、
+        # 接続を使う処理（execute〜commit）はすべて self.lock の中で行う
+        self.conn = sqlite3.connect(path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        self.listeners = []
         self.init_db()
 
     def init_db(self):
         schema_path = os.path.join(BASE_DIR, 'models', 'schema.sql')
         with open(schema_path, 'r', encoding='utf-8') as f:
-            self.conn.executescript(f.read())
-        self.conn.commit()
+            schema = f.read()
+        with self.lock:
+            self.conn.executescript(schema)
+            self._migrate()
+            self.conn.commit()
+
+    # 既存のDBに後から足した列（CREATE TABLE IF NOT EXISTS では追加されない）
+    ADDED_COLUMNS = [
+        ('transcripts', 'language', 'TEXT'),
+        ('transcripts', 'track', 'TEXT'),
+        ('transcripts', 'cleaned_content', 'TEXT'),
+        ('transcripts', 'original_chars', 'INTEGER'),
+        ('transcripts', 'cleaned_chars', 'INTEGER'),
+        ('analyses', 'prompt_version', 'TEXT'),
+        ('author_patterns', 'prompt_version', 'TEXT'),
+        ('generated_skits', 'prompt_version', 'TEXT'),
+    ]
+    ADDED_INDEXES = [
+        # 整形の統計を本文を読まずに集計する（カバリングインデックス）
+        "CREATE INDEX IF NOT EXISTS idx_transcripts_chars ON transcripts (cleaned_chars, original_chars)",
+    ]
+
+    # 全件をまとめて読まないよう、idの順にこの件数ずつ読む
+    PAGE_SIZE = 500
+
+    def _migrate(self):
+        for table, column, declaration in self.ADDED_COLUMNS:
+            columns = {row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        # 後から足した列のインデックス（schema.sqlに書くと、古いDBでは列を足す前に実行されて失敗する）
+        for statement in self.ADDED_INDEXES:
+            self.conn.execute(statement)
+
+    # 変更通知（インデックス等の差分更新用）
+    def add_listener(self, callback):
+        """callback(table, action, row_id, content) を変更時に呼ぶ"""
+        self.listeners.append(callback)
+
+    def _notify(self, table, action, row_id, content=None):
+        # リスナーは埋め込み計算などで時間がかかるので、self.lock の外で呼ぶ
+        for callback in self.listeners:
+            callback(table, action, row_id, content)
+
+    def _fetchall(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _fetchone(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def _write(self, sql, params=()):
+        """1文だけの書き込み。カーソルを返す"""
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
 
     def add_author(self, name, channel_url=None):
-        self.conn.execute("INSERT OR IGNORE INTO authors (name, channel_url) VALUES (?, ?)", (name, channel_url))
-        self.conn.commit()
-        result = self.conn.execute("SELECT id FROM authors WHERE name = ?", (name,)).fetchone()
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO authors (name, channel_url) VALUES (?, ?)", (name, channel_url))
+            self.conn.commit()
+            result = self.conn.execute("SELECT id FROM authors WHERE name = ?", (name,)).fetchone()
         return result['id']
 
     def get_authors(self):
-        return self.conn.execute("SELECT * FROM authors ORDER BY name").fetchall()
+        return self._fetchall("SELECT * FROM authors ORDER BY name")
 
     def add_video(self, video_id, title, url, author_id):
-        self.conn.execute("INSERT OR IGNORE INTO videos (video_id, title, url, author_id) VALUES (?, ?, ?, ?)", (video_id, title, url, author_id))
-        self.conn.commit()
-        result = self.conn.execute("SELECT id FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO videos (video_id, title, url, author_id) VALUES (?, ?, ?, ?)", (video_id, title, url, author_id))
+            self.conn.commit()
+            result = self.conn.execute("SELECT id FROM videos WHERE video_id = ?", (video_id,)).fetchone()
         return result['id']
 
+    def get_video(self, video_db_id):
+        return self._fetchone("SELECT v.*, a.name as author_name FROM videos v LEFT JOIN authors a ON v.author_id = a.id WHERE v.id = ?", (video_db_id,))
+
     def get_videos_by_author(self, author_id):
-        return self.conn.execute("SELECT * FROM videos WHERE author_id = ? ORDER BY created_at DESC", (author_id,)).fetchall()
+        return self._fetchall("SELECT * FROM videos WHERE author_id = ? ORDER BY created_at DESC", (author_id,))
 
     def get_all_videos(self):
-        return self.conn.execute("SELECT v.*, a.name as author_name FROM videos v LEFT JOIN authors a ON v.author_id = a.id ORDER BY v.created_at DESC").fetchall()
+        return self._fetchall("SELECT v.*, a.name as author_name FROM videos v LEFT JOIN authors a ON v.author_id = a.id ORDER BY v.created_at DESC")
+
+    def add_transcript(self, video_db_id, content, language=None, track=None):
+        """track は取得した字幕の種類（manual / generated / translated）。整形版も一緒に保存する"""
+        cleaned = clean_transcript(content, track)
+        with self.lock:
+            self.conn.execute("DELETE FROM transcripts WHERE video_id = ?", (video_db_id,))
+            self.conn.execute("""
+                INSERT INTO transcripts (video_id, content, language, track, cleaned_content, original_chars, cleaned_chars)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (video_db_id, content, language, track, cleaned['text'], cleaned['original_chars'], cleaned['cleaned_chars']))
+            self.conn.commit()
+        self._notify('transcripts', 'upsert', video_db_id, content)
+
+    def get_transcript(self, video_db_id, cleaned=False):
+        """cleaned=True なら整形版（なければ元の字幕）"""
+        result = self._fetchone("SELECT * FROM transcripts WHERE video_id = ?", (video_db_id,))
+        if not result:
+            return None
+        return (result['cleaned_content'] or result['content']) if cleaned else result['content']
 
-    def add_transcript(self, video_db_id, content):
-        self.conn.execute("DELETE FROM transcripts WHERE video_id = ?", (video_db_id,))
-        self.conn.execute("INSERT INTO transcripts (video_id, content) VALUES (?, ?)", (video_db_id, content))
-        self.conn.commit()
+    def clean_transcripts(self, only_missing=True, batch_size=PAGE_SIZE):
+        """整形版のない（only_missing=Falseなら全部の）字幕を整形して保存し、件数を返す
 
-    def get_transcript(self, video_db_id):
-        result = self.conn.execute("SELECT * FROM transcripts WHERE video_id = ?", (video_db_id,)).fetchone()
-        return result['content'] if result else None
+        batch_size件ずつidの順に読んで書き戻すので、字幕全体をメモリに載せない。
+        """
+        missing = "cleaned_content IS NULL AND" if only_missing else ""
+        sql = f"SELECT id, content, track FROM transcripts WHERE {missing} id > ? ORDER BY id LIMIT ?"
+        count = 0
+        updates = []
+        for row in self._iter_pages(sql, batch_size):
+            cleaned = clean_transcript(row['content'], row['track'])
+            updates.append((cleaned['text'], cleaned['original_chars'], cleaned['cleaned_chars'], row['id']))
+            if len(updates) >= batch_size:
+                count += self._save_cleaned(updates)
+                updates = []
+        return count + self._save_cleaned(updates)
 
-    def add_analysis(self, video_db_id, raw_analysis):
-        self.conn.execute("DELETE FROM analyses WHERE video_id = ?", (video_db_id,))
-        self.conn.execute("INSERT INTO analyses (video_id, raw_analysis) VALUES (?, ?)", (video_db_id, raw_analysis))
-        self.conn.commit()
+    def _save_cleaned(self, updates):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE transcripts SET cleaned_content = ?, original_chars = ?, cleaned_chars = ? WHERE id = ?", updates)
+        return len(updates)
+
+    def get_transcript_cleaning_stats(self):
+        """整形済みの字幕の件数と、整形前後の文字数の合計（本文は読まず、保存時に数えた文字数を使う）"""
+        row = self._fetchone("""
+            SELECT COUNT(*) AS count, COALESCE(SUM(original_chars), 0) AS original_chars,
+                   COALESCE(SUM(cleaned_chars), 0) AS cleaned_chars
+            FROM transcripts WHERE cleaned_chars IS NOT NULL
+        """)
+        return dict(row)
+
+    def get_transcript_by_youtube_id(self, youtube_id):
+        return self._fetchone("""
+            SELECT t.content, t.language, t.track FROM transcripts t JOIN videos v ON t.video_id = v.id WHERE v.video_id = ?
+        """, (youtube_id,))
+
+    def add_analysis(self, video_db_id, raw_analysis, prompt_version=None):
+        with self.lock:
+            self.conn.execute("DELETE FROM analyses WHERE video_id = ?", (video_db_id,))
+            self.conn.execute("INSERT INTO analyses (video_id, raw_analysis, prompt_version) VALUES (?, ?, ?)", (video_db_id, raw_analysis, prompt_version))
+            self.conn.commit()
+        self._notify('analyses', 'upsert', video_db_id, raw_analysis)
 
     def get_analysis(self, video_db_id):
-        return self.conn.execute("SELECT * FROM analyses WHERE video_id = ?", (video_db_id,)).fetchone()
+        return self._fetchone("SELECT * FROM analyses WHERE video_id = ?", (video_db_id,))
 
     def get_analyses_by_author(self, author_id):
-        return self.conn.execute("SELECT a.*, v.title, v.video_id as youtube_id FROM analyses a JOIN videos v ON a.video_id = v.id WHERE v.author_id = ? ORDER BY a.created_at DESC", (author_id,)).fetchall()
+        return self._fetchall("SELECT a.*, v.title, v.video_id as youtube_id FROM analyses a JOIN videos v ON a.video_id = v.id WHERE v.author_id = ? ORDER BY a.created_at DESC", (author_id,))
 
-    def save_author_pattern(self, author_id, common_patterns, analysis_summary):
-        self.conn.execute("DELETE FROM author_patterns WHERE author_id = ?", (author_id,))
-        self.conn.execute("INSERT INTO author_patterns (author_id, common_patterns, analysis_summary) VALUES (?, ?, ?)", (author_id, common_patterns, analysis_summary))
-        self.conn.commit()
+    def save_author_pattern(self, author_id, common_patterns, analysis_summary, prompt_version=None):
+        with self.lock:
+            self.conn.execute("DELETE FROM author_patterns WHERE author_id = ?", (author_id,))
+            self.conn.execute("INSERT INTO author_patterns (author_id, common_patterns, analysis_summary, prompt_version) VALUES (?, ?, ?, ?)", (author_id, common_patterns, analysis_summary, prompt_version))
+            self.conn.commit()
 
     def get_author_pattern(self, author_id):
-        return self.conn.execute("SELECT * FROM author_patterns WHERE author_id = ?", (author_id,)).fetchone()
+        return self._fetchone("SELECT * FROM author_patterns WHERE author_id = ?", (author_id,))
+
+    # プロンプトの版（prompts.py）が今と違う、または版の記録がない結果
+    # 版がNULLの行（版を記録する前に作ったもの・手で書いたもの）は作った版が分からないので、古い版には数えない
+    def get_stale_analyses(self, prompt_version):
+        return self._fetchall(
+            "SELECT id, video_id, prompt_version FROM analyses WHERE prompt_version != ?",
+            (prompt_version,)
+        )
+
+    def get_stale_author_patterns(self, prompt_version):
+        return self._fetchall(
+            "SELECT id, author_id, prompt_version FROM author_patterns WHERE prompt_version != ?",
+            (prompt_version,)
+        )
+
+    # テーブルごとの、結果を作るテンプレート名（コントは生成と口調変換のどちらか）
+    STALE_TEMPLATES = {
+        'analyses': ('analysis',),
+        'author_patterns': ('author_pattern',),
+        'generated_skits': ('generate_skit', 'convert_character'),
+    }
+
+    def count_stale_results(self, versions):
+        """versions（{テンプレート名: 版}）のどれとも違う版で作った結果の件数をテーブルごとに返す"""
+        counts = {}
+        for table, names in self.STALE_TEMPLATES.items():
+            current = [versions.get(name) for name in names]
+            counts[table] = self._fetchone(
+                f"SELECT COUNT(*) FROM {table} WHERE prompt_version NOT IN ({', '.join('?' * len(current))})",
+                current
+            )[0]
+        return counts
 
     def get_transcripts_by_author(self, author_id):
-        return self.conn.execute("""
-            SELECT t.content, v.video_id as youtube_id
+        return self._fetchall("""
+            SELECT COALESCE(t.cleaned_content, t.content) as content, v.video_id as youtube_id, v.id as video_db_id
             FROM transcripts t
             JOIN videos v ON t.video_id = v.id
             WHERE v.author_id = ?
             ORDER BY v.created_at DESC
-        """, (author_id,)).fetchall()
+        """, (author_id,))
 
     def delete_video(self, video_db_id):
-        self.conn.execute("DELETE FROM transcripts WHERE video_id = ?", (video_db_id,))
-        self.conn.execute("DELETE FROM analyses WHERE video_id = ?", (video_db_id,))
-        self.conn.execute("DELETE FROM videos WHERE id = ?", (video_db_id,))
-        self.conn.commit()
+        with self.lock:
+            self.conn.execute("DELETE FROM transcripts WHERE video_id = ?", (video_db_id,))
+            self.conn.execute("DELETE FROM analyses WHERE video_id = ?", (video_db_id,))
+            self.conn.execute("DELETE FROM videos WHERE id = ?", (video_db_id,))
+            self.conn.commit()
+        self._notify('transcripts', 'delete', video_db_id)
+        self._notify('analyses', 'delete', video_db_id)
+
+    def _iter_pages(self, sql, page_size=PAGE_SIZE):
+        """sql は「id > ?」で続きから読み、「ORDER BY id LIMIT ?」で区切る SELECT（先頭の列がid）"""
+        last_id = 0
+        while True:
+            rows = self._fetchall(sql, (last_id, page_size))
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+    def iter_indexable_texts(self):
+        """(テーブル名, 行ID, 本文) を順に返す。字幕・分析は動画のDB IDを行IDとする"""
+        for row in self._iter_pages("SELECT id, video_id, content FROM transcripts WHERE id > ? ORDER BY id LIMIT ?"):
+            yield 'transcripts', row['video_id'], row['content']
+        for row in self._iter_pages("SELECT id, video_id, raw_analysis FROM analyses WHERE id > ? ORDER BY id LIMIT ?"):
+            yield 'analyses', row['video_id'], row['raw_analysis']
+        for row in self._iter_pages("SELECT id, content FROM generated_skits WHERE id > ? ORDER BY id LIMIT ?"):
+            yield 'generated_skits', row['id'], row['content']
+
+    # 類似検索の対象: テーブル → (行IDの列, 本文の列)。字幕・分析は動画のDB IDを行IDとする
+    INDEXABLE_COLUMNS = {
+        'transcripts': ('video_id', 'content'),
+        'analyses': ('video_id', 'raw_analysis'),
+        'generated_skits': ('id', 'content'),
+    }
+
+    def get_indexable_row_ids(self, table):
+        """本文のある行の行ID（本文は読まない）"""
+        row_id, text = self.INDEXABLE_COLUMNS[table]
+        return {row[0] for row in self._fetchall(f"SELECT {row_id} FROM {table} WHERE {text} IS NOT NULL AND {text} != ''")}
+
+    def iter_indexable_texts_by_id(self, table, row_ids):
+        """row_ids の (行ID, 本文) を PAGE_SIZE 件ずつ読んで順に返す"""
+        row_id, text = self.INDEXABLE_COLUMNS[table]
+        row_ids = sorted(row_ids)
+        for start in range(0, len(row_ids), self.PAGE_SIZE):
+            page = row_ids[start:start + self.PAGE_SIZE]
+            yield from self._fetchall(
+                f"SELECT {row_id}, {text} FROM {table} WHERE {row_id} IN ({', '.join('?' * len(page))})", page)
+
+    # 近似重複検出（MinHash署名とLSHバケット）
+    def save_minhash(self, table, row_id, signature, band_hashes):
+        with self.lock:
+            self.conn.execute("DELETE FROM lsh_buckets WHERE source_table = ? AND row_id = ?", (table, row_id))
+            self.conn.execute("INSERT OR REPLACE INTO minhash_signatures (source_table, row_id, signature) VALUES (?, ?, ?)", (table, row_id, signature))
+            self.conn.executemany(
+                "INSERT INTO lsh_buckets (source_table, band, bucket, row_id) VALUES (?, ?, ?, ?)",
+                [(table, band, bucket, row_id) for band, bucket in enumerate(band_hashes)]
+            )
+            self.conn.commit()
+
+    def delete_minhash(self, table, row_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM lsh_buckets WHERE source_table = ? AND row_id = ?", (table, row_id))
+            self.conn.execute("DELETE FROM minhash_signatures WHERE source_table = ? AND row_id = ?", (table, row_id))
+            self.conn.commit()
+
+    # 重複検出の行IDにする列（字幕は動画のDB ID。iter_indexable_texts と同じ）
+    MINHASH_ROW_IDS = {'transcripts': 'video_id', 'generated_skits': 'id'}
+
+    def iter_texts_without_minhash(self, table):
+        """署名のない行の (行ID, 本文) を順に返す。署名のある行の本文は読まない"""
+        column = self.MINHASH_ROW_IDS[table]
+        sql = f"""
+            SELECT t.id, t.{column} AS row_id, t.content FROM {table} t
+            LEFT JOIN minhash_signatures m ON m.source_table = '{table}' AND m.row_id = t.{column}
+            WHERE m.row_id IS NULL AND t.id > ? ORDER BY t.id LIMIT ?
+        """
+        for row in self._iter_pages(sql):
+            yield row['row_id'], row['content']
+
+    def get_minhash_row_ids(self, table):
+        return {row['row_id'] for row in self._fetchall("SELECT row_id FROM minhash_signatures WHERE source_table = ?", (table,))}
+
+    def get_minhash_signatures(self, table):
+        return self._fetchall("SELECT row_id, signature FROM minhash_signatures WHERE source_table = ?", (table,))
+
+    def find_lsh_candidates(self, table, band_hashes):
+        """いずれかのバンドが一致する行の (row_id, signature) を返す"""
+        # バンドごとの等価検索をUNIONでつなぐ（ORでまとめるとidx_lsh_bucketsが使われず全件走査になる）
+        buckets = " UNION ".join(["SELECT row_id FROM lsh_buckets WHERE source_table = ? AND band = ? AND bucket = ?"] * len(band_hashes))
+        params = [table]
+        for band, bucket in enumerate(band_hashes):
+            params.extend([table, band, bucket])
+        return self._fetchall(f"""
+            SELECT m.row_id, m.signature FROM minhash_signatures m
+            WHERE m.source_table = ? AND m.row_id IN ({buckets})
+        """, params)
+
+    def get_lsh_candidate_pairs(self, table):
+        # row_idの比較に + を付けて idx_lsh_buckets_row の範囲検索を使わせない（使うと件数の2乗になる）
+        return self._fetchall("""
+            SELECT DISTINCT a.row_id, b.row_id FROM lsh_buckets a
+            JOIN lsh_buckets b ON a.source_table = b.source_table AND a.band = b.band AND a.bucket = b.bucket AND +a.row_id < +b.row_id
+            WHERE a.source_table = ?
+        """, (table,))
+
+    # Gemini呼び出しの記録
+    def add_llm_call(self, operation, model, prompt_tokens, output_tokens, latency,
+                     author_id=None, prompt_version=None, prompt_chars=None, success=True):
+        self.add_llm_calls([dict(operation=operation, model=model, prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+                                 latency=latency, author_id=author_id, prompt_version=prompt_version,
+                                 prompt_chars=prompt_chars, success=success)])
+
+    def add_llm_calls(self, calls):
+        """add_llm_call の引数のdictのリストを1回のコミットでまとめて保存する"""
+        rows = [(c['operation'], c.get('author_id'), c['model'], c.get('prompt_version'), c.get('prompt_chars'),
+                 c['prompt_tokens'], c['output_tokens'], c['latency'], int(c.get('success', True))) for c in calls]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO llm_calls (operation, author_id, model, prompt_version, prompt_chars, prompt_tokens, output_tokens, latency, success) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    LLM_USAGE_COLUMNS = """
+        COUNT(*) AS calls,
+        SUM(success = 0) AS failures,
+        COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+        COALESCE(SUM(output_tokens), 0) AS output_tokens,
+        COALESCE(SUM(prompt_chars), 0) AS prompt_chars,
+        AVG(latency) AS avg_latency
+    """
+
+    def get_llm_usage_by_operation(self):
+        """処理（テンプレート名）・プロンプトの版・モデルごとの呼び出し数とトークン数（トークンの多い順）"""
+        return self._fetchall(f"""
+            SELECT operation, prompt_version, model, {self.LLM_USAGE_COLUMNS}
+            FROM llm_calls
+            GROUP BY operation, prompt_version, model
+            ORDER BY prompt_tokens + output_tokens DESC
+        """)
+
+    def get_llm_usage_by_author(self, limit=None):
+        """作者・モデルごとの呼び出し数とトークン数（トークンの多い順、作者なしの呼び出しはauthor_idがNULL）"""
+        return self._fetchall(f"""
+            SELECT c.author_id, a.name AS author_name, c.model, {self.LLM_USAGE_COLUMNS}
+            FROM llm_calls c
+            LEFT JOIN authors a ON c.author_id = a.id
+            GROUP BY c.author_id, c.model
+            ORDER BY prompt_tokens + output_tokens DESC
+            LIMIT ?
+        """, (-1 if limit is None else limit,))
 
     # 設定関連
     def get_setting(self, key, default=None):
-        result = self.conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        result = self._fetchone("SELECT value FROM settings WHERE key = ?", (key,))
         return result['value'] if result else default
 
     def set_setting(self, key, value):
-        self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-        self.conn.commit()
+        self._write("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
 
     # 生成トーク関連
-    def save_skit(self, author_id, title, content, theme=None, char_a=None, char_b=None):
-        cursor = self.conn.execute(
-            "INSERT INTO generated_skits (author_id, title, content, theme, char_a, char_b) VALUES (?, ?, ?, ?, ?, ?)",
-            (author_id, title, content, theme, char_a, char_b)
+    def save_skit(self, author_id, title, content, theme=None, char_a=None, char_b=None, prompt_version=None):
+        cursor = self._write(
+            "INSERT INTO generated_skits (author_id, title, content, theme, char_a, char_b, prompt_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (author_id, title, content, theme, char_a, char_b, prompt_version)
         )
-        self.conn.commit()
+        self._notify('generated_skits', 'upsert', cursor.lastrowid, content)
         return cursor.lastrowid
 
     def get_skits_by_author(self, author_id):
-        return self.conn.execute(
+        return self._fetchall(
             "SELECT * FROM generated_skits WHERE author_id = ? ORDER BY created_at DESC",
             (author_id,)
-        ).fetchall()
+        )
 
     def get_all_skits(self):
-        return self.conn.execute(
+        return self._fetchall(
             "SELECT s.*, a.name as author_name FROM generated_skits s LEFT JOIN authors a ON s.author_id = a.id ORDER BY s.created_at DESC"
-        ).fetchall()
+        )
 
     def get_skit(self, skit_id):
-        return self.conn.execute("SELECT * FROM generated_skits WHERE id = ?", (skit_id,)).fetchone()
+        return self._fetchone("SELECT * FROM generated_skits WHERE id = ?", (skit_id,))
+
+    # 一括音声生成の結果
+    def set_skit_audio(self, skit_id, output_dir, status, error=None, file_count=0):
+        self._write(
+            "INSERT OR REPLACE INTO skit_audio (skit_id, output_dir, status, error, file_count, updated_at) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (skit_id, output_dir, status, error, file_count)
+        )
+
+    def get_skit_audio(self, skit_id):
+        return self._fetchone("SELECT * FROM skit_audio WHERE skit_id = ?", (skit_id,))
 
     def delete_skit(self, skit_id):
-        self.conn.execute("DELETE FROM generated_skits WHERE id = ?", (skit_id,))
-        self.conn.commit()
+        with self.lock:
+            self.conn.execute("DELETE FROM skit_audio WHERE skit_id = ?", (skit_id,))
+            self.conn.execute("DELETE FROM generated_skits WHERE id = ?", (skit_id,))
+            self.conn.commit()
+        self._notify('generated_skits', 'delete', skit_id)
 
     def close(self):
-        self.conn.close()
+        with self.lock:
+            self.conn.close()
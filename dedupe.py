@@ -0,0 +1,111 @@
+import zlib
+
+import numpy as np
+
+# MinHash / LSH 設定（16バンド×8行 → 類似度0.7付近から候補になる）
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.8
+
+# 重複検出の対象テーブル
+DEDUPE_TABLES = ('transcripts', 'generated_skits')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, _MAX_HASH, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, _MAX_HASH, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    text = ''.join(text.split())
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash(text):
+    """文字シングルのMinHash署名（uint32 × NUM_PERM）"""
+    items = shingles(text)
+    if not items:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint32)
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in items), dtype=np.uint64, count=len(items))
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature):
+    return [zlib.crc32(signature[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].tobytes()) for b in range(BANDS)]
+
+
+def similarity(sig_a, sig_b):
+    """署名から推定したJaccard類似度"""
+    return float(np.mean(sig_a == sig_b))
+
+
+class NearDuplicateDetector:
+    """字幕・生成トークの近似重複検出（署名とLSHバケットはDBに保存）"""
+
+    def __init__(self, db, threshold=DUPLICATE_THRESHOLD):
+        self.db = db
+        self.threshold = threshold
+
+    def attach(self):
+        self.db.add_listener(self.on_db_change)
+
+    def on_db_change(self, table, action, row_id, content=None):
+        if table not in DEDUPE_TABLES:
+            return
+        if action == 'delete':
+            self.db.delete_minhash(table, row_id)
+        elif content:
+            self.add(table, row_id, content)
+
+    def add(self, table, row_id, content):
+        signature = minhash(content)
+        self.db.save_minhash(table, row_id, signature.tobytes(), band_hashes(signature))
+
+    def sync(self):
+        """署名が未計算の行を登録する（対象はDEDUPE_TABLESだけ。未計算の行はSQLで選ぶ）"""
+        for table in DEDUPE_TABLES:
+            for row_id, content in self.db.iter_texts_without_minhash(table):
+                if content:
+                    self.add(table, row_id, content)
+
+    def find_duplicates(self, table, content, exclude_id=None):
+        """contentと近似重複する既存行を [(row_id, 類似度), ...] で返す"""
+        signature = minhash(content)
+        candidates = self.db.find_lsh_candidates(table, band_hashes(signature))
+        duplicates = []
+        for row_id, blob in candidates:
+            if row_id == exclude_id:
+                continue
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score >= self.threshold:
+                duplicates.append((row_id, score))
+        duplicates.sort(key=lambda d: d[1], reverse=True)
+        return duplicates
+
+    def report(self, table):
+        """近似重複のグループを返す（各グループは行IDのリスト、2件以上のもののみ）"""
+        parent = {}
+
+        def find(x):
+            while parent.setdefault(x, x) != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        signatures = {row_id: np.frombuffer(blob, dtype=np.uint32)
+                      for row_id, blob in self.db.get_minhash_signatures(table)}
+        for row_a, row_b in self.db.get_lsh_candidate_pairs(table):
+            if row_a in signatures and row_b in signatures:
+                if similarity(signatures[row_a], signatures[row_b]) >= self.threshold:
+                    parent[find(row_a)] = find(row_b)
+
+        groups = {}
+        for row_id in parent:
+            groups.setdefault(find(row_id), []).append(row_id)
+        return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+import zlib
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_ROOT = os.path.join(BASE_DIR, 'data', 'embedding_index')
+
+# 文字n-gramのハッシュ次元（100k件で約200MB）
+NGRAM_DIM = 512
+NGRAM_SIZES = (2, 3)
+INITIAL_CAPACITY = 1024
+
+# キー = 種別 << KIND_SHIFT | 行ID
+KIND_SHIFT = 40
+KIND_TRANSCRIPT = 1
+KIND_ANALYSIS = 2
+KIND_SKIT = 3
+TABLE_KINDS = {
+    'transcripts': KIND_TRANSCRIPT,
+    'analyses': KIND_ANALYSIS,
+    'generated_skits': KIND_SKIT,
+}
+
+
+def make_key(kind, row_id):
+    return (kind << KIND_SHIFT) | row_id
+
+
+def split_key(key):
+    return key >> KIND_SHIFT, key & ((1 << KIND_SHIFT) - 1)
+
+
+class NgramEmbedder:
+    """文字n-gramをハッシュしてTF（対数）ベクトルにする。IDFはインデックス側で掛ける"""
+
+    name = 'ngram'
+    uses_idf = True
+
+    def __init__(self, dim=NGRAM_DIM, ngram_sizes=NGRAM_SIZES):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    def embed(self, text):
+        text = ''.join(text.split())
+        buckets = []
+        for n in self.ngram_sizes:
+            for i in range(len(text) - n + 1):
+                buckets.append(zlib.crc32(text[i:i + n].encode('utf-8')) % self.dim)
+        vec = np.bincount(np.asarray(buckets, dtype=np.int64), minlength=self.dim).astype(np.float32)
+        return np.log1p(vec, out=vec)
+
+
+class GeminiEmbedder:
+    """Geminiの埋め込みモデルを使う（任意）"""
+
+    uses_idf = False
+
+    def __init__(self, client, model='text-embedding-004', dim=768):
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.name = f'gemini-{model}'
+
+    def embed(self, text):
+        result = self.client.models.embed_content(model=self.model, contents=text)
+        return np.asarray(result.embeddings[0].values, dtype=np.float32)
+
+
+class EmbeddingIndex:
+    """ディスク上にメモリマップしたベクトルインデックス
+
+    vectors.f32 / keys.i64 を容量倍々で伸ばしながら追記し、削除はキーを-1にして枠を再利用する。
+    """
+
+    def __init__(self, directory=None, embedder=None):
+        self.embedder = embedder or NgramEmbedder()
+        self.dim = self.embedder.dim
+        self.directory = directory or os.path.join(INDEX_ROOT, self.embedder.name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.meta_path = os.path.join(self.directory, 'meta.json')
+        self.df_path = os.path.join(self.directory, 'df.npy')
+        self.lock = threading.RLock()
+        self._load()
+
+    # --- 永続化 ---
+
+    def _open_arrays(self, capacity, mode):
+        self.vectors = np.memmap(os.path.join(self.directory, 'vectors.f32'), dtype=np.float32,
+                                 mode=mode, shape=(capacity, self.dim))
+        self.keys = np.memmap(os.path.join(self.directory, 'keys.i64'), dtype=np.int64,
+                              mode=mode, shape=(capacity,))
+
+    def _load(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.capacity = meta['capacity']
+            self.count = meta['count']
+            self.doc_count = meta['doc_count']
+            self.df = np.load(self.df_path)
+            self._open_arrays(self.capacity, 'r+')
+        else:
+            self.capacity = INITIAL_CAPACITY
+            self.count = 0
+            self.doc_count = 0
+            self.df = np.zeros(self.dim, dtype=np.float64)
+            self._open_arrays(self.capacity, 'w+')
+            self.keys[:] = -1
+            self._save_meta()
+        used = np.asarray(self.keys[:self.count])
+        self.rows = {int(k): i for i, k in enumerate(used) if k >= 0}
+        self.free_rows = [i for i, k in enumerate(used) if k < 0]
+
+    def _save_meta(self):
+        np.save(self.df_path, self.df)
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'capacity': self.capacity, 'count': self.count, 'doc_count': self.doc_count,
+                       'dim': self.dim, 'embedder': self.embedder.name}, f)
+
+    def flush(self):
+        with self.lock:
+            self.vectors.flush()
+            self.keys.flush()
+            self._save_meta()
+
+    def _grow(self):
+        old_vectors = np.array(self.vectors[:self.count])
+        old_keys = np.array(self.keys[:self.count])
+        del self.vectors, self.keys
+        self.capacity *= 2
+        self._open_arrays(self.capacity, 'w+')
+        self.vectors[:self.count] = old_vectors
+        self.keys[:] = -1
+        self.keys[:self.count] = old_keys
+
+    # --- 追加・削除 ---
+
+    def _idf(self):
+        return np.log((1 + self.doc_count) / (1 + self.df)).astype(np.float32) + 1
+
+    def _weight(self, vec):
+        if self.embedder.uses_idf:
+            vec = vec * self._idf()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def add(self, key, text, flush=True):
+        with self.lock:
+            self._remove(key)
+            raw = self.embedder.embed(text)
+            if self.embedder.uses_idf:
+                self.df += raw > 0
+                self.doc_count += 1
+            if self.free_rows:
+                row = self.free_rows.pop()
+            else:
+                if self.count >= self.capacity:
+                    self._grow()
+                row = self.count
+                self.count += 1
+            self.vectors[row] = self._weight(raw)
+            self.keys[row] = key
+            self.rows[key] = row
+            if flush:
+                self._save_meta()
+
+    def _remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return False
+        if self.embedder.uses_idf:
+            self.df -= np.asarray(self.vectors[row]) != 0
+            self.doc_count -= 1
+        self.keys[row] = -1
+        self.vectors[row] = 0
+        self.free_rows.append(row)
+        return True
+
+    def remove(self, key):
+        with self.lock:
+            removed = self._remove(key)
+            if removed:
+                self._save_meta()
+            return removed
+
+    def __len__(self):
+        return len(self.rows)
+
+    # --- 検索 ---
+
+    def search(self, text, k=10, kind=None, keys=None):
+        """類似上位k件を [(key, score), ...] で返す。kind/keysで対象を絞れる"""
+        with self.lock:
+            query = self._weight(self.embedder.embed(text))
+            if keys is not None:
+                rows = np.array([self.rows[key] for key in keys if key in self.rows], dtype=np.int64)
+            else:
+                rows = None
+            if rows is not None:
+                if len(rows) == 0:
+                    return []
+                scores = self.vectors[rows] @ query
+                row_keys = np.asarray(self.keys[rows])
+            else:
+                scores = self.vectors[:self.count] @ query
+                row_keys = np.asarray(self.keys[:self.count])
+            valid = row_keys >= 0
+            if kind is not None:
+                valid &= (row_keys >> KIND_SHIFT) == kind
+            scores = np.where(valid, scores, -np.inf)
+            k = min(k, int(valid.sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(row_keys[i]), float(scores[i])) for i in top]
+
+    def rebuild(self, db):
+        """IDFを現在のコーパスで再計算して全件入れ直す"""
+        with self.lock:
+            del self.vectors, self.keys
+            for name in ('vectors.f32', 'keys.i64', 'meta.json', 'df.npy'):
+                path = os.path.join(self.directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._load()
+            self.sync(db)
+
+    # --- Database連携 ---
+
+    def sync(self, db):
+        """インデックスをDBに合わせる: DBにない行（アプリを閉じている間に消えた行）を除き、未登録の行を入れる
+
+        突き合わせは行IDだけで行い、本文は未登録の行の分だけ読む。CLI（corpus_io等）で書いた行もここで入る。
+        ロックは1件ごとに取る。裏で作っている間も、UIスレッドからの保存（on_db_change）を待たせない。
+        (除いた件数, 入れた件数) を返す。
+        """
+        with self.lock:
+            known = set(self.rows)
+        removed = added = 0
+        for table, kind in TABLE_KINDS.items():
+            in_db = {make_key(kind, row_id) for row_id in db.get_indexable_row_ids(table)}
+            in_index = {key for key in known if key >> KIND_SHIFT == kind}
+            for key in in_index - in_db:
+                with self.lock:
+                    removed += self._remove(key)
+            missing = [split_key(key)[1] for key in in_db - in_index]
+            for row_id, content in db.iter_indexable_texts_by_id(table, missing):
+                if content:
+                    self.add(make_key(kind, row_id), content, flush=False)
+                    added += 1
+        self.flush()
+        return removed, added
+
+    def attach(self, db):
+        db.add_listener(self.on_db_change)
+
+    def on_db_change(self, table, action, row_id, content=None):
+        kind = TABLE_KINDS.get(table)
+        if kind is None:
+            return
+        key = make_key(kind, row_id)
+        if action == 'delete':
+            self.remove(key)
+        elif content:
+            self.add(key, content)
@@ -0,0 +1,101 @@
+import threading
+import time
+
+# 外したエンジンを再確認するまでの秒数
+RECHECK_INTERVAL = 10.0
+
+
+class Engine:
+    """エンジン1つ分の状態"""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.checked_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+
+class EnginePool:
+    """複数のVOICEVOXエンジンへの振り分け
+
+    処理中のリクエストが最も少ないエンジンを選ぶ。通信に失敗したエンジンは外し、
+    RECHECK_INTERVAL秒ごとに health_check(url) で確認して戻す。
+    全エンジンが外れている時は、外したエンジンにもそのまま送る（1台構成で一度の失敗が尾を引かないように）。
+    """
+
+    def __init__(self, urls, health_check, recheck_interval=RECHECK_INTERVAL):
+        self.engines = [Engine(url.rstrip("/")) for url in dict.fromkeys(urls)]
+        self.health_check = health_check
+        self.recheck_interval = recheck_interval
+        self.lock = threading.Lock()
+        self.failovers = 0
+
+    @property
+    def urls(self):
+        return [engine.url for engine in self.engines]
+
+    def needs_recheck(self):
+        now = time.monotonic()
+        return any(not e.healthy and now - e.checked_at >= self.recheck_interval for e in self.engines)
+
+    def recheck_due(self):
+        """外したエンジンのうち、再確認の時期が来たものを確認する"""
+        now = time.monotonic()
+        with self.lock:
+            due = [e for e in self.engines if not e.healthy and now - e.checked_at >= self.recheck_interval]
+            # 他のスレッドが同じエンジンを同時に確認しないよう、先に時刻だけ更新する
+            for engine in due:
+                engine.checked_at = now
+        for engine in due:
+            if self.health_check(engine.url):
+                with self.lock:
+                    engine.healthy = True
+
+    def check_all(self):
+        """全エンジンを確認し、1つでも使えればTrue"""
+        results = [(engine, self.health_check(engine.url)) for engine in self.engines]
+        now = time.monotonic()
+        with self.lock:
+            for engine, ok in results:
+                engine.healthy = ok
+                engine.checked_at = now
+        return any(ok for _, ok in results)
+
+    def acquire(self, exclude=()):
+        """送り先のエンジンを選んで処理中に数える。exclude以外に候補がなければNone"""
+        with self.lock:
+            candidates = [e for e in self.engines if e.healthy and e not in exclude]
+            if not candidates:
+                candidates = [e for e in self.engines if e not in exclude]
+            if not candidates:
+                return None
+            engine = min(candidates, key=lambda e: (e.outstanding, e.requests))
+            engine.outstanding += 1
+            engine.requests += 1
+            return engine
+
+    def release(self, engine, ok=True):
+        """acquireしたエンジンを返す。ok=Falseなら通信失敗として外す"""
+        with self.lock:
+            engine.outstanding -= 1
+            if not ok:
+                engine.failures += 1
+                self.failovers += 1
+                if engine.healthy:
+                    engine.healthy = False
+                    engine.checked_at = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            data = {
+                'engines': len(self.engines),
+                'healthy': sum(1 for e in self.engines if e.healthy),
+                'failovers': self.failovers,
+            }
+            for engine in self.engines:
+                data[f'{engine.url}.outstanding'] = engine.outstanding
+                data[f'{engine.url}.requests'] = engine.requests
+                data[f'{engine.url}.failures'] = engine.failures
+            return data
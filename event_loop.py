@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 同期ライブラリ（youtube_transcript_api等）を呼ぶためのスレッド数上限
+BLOCKING_IO_WORKERS = 16
+
+
+class EventLoopThread:
+    """専用スレッドで動く共有イベントループ
+
+    Tkアプリ・CLIのどちらからでもコルーチンを投入でき、
+    結果は concurrent.futures.Future で受け取る。
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+        self.loop.set_default_executor(self.executor)
+        self.thread = threading.Thread(target=self._run, name="event-loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """コルーチンを投入し、concurrent.futures.Futureを返す"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """コルーチンを投入して完了まで待つ（イベントループスレッド外から呼ぶこと）"""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.executor.shutdown(wait=False)
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_loop_thread():
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread()
+        return _loop_thread
+
+
+def submit(coro):
+    return get_loop_thread().submit(coro)
+
+
+def run(coro, timeout=None):
+    return get_loop_thread().run(coro, timeout)
+
+
+def submit_to_tk(root, coro, callback, poll_ms=50):
+    """コルーチンを投入し、完了したらTkのメインスレッドでcallback(result or exception)を呼ぶ"""
+    future = submit(coro)
+
+    def poll():
+        if not future.done():
+            root.after(poll_ms, poll)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            result = e
+        callback(result)
+
+    root.after(poll_ms, poll)
+    return future
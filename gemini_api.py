@@ -1,140 +1,305 @@
-﻿from google import genai
+﻿import asyncio
+import logging
+import queue
+import threading
+import time
 from config import GEMINI_API_KEY, GEMINI_MODEL
+import event_loop
+import metrics
+import prompts
+from rate_limiter import AdaptiveRateLimiter
+from skit_scorer import rank_skits
 
-ANALYSIS_PROMPT = '''
-以下はYouTube動画の字幕（コメディ/コント）です。
-このコンテンツが「なぜ面白いのか」をロジカルに分析してください。
+# レート制限設定（全GeminiAPIインスタンスで共有）
+GEMINI_REQUESTS_PER_MINUTE = 15
+GEMINI_MAX_CONCURRENCY = 10
+GEMINI_MAX_RETRIES = 5
+GEMINI_RETRY_BASE_DELAY = 2.0
 
-## 分析項目
-1. 擦り続けている概念/言葉
-2. ボケのパターン
-3. ツッコミのパターン
-4. 構造（導入→展開→オチ）
-5. このコンテンツの公式（○○×○○→○○）
+# 料金の目安（100万トークンあたりのUSD）。config.py の GEMINI_PRICING で {モデル名: (入力, 出力)} を指定
+# 例: GEMINI_PRICING = {"gemini-2.5-flash": (0.30, 2.50)}
+try:
+    from config import GEMINI_PRICING
+except ImportError:
+    GEMINI_PRICING = {}
 
-## 字幕テキスト
-{transcript}
-'''
+logger = logging.getLogger(__name__)
 
-AUTHOR_PATTERN_PROMPT = '''
-以下は同じ作者による複数のコメディ動画の分析結果です。
-共通パターンを抽出してください。
+_shared_limiter = None
 
-## 分析項目
-1. この作者の特徴的なボケのパターン
-2. この作者の特徴的なツッコミのパターン
-3. この作者がよく使う構造
-4. この作者の公式
-5. この作者のスタイルを再現するポイント
+def get_shared_limiter():
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = AdaptiveRateLimiter(GEMINI_REQUESTS_PER_MINUTE, max_concurrency=GEMINI_MAX_CONCURRENCY)
+        metrics.registry.register_collector('gemini.rate_limiter', _shared_limiter.stats)
+    return _shared_limiter
 
-## 各動画の分析結果
-{analyses}
-'''
+def is_rate_limited(error):
+    """429 / RESOURCE_EXHAUSTED かどうか"""
+    if getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429:
+        return True
+    message = str(error)
+    return '429' in message or 'RESOURCE_EXHAUSTED' in message
 
-GENERATE_SKIT_PROMPT = '''
-あなたは「{author_name}」のゴーストライターです。
-セリフサンプルを完全に模倣して新しいコントを書いてください。
+def usage_tokens(response):
+    """応答の (入力トークン数, 出力トークン数)。出力には思考トークンも含める（出力として課金されるため）"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None, None
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    total_tokens = getattr(usage, 'total_token_count', None)
+    if prompt_tokens is not None and total_tokens is not None:
+        return prompt_tokens, total_tokens - prompt_tokens
+    return prompt_tokens, getattr(usage, 'candidates_token_count', None)
 
-## 絶対厳守ルール
+def estimate_cost(model, prompt_tokens, output_tokens):
+    """GEMINI_PRICINGから見積もった料金（USD）。料金の設定がないモデルはNone"""
+    price = GEMINI_PRICING.get(model)
+    if not price:
+        return None
+    return ((prompt_tokens or 0) * price[0] + (output_tokens or 0) * price[1]) / 1_000_000
 
-### 1. セリフサンプルの構造を完全コピー
-- ボケとツッコミの役割をサンプルと同じにする
-- ツッコミのスタイル（オウム返し、冷静な指摘、等）をサンプルと同じにする
-- 両方がボケているサンプルでない限り、片方は常識人
+# 記録スレッドが1回のコミットでまとめて書く呼び出し記録の上限
+USAGE_BATCH_SIZE = 100
 
-### 2. 短く
-- 5〜8往復程度
+class UsageRecorder:
+    """呼び出し記録を llm_calls に書く専用スレッド
 
-### 3. トーンを合わせる
-- セリフサンプルで「！」「？」が少なければ使わない
-- 淡々としていれば淡々と
+    record はキューに積むだけなので、イベントループやワーカーがDBの書き込み（コミットのfsync）を待たない。
+    """
 
-## テーマ
-{theme}
+    def __init__(self, db, batch_size=USAGE_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
 
-## ★これを完全に模倣せよ★
-{transcripts}
+    def record(self, **call):
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="llm-usage-recorder", daemon=True)
+                self.thread.start()
+        self.queue.put(call)
 
-## 参考
-{analyses}
+    def flush(self):
+        """積んだ記録がすべて書き込まれるまで待つ（集計の前に呼ぶ）"""
+        self.queue.join()
 
-{pattern}
+    def _run(self):
+        while True:
+            calls = [self.queue.get()]
+            while len(calls) < self.batch_size:
+                try:
+                    calls.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.db.add_llm_calls(calls)
+            except Exception as e:
+                # 記録の失敗で生成結果を捨てないよう、ログだけにする
+                logger.warning("[gemini_api] %d llm calls not recorded: %s", len(calls), e)
+            finally:
+                for _ in calls:
+                    self.queue.task_done()
 
-## 出力形式（厳守）
-【重要】キャラクター名は必ず「A」と「B」のみを使用すること。
-独自のキャラクター名（例：「審査官」「助手」「店員」等）は絶対に使用禁止。
-必ず「A: セリフ」「B: セリフ」の形式で1行で書く。改行してはいけない。
+class GeminiAPI:
+    def __init__(self, client=None, limiter=None, db=None):
+        # client / limiter はベンチマーク等で差し替える時だけ渡す
+        self._client = client
+        self.model_name = GEMINI_MODEL
+        self.limiter = limiter or get_shared_limiter()
+        # 渡されていれば、呼び出しごとのトークン数を llm_calls に記録する（書き込みは記録スレッドで行う）
+        self.recorder = UsageRecorder(db) if db is not None else None
 
-タイトル: 〇〇
+    def flush_usage(self):
+        """呼び出し記録をDBに書き終えるまで待つ"""
+        if self.recorder is not None:
+            self.recorder.flush()
 
-A: ここにAのセリフを書く
-B: ここにBのセリフを書く
-A: 次のAのセリフ
-B: 次のBのセリフ
-'''
+    @property
+    def client(self):
+        """google-genaiの読み込みとクライアント生成は初回リクエストまで遅らせる"""
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=GEMINI_API_KEY)
+        return self._client
 
-class GeminiAPI:
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.model_name = GEMINI_MODEL
+    def _record_call(self, template, author_id, prompt, elapsed, response=None):
+        """呼び出し1回分を記録する。response=Noneは失敗した呼び出し
 
-    def _generate(self, prompt):
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=prompt
+        メトリクスにはテンプレートの版ごとの所要時間とトークン数（版を変えた時の比較用）、
+        dbがあれば記録スレッド経由で llm_calls に1行。
+        """
+        prompt_tokens, output_tokens = usage_tokens(response)
+        if template is not None and response is not None:
+            metrics.observe(f'gemini.template.{template.key}', elapsed)
+            metrics.increment(f'gemini.template.{template.key}.prompt_tokens', prompt_tokens or 0)
+            metrics.increment(f'gemini.template.{template.key}.output_tokens', output_tokens or 0)
+        if self.recorder is None:
+            return
+        self.recorder.record(
+            operation=template.name if template is not None else 'other', model=self.model_name,
+            prompt_tokens=prompt_tokens, output_tokens=output_tokens, latency=elapsed, author_id=author_id,
+            prompt_version=template.version if template is not None else None,
+            prompt_chars=len(prompt), success=response is not None
         )
-        return response.text
 
-    def analyze_video(self, transcript):
+    @metrics.timed('gemini.generate')
+    def _generate(self, prompt, template=None, author_id=None):
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            metrics.observe('gemini.rate_limit_wait', self.limiter.acquire())
+            start = time.monotonic()
+            try:
+                with metrics.timer('gemini.request'):
+                    response = self.client.models.generate_content(
+                        model=self.model_name,
+                        contents=prompt
+                    )
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                if throttled:
+                    metrics.increment('gemini.throttled')
+                self.limiter.release(time.monotonic() - start, throttled=throttled)
+                self._record_call(template, author_id, prompt, time.monotonic() - start)
+                if throttled and attempt < GEMINI_MAX_RETRIES:
+                    time.sleep(GEMINI_RETRY_BASE_DELAY * (2 ** attempt))
+                    continue
+                raise
+            elapsed = time.monotonic() - start
+            self.limiter.release(elapsed)
+            self._record_call(template, author_id, prompt, elapsed, response)
+            return response.text
+
+    @metrics.timed('gemini.generate')
+    async def _generate_async(self, prompt, template=None, author_id=None):
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            metrics.observe('gemini.rate_limit_wait', await self.limiter.acquire_async())
+            start = time.monotonic()
+            try:
+                with metrics.timer('gemini.request'):
+                    response = await self.client.aio.models.generate_content(
+                        model=self.model_name,
+                        contents=prompt
+                    )
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                if throttled:
+                    metrics.increment('gemini.throttled')
+                self.limiter.release(time.monotonic() - start, throttled=throttled)
+                self._record_call(template, author_id, prompt, time.monotonic() - start)
+                if throttled and attempt < GEMINI_MAX_RETRIES:
+                    await asyncio.sleep(GEMINI_RETRY_BASE_DELAY * (2 ** attempt))
+                    continue
+                raise
+            elapsed = time.monotonic() - start
+            self.limiter.release(elapsed)
+            self._record_call(template, author_id, prompt, elapsed, response)
+            return response.text
+
+    def get_rate_stats(self):
+        return self.limiter.stats()
+
+    def analyze_video(self, transcript, author_id=None):
         try:
-            prompt = ANALYSIS_PROMPT.format(transcript=transcript)
-            return {'success': True, 'analysis': self._generate(prompt)}
+            prompt = prompts.ANALYSIS.render(transcript=transcript)
+            return {'success': True, 'analysis': self._generate(prompt, prompts.ANALYSIS, author_id),
+                    'prompt_version': prompts.ANALYSIS.version}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def analyze_author_patterns(self, analyses_text):
+    def analyze_author_patterns(self, analyses_text, author_id=None):
         try:
-            prompt = AUTHOR_PATTERN_PROMPT.format(analyses=analyses_text)
-            return {'success': True, 'analysis': self._generate(prompt)}
+            prompt = prompts.AUTHOR_PATTERN.render(analyses=analyses_text)
+            return {'success': True, 'analysis': self._generate(prompt, prompts.AUTHOR_PATTERN, author_id),
+                    'prompt_version': prompts.AUTHOR_PATTERN.version}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def generate_short_skit(self, author_name, pattern, transcripts, analyses, theme="自由"):
+    def analyze_global_patterns(self, patterns_text):
+        """複数作者のパターン分析から共通法則を抽出する"""
         try:
-            prompt = GENERATE_SKIT_PROMPT.format(
-                author_name=author_name,
-                pattern=pattern if pattern else "（パターン分析なし）",
-                transcripts=transcripts,
-                analyses=analyses if analyses else "（分析結果なし）",
-                theme=theme if theme else "自由"
-            )
-            return {'success': True, 'skit': self._generate(prompt), 'prompt': prompt}
+            prompt = prompts.GLOBAL_ANALYSIS.render(patterns=patterns_text)
+            return {'success': True, 'analysis': self._generate(prompt, prompts.GLOBAL_ANALYSIS),
+                    'prompt_version': prompts.GLOBAL_ANALYSIS.version}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def convert_to_character(self, skit, char_a_info, char_b_info):
+    def _build_skit_prompt(self, author_name, pattern, transcripts, analyses, theme):
+        return prompts.GENERATE_SKIT.render(
+            author_name=author_name,
+            pattern=pattern if pattern else "（パターン分析なし）",
+            transcripts=transcripts,
+            analyses=analyses if analyses else "（分析結果なし）",
+            theme=theme if theme else "自由"
+        )
+
+    def generate_short_skit(self, author_name, pattern, transcripts, analyses, theme="自由", author_id=None):
         try:
-            prompt = f'''
-以下のコントを、指定されたキャラクターの口調に変換してください。
-内容は変えず、口調だけを変えてください。
+            prompt = self._build_skit_prompt(author_name, pattern, transcripts, analyses, theme)
+            return {'success': True, 'skit': self._generate(prompt, prompts.GENERATE_SKIT, author_id), 'prompt': prompt,
+                    'prompt_version': prompts.GENERATE_SKIT.version}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
 
-## キャラA: {char_a_info['name']}
-口調: {char_a_info['tone']}
-例: {char_a_info['example']}
+    async def analyze_video_async(self, transcript, author_id=None):
+        try:
+            prompt = prompts.ANALYSIS.render(transcript=transcript)
+            return {'success': True, 'analysis': await self._generate_async(prompt, prompts.ANALYSIS, author_id),
+                    'prompt_version': prompts.ANALYSIS.version}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    async def analyze_author_patterns_async(self, analyses_text, author_id=None):
+        try:
+            prompt = prompts.AUTHOR_PATTERN.render(analyses=analyses_text)
+            return {'success': True, 'analysis': await self._generate_async(prompt, prompts.AUTHOR_PATTERN, author_id),
+                    'prompt_version': prompts.AUTHOR_PATTERN.version}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
 
-## キャラB: {char_b_info['name']}
-口調: {char_b_info['tone']}
-例: {char_b_info['example']}
+    async def generate_short_skit_async(self, author_name, pattern, transcripts, analyses, theme="自由", author_id=None):
+        try:
+            prompt = self._build_skit_prompt(author_name, pattern, transcripts, analyses, theme)
+            return {'success': True, 'skit': await self._generate_async(prompt, prompts.GENERATE_SKIT, author_id), 'prompt': prompt,
+                    'prompt_version': prompts.GENERATE_SKIT.version}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
 
-## 元のコント
-{skit}
+    async def generate_skit_candidates_async(self, author_name, pattern, transcripts, analyses, theme="自由", count=5, author_id=None):
+        """同じプロンプトでcount件を並列生成し、採点して高い順に返す"""
+        prompt = self._build_skit_prompt(author_name, pattern, transcripts, analyses, theme)
+        results = await asyncio.gather(
+            *[self._generate_async(prompt, prompts.GENERATE_SKIT, author_id) for _ in range(count)],
+            return_exceptions=True
+        )
+        skits = [r for r in results if not isinstance(r, BaseException)]
+        errors = [str(r) for r in results if isinstance(r, BaseException)]
+        if not skits:
+            return {'success': False, 'error': errors[0] if errors else "候補が生成されませんでした"}
+        return {
+            'success': True,
+            'candidates': rank_skits(skits, transcripts),
+            'prompt': prompt,
+            'prompt_version': prompts.GENERATE_SKIT.version,
+            'errors': errors,
+        }
 
-## 出力形式（厳守）
-必ず「キャラ名: セリフ」を1行で書く。改行してはいけない。
+    def generate_skit_candidates(self, author_name, pattern, transcripts, analyses, theme="自由", count=5, author_id=None):
+        return event_loop.run(self.generate_skit_candidates_async(author_name, pattern, transcripts, analyses, theme, count, author_id))
 
-{char_a_info['name']}: ここにセリフを書く
-{char_b_info['name']}: ここにセリフを書く
-'''
-            return {'success': True, 'skit': self._generate(prompt)}
+    def convert_to_character(self, skit, char_a_info, char_b_info, author_id=None):
+        try:
+            prompt = prompts.CONVERT_CHARACTER.render(
+                char_a_name=char_a_info['name'],
+                char_a_tone=char_a_info['tone'],
+                char_a_example=char_a_info['example'],
+                char_b_name=char_b_info['name'],
+                char_b_tone=char_b_info['tone'],
+                char_b_example=char_b_info['example'],
+                skit=skit
+            )
+            return {'success': True, 'skit': self._generate(prompt, prompts.CONVERT_CHARACTER, author_id),
+                    'prompt_version': prompts.CONVERT_CHARACTER.version}
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageEnhance
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMBNAIL_CACHE_DIR = os.path.join(SCRIPT_DIR, "data", "thumbnail_cache")
+MEMORY_CACHE_SIZE = 32
+
+
+def resize_image(img, max_width, max_height):
+    """画像をリサイズ（アスペクト比を維持）"""
+    ratio = min(max_width / img.width, max_height / img.height)
+    new_size = (int(img.width * ratio), int(img.height * ratio))
+    return img.resize(new_size, Image.Resampling.LANCZOS)
+
+
+def make_bounce_frame(img, offset):
+    """同じサイズのまま画像を少し上にずらした差分（口パク画像がない場合の代用）"""
+    frame = Image.new("RGBA", img.size, (0, 0, 0, 0))
+    frame.paste(img.convert("RGBA"), (0, -offset))
+    return frame
+
+
+class ThumbnailCache:
+    """立ち絵の縮小版・暗転版のキャッシュ
+
+    キーは (パス, 更新時刻, サイズ, 明るさ)。メモリ上のLRUとディスク上のPNGの2段構成。
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, memory_size=MEMORY_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, path, size, brightness):
+        path = os.path.abspath(path)
+        return (path, os.stat(path).st_mtime_ns, tuple(size), round(brightness, 3))
+
+    def _disk_paths(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return (os.path.join(self.cache_dir, f"{digest}.png"),
+                os.path.join(self.cache_dir, f"{digest}_dim.png"))
+
+    def get(self, path, size, brightness):
+        """(通常版, 暗転版) のPIL画像を返す"""
+        key = self._key(path, size, brightness)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+
+        normal_path, dim_path = self._disk_paths(key)
+        if os.path.exists(normal_path) and os.path.exists(dim_path):
+            images = (Image.open(normal_path), Image.open(dim_path))
+            for img in images:
+                img.load()
+            self.disk_hits += 1
+        else:
+            with Image.open(path) as src:
+                normal = resize_image(src, size[0], size[1])
+            dim = ImageEnhance.Brightness(normal).enhance(brightness)
+            images = (normal, dim)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            normal.save(normal_path)
+            dim.save(dim_path)
+            self.misses += 1
+
+        with self.lock:
+            self.memory[key] = images
+            while len(self.memory) > self.memory_size:
+                self.memory.popitem(last=False)
+        return images
+
+
+_shared_cache = None
+
+
+def get_thumbnail_cache():
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ThumbnailCache()
+    return _shared_cache
@@ -0,0 +1,120 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+LOG_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_FILE = os.path.join(LOG_DIR, "voicevox_debug.log")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# モジュールごとの既定ログレベル。環境変数 COMEDY_LOG_LEVELS="voicevox_api=DEBUG,root=WARNING" で上書き
+DEFAULT_LEVELS = {
+    "root": logging.INFO,
+    "voicevox_api": logging.INFO,
+    "urllib3": logging.WARNING,
+}
+
+# 1セリフごとのDEBUGログ（sampled=True）はこの件数に1件だけ残す
+DEBUG_SAMPLE_RATE = 20
+
+_listener = None
+_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    """1行1JSONで出力する。extra={"fields": {...}} の内容もそのまま載せる"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """extra={"sampled": True} 付きのDEBUGレコードをrate件に1件だけ通す"""
+
+    def __init__(self, rate=DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = max(1, rate)
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or not getattr(record, "sampled", False):
+            return True
+        with self.lock:
+            self.counter += 1
+            return self.counter % self.rate == 1 or self.rate == 1
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """メッセージの書式化をリスナースレッドに任せる（同一プロセス内のキューなのでレコードをそのまま渡せる）"""
+
+    def prepare(self, record):
+        return record
+
+
+def parse_levels(spec):
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(levels=None, log_file=LOG_FILE, debug_sample_rate=DEBUG_SAMPLE_RATE):
+    """キュー経由の非同期ロギングを設定する（2回目以降はレベルだけ更新）
+
+    呼び出し側のスレッドはキューに積むだけで、書式化とファイル書き込みはリスナースレッドが行う。
+    """
+    global _listener
+    merged = dict(DEFAULT_LEVELS)
+    merged.update(parse_levels(os.environ.get("COMEDY_LOG_LEVELS")))
+    merged.update(levels or {})
+
+    with _lock:
+        if _listener is None:
+            log_queue = queue.SimpleQueue()
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+            file_handler.setFormatter(StructuredFormatter())
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+            console_handler.setLevel(logging.WARNING)
+
+            _listener = logging.handlers.QueueListener(
+                log_queue, file_handler, console_handler, respect_handler_level=True
+            )
+            _listener.start()
+            atexit.register(shutdown_logging)
+
+            queue_handler = LazyQueueHandler(log_queue)
+            queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+            root = logging.getLogger()
+            root.handlers[:] = [queue_handler]
+
+        for name, level in merged.items():
+            logging.getLogger(None if name == "root" else name).setLevel(level)
+
+
+def shutdown_logging():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -1,49 +1,147 @@
-﻿import tkinter as tk
+﻿import importlib.util
+import time
+import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, simpledialog, filedialog
 from database import Database
-from youtube_api import YouTubeAPI
-from gemini_api import GeminiAPI
+from youtube_api import YouTubeAPI, TRANSCRIPT_CACHE_DIR
+from gemini_api import GeminiAPI, estimate_cost
 from voicevox_api import VoicevoxAPI
-from player import SkitPlayer
+from batch_audio import BatchAudioGenerator
+from speaker_catalog import get_catalog
+import event_loop
+import metrics
+import prompts
+from skit_parser import parse_skit, LINE_DIALOGUE, LINE_DIRECTION, LINE_TITLE
+from transcript_cleaner import clean_transcript, reduction
 
-class ComedyAnalyzer:
-    VOICEVOX_CHARACTERS = {
-        "ずんだもん": {
-            "role": "ボケ",
-            "tone": "語尾に「〜のだ」「〜なのだ」を使う。子供っぽく無邪気。",
-            "example": "それはすごいのだ！ / わからないのだ… / やってみるのだ"
-        },
-        "四国めたん": {
-            "role": "ツッコミ",
-            "tone": "大人っぽく落ち着いている。丁寧語だが冷静にツッコむ。",
-            "example": "それはおかしいですね / なぜそうなるんですか / 意味がわかりません"
-        },
-        "春日部つむぎ": {
-            "role": "どちらでも",
-            "tone": "明るく元気。ギャルっぽい。語尾に「〜じゃん」「〜だよね」を使う。",
-            "example": "まじ？それやばくない？ / いいじゃんいいじゃん！ / ウケるんだけど"
-        },
-    }
+# 類似検索・重複検出用（numpyが必要）。起動を速くするため、読み込みはウィンドウ表示後に行う
+EMBEDDING_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+# ウィンドウ表示から検索インデックスの読み込みを始めるまでの待ち時間（ms）
+SEARCH_INIT_DELAY_MS = 200
+
+# テーマ指定時にコント生成プロンプトへ入れる字幕サンプルの上限（類似順）
+SAMPLE_TRANSCRIPT_LIMIT = 5
 
+# 診断タブに出す作者別のGemini使用量の件数（トークンの多い順）
+LLM_USAGE_AUTHOR_LIMIT = 10
+
+class ComedyAnalyzer:
     def __init__(self):
+        self.started_at = time.perf_counter()
         self.root = tk.Tk()
         self.root.title("コメディ分析ツール")
         self.root.geometry("1200x900")
         self.root.configure(bg="#2b2b2b")
         self.db = Database()
-        self.yt = YouTubeAPI()
-        self.gemini = GeminiAPI()
-        self.voicevox = VoicevoxAPI()
+        # キャラクター一覧（前回エンジンから取ったキャッシュ。エンジンへの確認はウィンドウ表示後）
+        self.catalog = get_catalog()
+        # API クライアントは初回利用時に作る
+        self._yt = None
+        self._gemini = None
+        self._voicevox = None
+        self.index = None
+        self.dedupe = None
         self.setup_styles()
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
-        self.create_analyze_tab()
-        self.create_authors_tab()
-        self.create_videos_tab()
-        self.create_patterns_tab()
+        # 最初のタブ以外は初めて選択された時に中身を作る
+        self.tab_builders = {}
+        for title, builder in (("動画分析", self.create_analyze_tab), ("作者管理", self.create_authors_tab),
+                               ("動画一覧", self.create_videos_tab), ("全体解析", self.create_patterns_tab),
+                               ("診断", self.create_diagnostics_tab)):
+            tab = ttk.Frame(self.notebook)
+            self.notebook.add(tab, text=title)
+            self.tab_builders[str(tab)] = (tab, builder)
         self.status = tk.Label(self.root, text="準備完了", bg="#2b2b2b", fg="white", anchor="w")
         self.status.pack(fill=tk.X, padx=10, pady=5)
+        self.build_tab(self.notebook.select())
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.root.after_idle(self.on_window_ready)
+
+    @property
+    def yt(self):
+        if self._yt is None:
+            self._yt = YouTubeAPI(db=self.db, cache_dir=TRANSCRIPT_CACHE_DIR)
+        return self._yt
+
+    @property
+    def gemini(self):
+        if self._gemini is None:
+            self._gemini = GeminiAPI(db=self.db)
+        return self._gemini
+
+    @property
+    def voicevox(self):
+        if self._voicevox is None:
+            self._voicevox = VoicevoxAPI()
+        return self._voicevox
+
+    def on_window_ready(self):
+        metrics.observe('app.time_to_window', time.perf_counter() - self.started_at)
+        if EMBEDDING_AVAILABLE:
+            self.root.after(SEARCH_INIT_DELAY_MS, self.init_search)
+        self.root.after(SEARCH_INIT_DELAY_MS, self.refresh_catalog)
+
+    def refresh_catalog(self):
+        """エンジンのバージョンが変わっていればキャラクター一覧を取り直す（裏で実行）"""
+        import threading
+
+        def worker():
+            if self.catalog.refresh(self.voicevox):
+                self.root.after(0, self.refresh_character_combos)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def refresh_character_combos(self):
+        if not hasattr(self, 'char_a_combo'):
+            return
+        names = self.catalog.names()
+        for combo in (self.char_a_combo, self.char_b_combo):
+            combo['values'] = names
+
+    def init_search(self):
+        """類似検索インデックスと重複検出を裏で読み込む（初回はDB全体から作る）
+
+        UIスレッドを止めないようワーカースレッドで作り、終わってから self.index / self.dedupe を使えるようにする。
+        """
+        import threading
+
+        def worker():
+            from embedding_index import EmbeddingIndex
+            from dedupe import NearDuplicateDetector
+            try:
+                with metrics.timer('app.init_search'):
+                    index = EmbeddingIndex()
+                    index.attach(self.db)
+                    # 毎回DBと突き合わせる（閉じている間に消えた行・CLIで書いた行を反映する）
+                    building = len(index) == 0
+                    if building:
+                        self.root.after(0, lambda: self.set_status("類似検索インデックスを作成中..."))
+                    index.sync(self.db)
+                    dedupe = NearDuplicateDetector(self.db)
+                    dedupe.attach()
+                    dedupe.sync()
+            except Exception as e:
+                message = f"検索インデックスの読み込みエラー: {e}"
+                self.root.after(0, lambda: self.set_status(message))
+                return
+            self.root.after(0, lambda: self.on_search_ready(index, dedupe, building))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_search_ready(self, index, dedupe, built=False):
+        self.index = index
+        self.dedupe = dedupe
+        if built:
+            self.set_status(f"類似検索インデックスを作成しました（{len(index)}件）")
+
+    def build_tab(self, tab_id):
+        entry = self.tab_builders.pop(str(tab_id), None)
+        if entry is not None:
+            tab, builder = entry
+            with metrics.timer('app.build_tab'):
+                builder(tab)
 
     def setup_styles(self):
         style = ttk.Style()
@@ -55,15 +153,15 @@ class ComedyAnalyzer:
         style.configure('TLabel', background='#2b2b2b', foreground='white')
 
     def on_tab_changed(self, event):
+        self.build_tab(self.notebook.select())
+        if hasattr(self, 'diagnostics_text'):
+            self.refresh_diagnostics()
         self.refresh_authors_list()
         self.refresh_videos_list()
         self.refresh_author_combo()
-        if hasattr(self, 'skits_listbox'):
-            self.refresh_skits_list()
+        self.refresh_skits_list()
 
-    def create_analyze_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="動画分析")
+    def create_analyze_tab(self, tab):
         top_frame = ttk.Frame(tab)
         top_frame.pack(fill=tk.X, padx=10, pady=10)
         ttk.Label(top_frame, text="YouTube URL:").pack(side=tk.LEFT)
@@ -78,6 +176,7 @@ class ComedyAnalyzer:
         btn_frame = ttk.Frame(tab)
         btn_frame.pack(fill=tk.X, padx=10, pady=5)
         tk.Button(btn_frame, text="字幕取得", command=self.fetch_transcript, bg="#4a9eff", fg="white", width=15).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="字幕再取得", command=lambda: self.fetch_transcript(force_refresh=True), bg="#666666", fg="white", width=15).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="分析", command=self.analyze_video, bg="#4a9eff", fg="white", width=15).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="保存", command=self.save_analysis, bg="#4a9eff", fg="white", width=15).pack(side=tk.LEFT, padx=5)
         ttk.Label(tab, text="字幕:").pack(anchor="w", padx=10)
@@ -87,8 +186,13 @@ class ComedyAnalyzer:
         self.analysis_text = scrolledtext.ScrolledText(tab, width=110, height=15, font=("Arial", 10), bg="#1e1e1e", fg="white")
         self.analysis_text.pack(padx=10, pady=5)
         self.current_video_id = None
+        self.current_transcript_track = (None, None)
+        # 分析結果を作ったプロンプトの版（prompts.py）
+        self.current_analysis_version = None
 
     def refresh_author_combo(self):
+        if not hasattr(self, 'author_combo'):
+            return
         authors = self.db.get_authors()
         self.author_combo['values'] = [a['name'] for a in authors]
         if authors and not self.author_combo.get():
@@ -113,7 +217,8 @@ class ComedyAnalyzer:
         except tk.TclError:
             self.set_status("クリップボードにテキストがありません")
 
-    def fetch_transcript(self):
+    def fetch_transcript(self, force_refresh=False):
+        """字幕を取得する（保存済み・取得済みの動画は手元から読む。force_refreshならYouTubeから取り直す）"""
         url = self.url_entry.get().strip()
         if not url:
             self.set_status("URLを入力してください")
@@ -121,11 +226,16 @@ class ComedyAnalyzer:
         self.set_status("字幕取得中...")
         self.root.update()
         self.current_video_id = self.yt.get_video_id(url)
-        result = self.yt.fetch_transcript(self.current_video_id)
+        result = self.yt.fetch_transcript(self.current_video_id, force_refresh=force_refresh)
         if result['success']:
             self.transcript_text.delete("1.0", tk.END)
             self.transcript_text.insert(tk.END, result['transcript'])
-            self.set_status(f"字幕取得完了（{result['count']}件）")
+            self.current_transcript_track = (result.get('language'), result.get('track'))
+            self.current_analysis_version = None
+            source = {'db': '保存済み', 'cache': '取得済み', 'network': 'YouTube'}[result['source']]
+            track = {'manual': '手動字幕', 'generated': '自動生成字幕', 'translated': '自動翻訳'}.get(result.get('track'))
+            detail = "、".join(x for x in (result.get('language'), track, source) if x)
+            self.set_status(f"字幕取得完了（{result['count']}件、{detail}）")
         else:
             self.set_status(f"エラー: {result['error']}")
 
@@ -134,13 +244,17 @@ class ComedyAnalyzer:
         if not transcript:
             self.set_status("先に字幕を取得してください")
             return
-        self.set_status("Geminiで分析中...")
+        # 効果音タグや自動字幕の重複を除いてから送る
+        cleaned = clean_transcript(transcript, self.current_transcript_track[1])
+        saved = reduction(cleaned['original_chars'], cleaned['cleaned_chars'])
+        self.set_status(f"Geminiで分析中...（字幕を整形: {cleaned['original_chars']}→{cleaned['cleaned_chars']}文字）")
         self.root.update()
-        result = self.gemini.analyze_video(transcript)
+        result = self.gemini.analyze_video(cleaned['text'] or transcript, author_id=self.find_author_id(self.author_combo.get()))
         if result['success']:
             self.analysis_text.delete("1.0", tk.END)
             self.analysis_text.insert(tk.END, result['analysis'])
-            self.set_status("分析完了")
+            self.current_analysis_version = result['prompt_version']
+            self.set_status(f"分析完了（字幕を{saved:.0%}短縮）")
         else:
             self.set_status(f"分析エラー: {result['error']}")
 
@@ -154,18 +268,23 @@ class ComedyAnalyzer:
         if not author_name:
             self.set_status("作者を選択してください")
             return
+        if self.dedupe is not None:
+            duplicates = self.dedupe.find_duplicates('transcripts', transcript)
+            duplicate_videos = [self.db.get_video(row_id) for row_id, _ in duplicates]
+            duplicate_videos = [v for v in duplicate_videos if v and v['video_id'] != self.current_video_id]
+            if duplicate_videos and not messagebox.askyesno(
+                    "重複確認", f"動画 {duplicate_videos[0]['video_id']} とほぼ同じ字幕です（再アップロードの可能性）。\n保存しますか？"):
+                return
         author_id = self.db.add_author(author_name)
         url = self.url_entry.get().strip()
         video_db_id = self.db.add_video(self.current_video_id, f"Video {self.current_video_id}", url, author_id)
-        self.db.add_transcript(video_db_id, transcript)
-        self.db.add_analysis(video_db_id, analysis)
+        self.db.add_transcript(video_db_id, transcript, *self.current_transcript_track)
+        self.db.add_analysis(video_db_id, analysis, self.current_analysis_version)
         self.set_status(f"保存完了: {self.current_video_id}")
         self.refresh_videos_list()
         self.refresh_authors_list()
 
-    def create_authors_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="作者管理")
+    def create_authors_tab(self, tab):
         left_frame = ttk.Frame(tab)
         left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=10)
         ttk.Label(left_frame, text="作者一覧:").pack(anchor="w")
@@ -180,10 +299,15 @@ class ComedyAnalyzer:
         self.skit_theme_entry.pack(pady=5)
         self.skit_theme_entry.insert(0, "例: コンビニ、面接、電話")
         self.skit_theme_entry.bind('<FocusIn>', lambda e: self.skit_theme_entry.delete(0, tk.END) if self.skit_theme_entry.get().startswith("例:") else None)
+        count_frame = ttk.Frame(left_frame)
+        count_frame.pack(fill=tk.X)
+        ttk.Label(count_frame, text="候補数:").pack(side=tk.LEFT)
+        self.candidate_count_spin = tk.Spinbox(count_frame, from_=1, to=10, width=5)
+        self.candidate_count_spin.pack(side=tk.LEFT, padx=5)
         tk.Button(left_frame, text="ショートコント生成", command=self.generate_skit, bg="#ff9f4a", fg="white", width=20, height=2).pack(pady=10)
         ttk.Separator(left_frame, orient='horizontal').pack(fill=tk.X, pady=10)
         ttk.Label(left_frame, text="VOICEVOX割り当て:").pack(anchor="w")
-        char_names = list(self.VOICEVOX_CHARACTERS.keys())
+        char_names = self.catalog.names()
         char_frame = ttk.Frame(left_frame)
         char_frame.pack(fill=tk.X, pady=5)
         ttk.Label(char_frame, text="A:").pack(side=tk.LEFT)
@@ -197,14 +321,21 @@ class ComedyAnalyzer:
         tk.Button(left_frame, text="口調変換", command=self.convert_to_character, bg="#4aff9f", fg="black", width=20).pack(pady=5)
         tk.Button(left_frame, text="台本コピー", command=self.copy_script, bg="#9f4aff", fg="white", width=20).pack(pady=5)
         tk.Button(left_frame, text="トーク保存", command=self.save_skit, bg="#4a9fff", fg="white", width=20).pack(pady=5)
+        self.reject_duplicates_var = tk.BooleanVar(value=self.db.get_setting('reject_duplicate_skits') == '1')
+        tk.Checkbutton(left_frame, text="重複トークは保存しない", variable=self.reject_duplicates_var,
+                       command=lambda: self.db.set_setting('reject_duplicate_skits', '1' if self.reject_duplicates_var.get() else '0'),
+                       bg="#2b2b2b", fg="white", selectcolor="#1e1e1e", activebackground="#2b2b2b").pack(anchor="w")
         tk.Button(left_frame, text="音声生成", command=self.generate_audio, bg="#ff4a9f", fg="white", width=20).pack(pady=5)
         tk.Button(left_frame, text="再生プレイヤー", command=self.open_player, bg="#ff9f4a", fg="white", width=20).pack(pady=5)
+        tk.Button(left_frame, text="動画出力", command=self.export_video, bg="#ff9f4a", fg="white", width=20).pack(pady=5)
         ttk.Separator(left_frame, orient='horizontal').pack(fill=tk.X, pady=10)
         ttk.Label(left_frame, text="保存済みトーク:").pack(anchor="w")
-        self.skits_listbox = tk.Listbox(left_frame, width=25, height=6, bg="#1e1e1e", fg="white", font=("Arial", 10))
+        self.skits_listbox = tk.Listbox(left_frame, width=25, height=6, bg="#1e1e1e", fg="white", font=("Arial", 10),
+                                        selectmode=tk.EXTENDED, exportselection=False)
         self.skits_listbox.pack(pady=5)
         self.skits_listbox.bind('<<ListboxSelect>>', self.on_skit_select)
         tk.Button(left_frame, text="トーク削除", command=self.delete_skit, bg="#ff4a4a", fg="white", width=20).pack(pady=5)
+        tk.Button(left_frame, text="選択トークの音声一括生成", command=self.generate_batch_audio, bg="#ff4a9f", fg="white", width=20).pack(pady=5)
         right_frame = ttk.Frame(tab)
         right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
         top_right = ttk.Frame(right_frame)
@@ -226,7 +357,18 @@ class ComedyAnalyzer:
         # 左側：生成されたショートコント
         left_content = ttk.Frame(content_frame)
         left_content.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        ttk.Label(left_content, text="生成されたショートコント:").pack(anchor="w")
+        skit_header = ttk.Frame(left_content)
+        skit_header.pack(fill=tk.X)
+        ttk.Label(skit_header, text="生成されたショートコント:").pack(side=tk.LEFT)
+        self.candidate_combo = ttk.Combobox(skit_header, width=20, state="readonly")
+        self.candidate_combo.pack(side=tk.RIGHT)
+        self.candidate_combo.bind('<<ComboboxSelected>>', self.on_candidate_select)
+        ttk.Label(skit_header, text="候補:").pack(side=tk.RIGHT)
+        self.skit_candidates = []
+        self.skit_candidates_version = None
+        # 表示中のコントを作ったプロンプトの版と、その時の本文（手で書き換えた後に保存したら版は付けない）
+        self.skit_prompt_version = None
+        self.skit_prompt_text = None
         self.generated_skit_text = scrolledtext.ScrolledText(left_content, width=50, height=20, font=("Arial", 11), bg="#1e1e1e", fg="#ffdd88")
         self.generated_skit_text.pack(pady=5, fill=tk.BOTH, expand=True)
 
@@ -245,6 +387,8 @@ class ComedyAnalyzer:
         self.refresh_skits_list()
 
     def refresh_authors_list(self):
+        if not hasattr(self, 'authors_listbox'):
+            return
         self.authors_listbox.delete(0, tk.END)
         for author in self.db.get_authors():
             self.authors_listbox.insert(tk.END, author['name'])
@@ -282,9 +426,9 @@ class ComedyAnalyzer:
         self.set_status("作者パターンを分析中...")
         self.root.update()
         analyses_text = "\n\n---\n\n".join([f"### {a['youtube_id']}\n\n{a['raw_analysis']}" for a in analyses])
-        result = self.gemini.analyze_author_patterns(analyses_text)
+        result = self.gemini.analyze_author_patterns(analyses_text, author_id=author['id'])
         if result['success']:
-            self.db.save_author_pattern(author['id'], "", result['analysis'])
+            self.db.save_author_pattern(author['id'], "", result['analysis'], result['prompt_version'])
             self.author_pattern_text.delete("1.0", tk.END)
             self.author_pattern_text.insert(tk.END, result['analysis'])
             self.set_status("作者パターン分析完了")
@@ -308,25 +452,70 @@ class ComedyAnalyzer:
         analyses = self.db.get_analyses_by_author(author['id'])
         pattern = self.db.get_author_pattern(author['id'])
         pattern_text = pattern['analysis_summary'] if pattern else ""
-        transcripts_text = "\n\n---\n\n".join([f"【{t['youtube_id']}】\n{t['content']}" for t in transcripts])
-        analyses_text = "\n\n---\n\n".join([f"【{a['youtube_id']}】\n{a['raw_analysis']}" for a in analyses]) if analyses else ""
         theme = self.skit_theme_entry.get().strip()
         if theme.startswith("例:"):
             theme = ""
+        transcripts = self.select_sample_transcripts(transcripts, theme)
+        transcripts_text = "\n\n---\n\n".join([f"【{t['youtube_id']}】\n{t['content']}" for t in transcripts])
+        analyses_text = "\n\n---\n\n".join([f"【{a['youtube_id']}】\n{a['raw_analysis']}" for a in analyses]) if analyses else ""
+        try:
+            count = max(1, int(self.candidate_count_spin.get()))
+        except ValueError:
+            count = 1
         self.set_status(f"「{author_name}」風のショートコントを生成中...")
-        self.root.update()
-        result = self.gemini.generate_short_skit(author_name, pattern_text, transcripts_text, analyses_text, theme)
+        if count > 1:
+            coro = self.gemini.generate_skit_candidates_async(author_name, pattern_text, transcripts_text, analyses_text, theme, count,
+                                                              author_id=author['id'])
+        else:
+            coro = self.gemini.generate_short_skit_async(author_name, pattern_text, transcripts_text, analyses_text, theme,
+                                                         author_id=author['id'])
+        # 共有イベントループで生成し、完了後にTkスレッドで表示
+        event_loop.submit_to_tk(self.root, coro, lambda result: self.on_skit_generated(author_name, result))
+
+    def on_skit_generated(self, author_name, result):
+        if isinstance(result, Exception):
+            result = {'success': False, 'error': str(result)}
         if result['success']:
             # プロンプトを表示
             self.prompt_text.delete("1.0", tk.END)
             self.prompt_text.insert(tk.END, result.get('prompt', ''))
-            # コントを表示
-            self.generated_skit_text.delete("1.0", tk.END)
-            self.generated_skit_text.insert(tk.END, result['skit'])
-            self.set_status(f"「{author_name}」風ショートコント生成完了")
+            # 候補を表示（単発生成時は1件のみ）
+            self.skit_candidates = result.get('candidates') or [{'skit': result['skit'], 'score': None}]
+            self.skit_candidates_version = result['prompt_version']
+            self.candidate_combo['values'] = [
+                f"{i + 1}位" + (f" ({c['score']:.2f})" if c['score'] is not None else "")
+                for i, c in enumerate(self.skit_candidates)
+            ]
+            self.candidate_combo.current(0)
+            self.show_candidate(0)
+            self.set_status(f"「{author_name}」風ショートコント生成完了（{len(self.skit_candidates)}件）")
         else:
             self.set_status(f"生成エラー: {result['error']}")
 
+    def select_sample_transcripts(self, transcripts, theme):
+        """テーマが指定されていれば、テーマに近い字幕だけをサンプルとして選ぶ"""
+        if not theme or self.index is None or len(transcripts) <= SAMPLE_TRANSCRIPT_LIMIT:
+            return transcripts
+        from embedding_index import KIND_TRANSCRIPT, make_key
+        by_key = {make_key(KIND_TRANSCRIPT, t['video_db_id']): t for t in transcripts}
+        hits = self.index.search(theme, k=SAMPLE_TRANSCRIPT_LIMIT, keys=list(by_key))
+        return [by_key[key] for key, _ in hits] or transcripts[:SAMPLE_TRANSCRIPT_LIMIT]
+
+    def show_skit(self, skit, prompt_version=None):
+        """コントを表示し、保存時に付けるプロンプトの版をその本文に結び付ける"""
+        self.generated_skit_text.delete("1.0", tk.END)
+        self.generated_skit_text.insert(tk.END, skit)
+        self.skit_prompt_version = prompt_version
+        self.skit_prompt_text = self.generated_skit_text.get("1.0", tk.END).strip()
+
+    def show_candidate(self, index):
+        self.show_skit(self.skit_candidates[index]['skit'], self.skit_candidates_version)
+
+    def on_candidate_select(self, event):
+        index = self.candidate_combo.current()
+        if 0 <= index < len(self.skit_candidates):
+            self.show_candidate(index)
+
     def copy_script(self):
         skit = self.generated_skit_text.get("1.0", tk.END).strip()
         if not skit:
@@ -334,19 +523,18 @@ class ComedyAnalyzer:
             return
         char_a = self.char_a_combo.get()
         char_b = self.char_b_combo.get()
+        names = {'A': char_a, 'B': char_b}
         lines = []
-        for line in skit.split('\n'):
-            line = line.strip()
-            if line.startswith('A:'):
-                lines.append(f'{char_a}「{line[2:].strip()}」')
-            elif line.startswith('B:'):
-                lines.append(f'{char_b}「{line[2:].strip()}」')
-            elif line.startswith(f'{char_a}:'):
-                lines.append(f'{char_a}「{line[len(char_a)+1:].strip()}」')
-            elif line.startswith(f'{char_b}:'):
-                lines.append(f'{char_b}「{line[len(char_b)+1:].strip()}」')
-            elif line:
-                lines.append(line)
+        for line in parse_skit(skit).lines:
+            if line.kind == LINE_DIALOGUE:
+                directions = ''.join(f'（{d}）' for d in line.directions)
+                lines.append(f'{names.get(line.speaker, line.speaker)}{directions}「{line.text}」')
+            elif line.kind == LINE_TITLE:
+                lines.append(f'タイトル: {line.text}')
+            elif line.kind == LINE_DIRECTION:
+                lines.append(f'（{line.text}）')
+            else:
+                lines.append(line.text)
         result = '\n'.join(lines)
         self.root.clipboard_clear()
         self.root.clipboard_append(result)
@@ -370,6 +558,18 @@ class ComedyAnalyzer:
         if not author:
             return
 
+        # 近似重複チェック
+        if self.dedupe is not None:
+            duplicates = self.dedupe.find_duplicates('generated_skits', skit)
+            if duplicates:
+                existing = self.db.get_skit(duplicates[0][0])
+                message = f"保存済みトーク「{existing['title'] if existing else duplicates[0][0]}」とほぼ同じ内容です（類似度 {duplicates[0][1]:.0%}）"
+                if self.reject_duplicates_var.get():
+                    self.set_status(f"重複のため保存しませんでした: {message}")
+                    return
+                if not messagebox.askyesno("重複確認", f"{message}\n保存しますか？"):
+                    return
+
         # タイトルを入力
         title = simpledialog.askstring("トーク保存", "タイトルを入力してください:")
         if not title:
@@ -382,11 +582,14 @@ class ComedyAnalyzer:
         char_a = self.char_a_combo.get()
         char_b = self.char_b_combo.get()
 
-        self.db.save_skit(author['id'], title, skit, theme, char_a, char_b)
+        prompt_version = self.skit_prompt_version if skit == self.skit_prompt_text else None
+        self.db.save_skit(author['id'], title, skit, theme, char_a, char_b, prompt_version)
         self.refresh_skits_list()
         self.set_status(f"トーク「{title}」を保存しました")
 
     def refresh_skits_list(self):
+        if not hasattr(self, 'skits_listbox'):
+            return
         self.skits_listbox.delete(0, tk.END)
         for skit in self.db.get_all_skits():
             display = f"{skit['title']} ({skit['author_name'] or '不明'})"
@@ -405,8 +608,8 @@ class ComedyAnalyzer:
         skit_id = self._skit_ids[selection[0]]
         skit = self.db.get_skit(skit_id)
         if skit:
-            self.generated_skit_text.delete("1.0", tk.END)
-            self.generated_skit_text.insert(tk.END, skit['content'])
+            # 保存済みのコントはそれを作った時の版を引き継ぐ
+            self.show_skit(skit['content'], skit['prompt_version'])
             if skit['char_a']:
                 self.char_a_combo.set(skit['char_a'])
             if skit['char_b']:
@@ -436,22 +639,15 @@ class ComedyAnalyzer:
             return
         char_a_name = self.char_a_combo.get()
         char_b_name = self.char_b_combo.get()
-        char_a_info = {
-            'name': char_a_name,
-            'tone': self.VOICEVOX_CHARACTERS[char_a_name]['tone'],
-            'example': self.VOICEVOX_CHARACTERS[char_a_name]['example']
-        }
-        char_b_info = {
-            'name': char_b_name,
-            'tone': self.VOICEVOX_CHARACTERS[char_b_name]['tone'],
-            'example': self.VOICEVOX_CHARACTERS[char_b_name]['example']
-        }
+        char_a_info = self.catalog.character_info(char_a_name)
+        char_b_info = self.catalog.character_info(char_b_name)
         self.set_status(f"口調変換中（{char_a_name} / {char_b_name}）...")
         self.root.update()
-        result = self.gemini.convert_to_character(skit, char_a_info, char_b_info)
+        selection = self.authors_listbox.curselection()
+        author_id = self.find_author_id(self.authors_listbox.get(selection[0])) if selection else None
+        result = self.gemini.convert_to_character(skit, char_a_info, char_b_info, author_id=author_id)
         if result['success']:
-            self.generated_skit_text.delete("1.0", tk.END)
-            self.generated_skit_text.insert(tk.END, result['skit'])
+            self.show_skit(result['skit'], result['prompt_version'])
             self.set_status(f"口調変換完了（{char_a_name} / {char_b_name}）")
         else:
             self.set_status(f"変換エラー: {result['error']}")
@@ -463,9 +659,12 @@ class ComedyAnalyzer:
             return
 
         if not self.voicevox.is_available():
-            self.set_status("VOICEVOXが起動していません（localhost:50021）")
+            self.set_status(f"VOICEVOXが起動していません（{', '.join(self.voicevox.pool.urls)}）")
             messagebox.showerror("エラー", "VOICEVOXが起動していません。\nVOICEVOXを起動してから再度お試しください。")
             return
+        # 起動時にエンジンが動いていなかった場合はここでキャラクター一覧を確認する
+        if self.catalog.source != "engine" and self.catalog.refresh(self.voicevox):
+            self.refresh_character_combos()
 
         # 固定の出力フォルダ（アプリと同じ場所のaudio_outputフォルダ）
         import os
@@ -484,17 +683,62 @@ class ComedyAnalyzer:
         result = self.voicevox.generate_skit_audio(skit, output_dir, char_mapping)
         if result['success']:
             file_count = len(result['files'])
-            self.set_status(f"音声生成完了（{file_count}ファイル → {output_dir}）")
-            messagebox.showinfo("完了", f"{file_count}個の音声ファイルを生成しました。\n\n保存先: {output_dir}")
+            failed = result.get('failed', [])
+            if failed:
+                self.set_status(f"音声生成完了（{file_count}ファイル、失敗{len(failed)}件 → {output_dir}）")
+                details = "\n".join(f"{f['line']}行目（{f['character']}）: {f['error']}" for f in failed[:5])
+                messagebox.showwarning("一部失敗", f"{file_count}個の音声ファイルを生成しました。\n"
+                                       f"次のセリフは生成できませんでした:\n{details}\n\n保存先: {output_dir}")
+            else:
+                self.set_status(f"音声生成完了（{file_count}ファイル → {output_dir}）")
+                messagebox.showinfo("完了", f"{file_count}個の音声ファイルを生成しました。\n\n保存先: {output_dir}")
         else:
             self.set_status(f"音声生成エラー: {result['error']}")
             messagebox.showerror("エラー", result['error'])
 
+    def generate_batch_audio(self):
+        """選択した保存済みトークの音声をトークごとのフォルダに一括生成"""
+        import threading
+        selection = self.skits_listbox.curselection()
+        if not selection or not hasattr(self, '_skit_ids'):
+            self.set_status("音声を生成するトークを選択してください（複数選択可）")
+            return
+        if not self.voicevox.is_available():
+            messagebox.showerror("エラー", "VOICEVOXが起動していません。\nVOICEVOXを起動してから再度お試しください。")
+            return
+        # 起動時にエンジンが動いていなかった場合はここでキャラクター一覧を確認する
+        if self.catalog.source != "engine" and self.catalog.refresh(self.voicevox):
+            self.refresh_character_combos()
+        skit_ids = [self._skit_ids[i] for i in selection if i < len(self._skit_ids)]
+        default_mapping = {"A": self.char_a_combo.get(), "B": self.char_b_combo.get()}
+        generator = BatchAudioGenerator(self.voicevox, self.db)
+
+        def progress(done, total):
+            self.root.after(0, lambda: self.set_status(f"一括音声生成中... {done}/{total}"))
+
+        def on_done(results):
+            errors = [r for r in results.values() if r['status'] == 'error']
+            self.set_status(f"一括音声生成完了（{len(results)}件、エラー{len(errors)}件、キャッシュ再利用{generator.cache_hits}件）")
+            if errors:
+                messagebox.showwarning("一部失敗", "\n".join(r['error'] for r in errors[:5]))
+
+        def worker():
+            results = generator.generate(skit_ids, default_mapping, progress)
+            self.root.after(0, lambda: on_done(results))
+
+        self.set_status(f"一括音声生成中...（{len(skit_ids)}件）")
+        threading.Thread(target=worker, daemon=True).start()
+
     def open_player(self):
-        """再生プレイヤーを開く"""
+        """再生プレイヤーを開く（保存済みトークを選択中で、その音声があればそれを開く）"""
         import os
         script_dir = os.path.dirname(os.path.abspath(__file__))
         audio_dir = os.path.join(script_dir, "audio_output")
+        selection = self.skits_listbox.curselection()
+        if selection and hasattr(self, '_skit_ids') and selection[0] < len(self._skit_ids):
+            skit_audio = self.db.get_skit_audio(self._skit_ids[selection[0]])
+            if skit_audio and skit_audio['file_count'] and os.path.exists(skit_audio['output_dir']):
+                audio_dir = skit_audio['output_dir']
 
         # 音声フォルダが存在するか確認
         if not os.path.exists(audio_dir) or not os.listdir(audio_dir):
@@ -502,13 +746,48 @@ class ComedyAnalyzer:
             return
 
         # プレイヤーを開く（skit_info.jsonから字幕を読み込む）
+        from player import SkitPlayer
         player = SkitPlayer(parent=self.root, audio_dir=audio_dir)
 
         self.set_status("再生プレイヤーを開きました")
 
-    def create_videos_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="動画一覧")
+    def export_video(self):
+        """音声フォルダの内容をMP4に書き出す"""
+        import os
+        import threading
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        audio_dir = os.path.join(script_dir, "audio_output")
+        if not os.path.exists(os.path.join(audio_dir, "skit_info.json")):
+            messagebox.showwarning("警告", "音声ファイルがありません。\n先に音声生成を行ってください。")
+            return
+        output_path = filedialog.asksaveasfilename(title="動画の保存先", defaultextension=".mp4", filetypes=[("MP4", "*.mp4")])
+        if not output_path:
+            return
+        try:
+            from video_renderer import render_video
+        except ImportError:
+            messagebox.showerror("エラー", "動画出力にはPillowが必要です。\npip install Pillow")
+            return
+
+        def on_done(result):
+            if result['success']:
+                self.set_status(f"動画出力完了: {result['output']}")
+            else:
+                self.set_status(f"動画出力エラー: {result['error']}")
+                messagebox.showerror("エラー", result['error'])
+
+        def worker():
+            # 例外もon_doneに渡す（スレッド内で落ちると状態表示が「書き出し中」のまま残る）
+            try:
+                result = render_video(audio_dir, output_path)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            self.root.after(0, lambda: on_done(result))
+
+        self.set_status("動画を書き出し中...")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def create_videos_tab(self, tab):
         top_frame = ttk.Frame(tab)
         top_frame.pack(fill=tk.X, padx=10, pady=5)
         columns = ('video_id', 'author', 'created_at')
@@ -521,6 +800,7 @@ class ComedyAnalyzer:
         btn_frame = ttk.Frame(top_frame)
         btn_frame.pack(side=tk.LEFT, padx=10)
         tk.Button(btn_frame, text="削除", command=self.delete_video, bg="#ff4a4a", fg="white", width=10).pack(pady=5)
+        tk.Button(btn_frame, text="類似検索", command=self.find_similar, bg="#4a9eff", fg="white", width=10).pack(pady=5)
         detail_frame = ttk.Frame(tab)
         detail_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         left_detail = ttk.Frame(detail_frame)
@@ -536,6 +816,8 @@ class ComedyAnalyzer:
         self.refresh_videos_list()
 
     def refresh_videos_list(self):
+        if not hasattr(self, 'videos_tree'):
+            return
         for item in self.videos_tree.get_children():
             self.videos_tree.delete(item)
         for video in self.db.get_all_videos():
@@ -568,14 +850,66 @@ class ComedyAnalyzer:
             self.refresh_videos_list()
             self.set_status("動画を削除しました")
 
-    def create_patterns_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="全体解析")
+    def find_similar(self):
+        selection = self.videos_tree.selection()
+        if not selection:
+            self.set_status("検索元の動画を選択してください")
+            return
+        if not EMBEDDING_AVAILABLE:
+            self.set_status("類似検索にはnumpyが必要です")
+            return
+        if self.index is None:
+            self.set_status("検索インデックスを準備中です")
+            return
+        from embedding_index import KIND_TRANSCRIPT, TABLE_KINDS, make_key, split_key
+        video_db_id = int(selection[0])
+        transcript = self.db.get_transcript(video_db_id)
+        if not transcript:
+            self.set_status("この動画には字幕がありません")
+            return
+        self_key = make_key(KIND_TRANSCRIPT, video_db_id)
+        kind_names = {kind: table for table, kind in TABLE_KINDS.items()}
+        lines = []
+        for key, score in self.index.search(transcript, k=11):
+            if key == self_key:
+                continue
+            kind, row_id = split_key(key)
+            table = kind_names[kind]
+            if table == 'generated_skits':
+                skit = self.db.get_skit(row_id)
+                label = f"トーク: {skit['title']}" if skit else f"トーク #{row_id}"
+            else:
+                video = self.db.get_video(row_id)
+                label = f"{'字幕' if table == 'transcripts' else '分析'}: {video['video_id']} ({video['author_name'] or '不明'})" if video else f"動画 #{row_id}"
+            lines.append(f"{score:.3f}  {label}")
+        messagebox.showinfo("類似検索", "\n".join(lines) if lines else "類似する項目がありません")
+
+    def create_patterns_tab(self, tab):
         ttk.Label(tab, text="全作者の共通パターン分析").pack(pady=10)
         tk.Button(tab, text="全体解析を実行", command=self.run_global_analysis, bg="#4a9eff", fg="white", width=20).pack(pady=10)
+        tk.Button(tab, text="重複レポート", command=self.show_dedupe_report, bg="#666666", fg="white", width=20).pack()
         self.global_analysis_text = scrolledtext.ScrolledText(tab, width=110, height=30, font=("Arial", 10), bg="#1e1e1e", fg="white")
         self.global_analysis_text.pack(padx=10, pady=10)
 
+    def show_dedupe_report(self):
+        if not EMBEDDING_AVAILABLE:
+            self.set_status("重複検出にはnumpyが必要です")
+            return
+        if self.dedupe is None:
+            self.set_status("重複検出を準備中です")
+            return
+        lines = ["## 重複字幕（同じ動画の再アップロード候補）"]
+        for group in self.dedupe.report('transcripts'):
+            videos = [self.db.get_video(row_id) for row_id in group]
+            lines.append("- " + " / ".join(f"{v['video_id']} ({v['author_name'] or '不明'})" for v in videos if v))
+        lines.append("\n## 重複トーク")
+        for group in self.dedupe.report('generated_skits'):
+            skits = [self.db.get_skit(row_id) for row_id in group]
+            lines.append("- " + " / ".join(f"#{s['id']} {s['title']}" for s in skits if s))
+        self.global_analysis_text.delete("1.0", tk.END)
+        self.global_analysis_text.insert(tk.END, "\n".join(lines))
+        self.set_status("重複レポートを作成しました")
+
     def run_global_analysis(self):
         authors = self.db.get_authors()
         if len(authors) < 2:
@@ -591,21 +925,106 @@ class ComedyAnalyzer:
         if not patterns_text:
             self.set_status("先に各作者のパターン分析を行ってください")
             return
-        try:
-            prompt = f"以下は複数のコメディ作者のパターン分析結果です。全体を通して見られる面白いコメディの共通法則を抽出してください。\n\n{patterns_text}"
-            result = self.gemini._generate(prompt)
+        result = self.gemini.analyze_global_patterns(patterns_text)
+        if result['success']:
             self.global_analysis_text.delete("1.0", tk.END)
-            self.global_analysis_text.insert(tk.END, result)
+            self.global_analysis_text.insert(tk.END, result['analysis'])
             self.set_status("全体解析完了")
-        except Exception as e:
-            self.set_status(f"エラー: {e}")
+        else:
+            self.set_status(f"エラー: {result['error']}")
+
+    def create_diagnostics_tab(self, tab):
+        btn_frame = ttk.Frame(tab)
+        btn_frame.pack(fill=tk.X, padx=10, pady=10)
+        tk.Button(btn_frame, text="更新", command=self.refresh_diagnostics, bg="#4a9eff", fg="white", width=12).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="JSON保存", command=lambda: self.export_metrics('json'), bg="#666666", fg="white", width=12).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Prometheus保存", command=lambda: self.export_metrics('prometheus'), bg="#666666", fg="white", width=14).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="リセット", command=self.reset_metrics, bg="#ff4a4a", fg="white", width=12).pack(side=tk.LEFT, padx=5)
+        self.diagnostics_text = scrolledtext.ScrolledText(tab, width=110, height=35, font=("Courier", 10), bg="#1e1e1e", fg="#88ff88")
+        self.diagnostics_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+    def refresh_diagnostics(self):
+        snapshot = metrics.registry.snapshot()
+        lines = [f"{'処理':<36}{'回数':>8}{'合計(s)':>11}{'平均(ms)':>11}{'p95(ms)':>11}{'最大(ms)':>11}"]
+        histograms = sorted(snapshot['histograms'].items(), key=lambda item: item[1]['sum'], reverse=True)
+        for name, h in histograms:
+            lines.append(f"{name:<36}{h['count']:>8}{h['sum']:>11.3f}{h['avg'] * 1000:>11.1f}{h['p95'] * 1000:>11.1f}{h['max'] * 1000:>11.1f}")
+        if snapshot['counters']:
+            lines.append("")
+            lines.append("カウンタ:")
+            for name, value in sorted(snapshot['counters'].items()):
+                lines.append(f"  {name:<34}{value:>8}")
+        cleaning = self.db.get_transcript_cleaning_stats()
+        if cleaning['count']:
+            lines.append("")
+            lines.append(f"字幕の整形: {cleaning['count']}件 {cleaning['original_chars']}文字 → {cleaning['cleaned_chars']}文字"
+                         f"（-{reduction(cleaning['original_chars'], cleaning['cleaned_chars']):.0%}）")
+        stale = self.db.count_stale_results(prompts.versions())
+        lines.append("")
+        lines.append("プロンプトの版:")
+        for name, version in prompts.versions().items():
+            lines.append(f"  {name:<34}{version}")
+        lines.append(f"  古い版の結果: 動画分析 {stale['analyses']}件 / 作者パターン {stale['author_patterns']}件 / コント {stale['generated_skits']}件")
+        lines.extend(self.llm_usage_lines())
+        for name, values in snapshot['collectors'].items():
+            lines.append("")
+            lines.append(f"{name}:")
+            for key, value in values.items():
+                lines.append(f"  {key:<34}{value}")
+        self.diagnostics_text.delete("1.0", tk.END)
+        self.diagnostics_text.insert(tk.END, "\n".join(lines))
+
+    def llm_usage_lines(self):
+        """Gemini呼び出しのトークン数（処理別・作者別）"""
+        if self._gemini is not None:
+            self._gemini.flush_usage()
+        by_operation = self.db.get_llm_usage_by_operation()
+        if not by_operation:
+            return []
+        header = f"{'回数':>6}{'失敗':>6}{'入力tok':>11}{'出力tok':>10}{'平均(ms)':>10}{'料金($)':>10}  モデル"
+
+        def columns(row):
+            cost = estimate_cost(row['model'], row['prompt_tokens'], row['output_tokens'])
+            return (f"{row['calls']:>6}{row['failures']:>6}{row['prompt_tokens']:>11}{row['output_tokens']:>10}"
+                    f"{(row['avg_latency'] or 0) * 1000:>10.0f}{'-' if cost is None else f'{cost:.4f}':>10}  {row['model']}")
+
+        lines = ["", "Gemini呼び出し（処理別）:", f"  {'処理@版':<34}{header}"]
+        for row in by_operation:
+            lines.append(f"  {row['operation'] + '@' + (row['prompt_version'] or '-'):<34}{columns(row)}")
+        lines.append("")
+        lines.append(f"Gemini呼び出し（作者別、上位{LLM_USAGE_AUTHOR_LIMIT}件）:")
+        lines.append(f"  {'作者':<34}{header}")
+        for row in self.db.get_llm_usage_by_author(LLM_USAGE_AUTHOR_LIMIT):
+            lines.append(f"  {row['author_name'] or '（作者なし）':<34}{columns(row)}")
+        return lines
+
+    def export_metrics(self, fmt):
+        extension = ".json" if fmt == 'json' else ".prom"
+        path = filedialog.asksaveasfilename(title="メトリクスの保存先", defaultextension=extension)
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(metrics.registry.to_json() if fmt == 'json' else metrics.registry.to_prometheus())
+        self.set_status(f"メトリクスを保存しました: {path}")
+
+    def reset_metrics(self):
+        metrics.registry.reset()
+        self.refresh_diagnostics()
+
+    def find_author_id(self, name):
+        """作者名からIDを引く（未登録ならNone）"""
+        return next((a['id'] for a in self.db.get_authors() if a['name'] == name), None)
 
     def set_status(self, message):
         self.status.config(text=message)
 
     def run(self):
         self.root.mainloop()
+        if self._gemini is not None:
+            self._gemini.flush_usage()
         self.db.close()
 
 if __name__ == "__main__":
+    from log_config import setup_logging
+    setup_logging()
     ComedyAnalyzer().run()
@@ -0,0 +1,182 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# ヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """バケットから近似した分位点"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+class MetricsRegistry:
+    """カウンタとヒストグラムの置き場（スレッドセーフ）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = {}
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def register_collector(self, name, callback):
+        """snapshot時にcallback()の結果（dict）をそのまま載せる"""
+        self.collectors[name] = callback
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            data = {
+                'timestamp': time.time(),
+                'counters': dict(self.counters),
+                'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+        data['collectors'] = {name: callback() for name, callback in self.collectors.items()}
+        return data
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self):
+        """Prometheusのテキスト形式"""
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                metric = _prometheus_name(name) + '_total'
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                metric = _prometheus_name(name) + '_seconds'
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.sum}")
+                lines.append(f"{metric}_count {histogram.count}")
+        for name, callback in sorted(self.collectors.items()):
+            for key, value in sorted(callback().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = _prometheus_name(f"{name}.{key}")
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_name(name):
+    return 'comedy_' + ''.join(c if c.isalnum() else '_' for c in name)
+
+
+registry = MetricsRegistry()
+
+
+def increment(name, value=1):
+    registry.increment(name, value)
+
+
+def observe(name, value):
+    registry.observe(name, value)
+
+
+@contextmanager
+def timer(name):
+    """ブロックの所要時間をnameのヒストグラムに記録する。例外時は name.errors を加算"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.increment(f"{name}.errors")
+        raise
+    finally:
+        registry.observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """関数（async関数も可）の所要時間を記録するデコレータ"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(prefix, exclude=()):
+    """クラスの公開メソッドすべてを prefix.メソッド名 で計測するクラスデコレータ"""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(value):
+                continue
+            if inspect.isgeneratorfunction(value):
+                continue
+            setattr(cls, attr, timed(f"{prefix}.{attr}")(value))
+        return cls
+    return decorator
@@ -19,6 +19,11 @@ CREATE TABLE IF NOT EXISTS transcripts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     video_id INTEGER NOT NULL,
     content TEXT NOT NULL,
+    language TEXT,
+    track TEXT,
+    cleaned_content TEXT,
+    original_chars INTEGER,
+    cleaned_chars INTEGER,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (video_id) REFERENCES videos(id)
 );
@@ -32,6 +37,7 @@ CREATE TABLE IF NOT EXISTS analyses (
     structure TEXT,
     formula TEXT,
     raw_analysis TEXT,
+    prompt_version TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (video_id) REFERENCES videos(id)
 );
@@ -41,6 +47,7 @@ CREATE TABLE IF NOT EXISTS author_patterns (
     author_id INTEGER NOT NULL,
     common_patterns TEXT,
     analysis_summary TEXT,
+    prompt_version TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (author_id) REFERENCES authors(id)
 );
@@ -58,6 +65,57 @@ CREATE TABLE IF NOT EXISTS generated_skits (
     theme TEXT,
     char_a TEXT,
     char_b TEXT,
+    prompt_version TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (author_id) REFERENCES authors(id)
 );
+
+
+CREATE TABLE IF NOT EXISTS minhash_signatures (
+    source_table TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    signature BLOB NOT NULL,
+    PRIMARY KEY (source_table, row_id)
+);
+
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    source_table TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    row_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets (source_table, band, bucket);
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets_row ON lsh_buckets (source_table, row_id);
+
+CREATE TABLE IF NOT EXISTS skit_audio (
+    skit_id INTEGER PRIMARY KEY,
+    output_dir TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    file_count INTEGER DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (skit_id) REFERENCES generated_skits(id)
+);
+
+-- Geminiの呼び出し1回ごとのトークン数と所要時間（operation はプロンプトのテンプレート名）
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    author_id INTEGER,
+    model TEXT,
+    prompt_version TEXT,
+    prompt_chars INTEGER,
+    prompt_tokens INTEGER,
+    output_tokens INTEGER,
+    latency REAL,
+    success INTEGER NOT NULL DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 動画ID・作者IDでの検索用（videos 10万件規模で全件走査にならないように）
+CREATE INDEX IF NOT EXISTS idx_videos_author ON videos (author_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_transcripts_video ON transcripts (video_id);
+CREATE INDEX IF NOT EXISTS idx_analyses_video ON analyses (video_id);
+CREATE INDEX IF NOT EXISTS idx_author_patterns_author ON author_patterns (author_id);
+CREATE INDEX IF NOT EXISTS idx_generated_skits_author ON generated_skits (author_id, created_at);
@@ -1,34 +1,65 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+import importlib.util
 import os
 import re
 import threading
 import time
 import json
+import metrics
+from skit_parser import parse_skit
 
 # 画像処理用
 try:
-    from PIL import Image, ImageTk, ImageEnhance
+    from PIL import ImageTk
+    from image_cache import get_thumbnail_cache, resize_image, make_bounce_frame
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
 
 # 音声再生用（pygameを優先、なければwinsound）
-try:
-    import pygame
-    pygame.mixer.init()
+# pygameの読み込みとmixerの初期化は重いので、初回再生時まで遅らせる
+if importlib.util.find_spec("pygame") is not None:
     AUDIO_BACKEND = "pygame"
+elif importlib.util.find_spec("winsound") is not None:
+    AUDIO_BACKEND = "winsound"
+else:
+    AUDIO_BACKEND = None
+
+pygame = None
+_audio_lock = threading.Lock()
+
+
+def init_audio_backend():
+    """pygame.mixerを初期化する（2回目以降は何もしない）"""
+    global pygame
+    if AUDIO_BACKEND != "pygame" or pygame is not None:
+        return
+    with _audio_lock:
+        if pygame is None:
+            import pygame as pygame_module
+            pygame_module.mixer.init()
+            pygame = pygame_module
+
+# 口パクアニメーション用（numpyが必要）
+try:
+    from audio_envelope import load_envelope, ANIMATION_FPS
+    LIPSYNC_AVAILABLE = True
 except ImportError:
-    try:
-        import winsound
-        AUDIO_BACKEND = "winsound"
-    except ImportError:
-        AUDIO_BACKEND = None
+    LIPSYNC_AVAILABLE = False
 
 # 立ち絵設定ファイルパス
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CHARACTER_CONFIG_PATH = os.path.join(SCRIPT_DIR, "character_images.json")
 
+# 立ち絵の表示サイズと、話していない側の明るさ
+PORTRAIT_SIZE = (200, 280)
+DIM_BRIGHTNESS = 0.4
+
+# 口を開いた立ち絵に切り替える振幅のしきい値と、口開き画像がない場合の上下動（px）
+MOUTH_OPEN_THRESHOLD = 0.25
+TALK_BOUNCE_OFFSET = 6
+
 
 class SkitPlayer:
     """コント再生プレイヤーウィンドウ"""
@@ -56,6 +87,14 @@ class SkitPlayer:
         self.char_b_photo = None
         self.char_a_photo_dim = None
         self.char_b_photo_dim = None
+        self.char_talk_photos = {"A": None, "B": None}
+
+        # 口パクアニメーションの状態
+        self.mouth_side = None
+        self.mouth_envelope = None
+        self.mouth_start = 0.0
+        self.mouth_open = False
+        self.mouth_job = None
 
         # ウィンドウ作成
         if parent:
@@ -116,6 +155,7 @@ class SkitPlayer:
         )
         self.char_a_label.pack()
         self.char_a_label.bind("<Button-1>", lambda e: self.select_character_image("A"))
+        self.char_a_label.bind("<Button-3>", lambda e: self.select_character_image("A_talk"))
 
         tk.Label(char_a_container, text="キャラA", bg="#1a1a2e", fg="#ffcc00", font=("Arial", 11, "bold")).pack(pady=2)
 
@@ -135,6 +175,7 @@ class SkitPlayer:
         )
         self.char_b_label.pack()
         self.char_b_label.bind("<Button-1>", lambda e: self.select_character_image("B"))
+        self.char_b_label.bind("<Button-3>", lambda e: self.select_character_image("B_talk"))
 
         tk.Label(char_b_container, text="キャラB", bg="#1a1a2e", fg="#00ccff", font=("Arial", 11, "bold")).pack(pady=2)
 
@@ -262,7 +303,7 @@ class SkitPlayer:
         self.line_listbox.bind('<<ListboxSelect>>', self.on_line_select)
 
     def select_character_image(self, char_id):
-        """立ち絵画像を選択"""
+        """立ち絵画像を選択（char_idが「A_talk」等なら口を開いた差分画像）"""
         if not PIL_AVAILABLE:
             messagebox.showwarning("警告", "立ち絵機能にはPillowが必要です。\npip install Pillow")
             return
@@ -276,46 +317,40 @@ class SkitPlayer:
             self.save_character_config()
             self.load_and_display_images()
 
+    @metrics.timed('player.load_images')
     def load_and_display_images(self):
-        """立ち絵画像を読み込んで表示"""
+        """立ち絵画像を読み込んで表示（縮小・暗転はキャッシュ済みのものを使う）"""
         if not PIL_AVAILABLE:
             return
 
-        # キャラA
-        if self.char_images.get("A") and os.path.exists(self.char_images["A"]):
+        cache = get_thumbnail_cache()
+        for side, label in (("A", self.char_a_label), ("B", self.char_b_label)):
+            path = self.char_images.get(side)
+            if not path or not os.path.exists(path):
+                continue
             try:
-                img = Image.open(self.char_images["A"])
-                img = self.resize_image(img, 200, 280)
-                self.char_a_image = img
-                self.char_a_photo = ImageTk.PhotoImage(img)
-                # 暗いバージョンも作成
-                enhancer = ImageEnhance.Brightness(img)
-                dim_img = enhancer.enhance(0.4)
-                self.char_a_photo_dim = ImageTk.PhotoImage(dim_img)
-                self.char_a_label.config(image=self.char_a_photo, text="", width=200, height=280)
-            except Exception as e:
-                print(f"キャラA画像読み込みエラー: {e}")
+                img, dim_img = cache.get(path, PORTRAIT_SIZE, DIM_BRIGHTNESS)
+                photo = ImageTk.PhotoImage(img)
+                photo_dim = ImageTk.PhotoImage(dim_img)
+                if side == "A":
+                    self.char_a_image, self.char_a_photo, self.char_a_photo_dim = img, photo, photo_dim
+                else:
+                    self.char_b_image, self.char_b_photo, self.char_b_photo_dim = img, photo, photo_dim
+                label.config(image=photo, text="", width=PORTRAIT_SIZE[0], height=PORTRAIT_SIZE[1])
 
-        # キャラB
-        if self.char_images.get("B") and os.path.exists(self.char_images["B"]):
-            try:
-                img = Image.open(self.char_images["B"])
-                img = self.resize_image(img, 200, 280)
-                self.char_b_image = img
-                self.char_b_photo = ImageTk.PhotoImage(img)
-                # 暗いバージョンも作成
-                enhancer = ImageEnhance.Brightness(img)
-                dim_img = enhancer.enhance(0.4)
-                self.char_b_photo_dim = ImageTk.PhotoImage(dim_img)
-                self.char_b_label.config(image=self.char_b_photo, text="", width=200, height=280)
+                # 口パク用の差分（未設定なら少し上下させた画像で代用）
+                talk_path = self.char_images.get(f"{side}_talk")
+                if talk_path and os.path.exists(talk_path):
+                    talk_img, _ = cache.get(talk_path, PORTRAIT_SIZE, DIM_BRIGHTNESS)
+                else:
+                    talk_img = make_bounce_frame(img, TALK_BOUNCE_OFFSET)
+                self.char_talk_photos[side] = ImageTk.PhotoImage(talk_img)
             except Exception as e:
-                print(f"キャラB画像読み込みエラー: {e}")
+                print(f"キャラ{side}画像読み込みエラー: {e}")
 
     def resize_image(self, img, max_width, max_height):
         """画像をリサイズ（アスペクト比を維持）"""
-        ratio = min(max_width / img.width, max_height / img.height)
-        new_size = (int(img.width * ratio), int(img.height * ratio))
-        return img.resize(new_size, Image.Resampling.LANCZOS)
+        return resize_image(img, max_width, max_height)
 
     def browse_folder(self):
         """フォルダを選択して音声ファイルを読み込む"""
@@ -323,6 +358,7 @@ class SkitPlayer:
         if folder:
             self.load_audio_files(folder)
 
+    @metrics.timed('player.load_audio_files')
     def load_audio_files(self, folder):
         """音声ファイルを読み込む"""
         self.audio_dir = folder
@@ -374,14 +410,8 @@ class SkitPlayer:
         if not skit_text:
             return
 
-        lines = skit_text.strip().split('\n')
-        line_index = 0
-
-        for line in lines:
-            match = re.match(r'^(.+?)[:：]\s*(.+)$', line)
-            if match and line_index < len(self.audio_files):
-                self.audio_files[line_index]['text'] = match.group(2).strip()
-                line_index += 1
+        for audio, line in zip(self.audio_files, parse_skit(skit_text).dialogue):
+            audio['text'] = line.text
 
         self.update_line_list()
 
@@ -461,6 +491,7 @@ class SkitPlayer:
     def play_audio(self, filepath):
         """音声を再生"""
         if AUDIO_BACKEND == "pygame":
+            init_audio_backend()
             pygame.mixer.music.load(filepath)
             pygame.mixer.music.play()
             while pygame.mixer.music.get_busy():
@@ -498,7 +529,7 @@ class SkitPlayer:
         """一時停止"""
         self.is_playing = False
         self.play_btn.config(text="▶ 再生", bg="#4aff9f", fg="black")
-        if AUDIO_BACKEND == "pygame":
+        if pygame is not None:
             pygame.mixer.music.stop()
 
     def stop_playback(self):
@@ -506,7 +537,7 @@ class SkitPlayer:
         self.is_playing = False
         self.play_btn.config(text="▶ 再生", bg="#4aff9f", fg="black")
         self.current_index = 0
-        if AUDIO_BACKEND == "pygame":
+        if pygame is not None:
             pygame.mixer.music.stop()
         self.update_display()
 
@@ -518,6 +549,11 @@ class SkitPlayer:
             # UIを更新（メインスレッドで）
             self.window.after(0, self.update_display)
 
+            # 口パク用エンベロープ（キャッシュがなければここで計算）
+            envelope = self.get_envelope(audio['file'])
+            side = self.get_character_side(audio['character'])
+            self.window.after(0, lambda s=side, e=envelope: self.start_mouth_animation(s, e))
+
             # 音声再生
             if not self.play_audio(audio['file']):
                 break  # 停止された
@@ -529,6 +565,59 @@ class SkitPlayer:
         # 再生終了
         self.window.after(0, self.on_playback_finished)
 
+    def get_envelope(self, filepath):
+        if not LIPSYNC_AVAILABLE:
+            return None
+        try:
+            return load_envelope(filepath)
+        except Exception as e:
+            print(f"エンベロープ計算エラー: {e}")
+            return None
+
+    def start_mouth_animation(self, side, envelope):
+        """話している側の口パクを開始（Tkスレッドで呼ぶ）"""
+        self.stop_mouth_animation()
+        if envelope is None or len(envelope) == 0 or not self.char_talk_photos.get(side):
+            return
+        self.mouth_side = side
+        self.mouth_envelope = envelope
+        self.mouth_start = time.monotonic()
+        self.mouth_open = False
+        self.animate_mouth()
+
+    def animate_mouth(self):
+        """経過時間から現在フレームを求めて画像を切り替える（遅れたフレームは飛ばす）"""
+        self.mouth_job = None
+        if self.mouth_envelope is None:
+            return
+        frame = int((time.monotonic() - self.mouth_start) * ANIMATION_FPS)
+        if not self.is_playing or frame >= len(self.mouth_envelope):
+            self.stop_mouth_animation()
+            return
+        is_open = self.mouth_envelope[frame] > MOUTH_OPEN_THRESHOLD
+        if is_open != self.mouth_open:
+            self.set_mouth_image(is_open)
+            self.mouth_open = is_open
+        self.mouth_job = self.window.after(1000 // ANIMATION_FPS, self.animate_mouth)
+
+    def set_mouth_image(self, is_open):
+        if self.mouth_side == "A":
+            label, normal = self.char_a_label, self.char_a_photo
+        else:
+            label, normal = self.char_b_label, self.char_b_photo
+        image = self.char_talk_photos[self.mouth_side] if is_open else normal
+        if image:
+            label.config(image=image)
+
+    def stop_mouth_animation(self):
+        if self.mouth_job is not None:
+            self.window.after_cancel(self.mouth_job)
+            self.mouth_job = None
+        if self.mouth_envelope is not None and self.mouth_open:
+            self.set_mouth_image(False)
+        self.mouth_envelope = None
+        self.mouth_open = False
+
     def on_playback_finished(self):
         """再生終了時の処理"""
         self.is_playing = False
@@ -563,5 +652,7 @@ class SkitPlayer:
 
 # スタンドアロン実行用
 if __name__ == "__main__":
+    from log_config import setup_logging
+    setup_logging()
     player = SkitPlayer()
     player.run()
@@ -0,0 +1,210 @@
+"""Geminiに送るプロンプトのテンプレート一覧
+
+テンプレートは読み込み時に一度だけ分解しておき、render では差し込むだけにする。
+本文のハッシュ（version）を分析結果・パターン・コントと一緒に保存するので、
+テンプレートを書き換えると古い版で作った結果を探して作り直せる。
+
+    python prompts.py                 # テンプレートの版と、古い版で作った結果の件数を表示
+    python prompts.py --recompute     # 古い版の動画分析・作者パターンをGeminiで作り直す
+"""
+import argparse
+import hashlib
+from string import Formatter
+
+# 版のハッシュの桁数（sha256の先頭）
+VERSION_LENGTH = 10
+
+
+class PromptTemplate:
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.version = hashlib.sha256(text.encode('utf-8')).hexdigest()[:VERSION_LENGTH]
+        # (前の文字列, 差し込む項目名) の並び。項目名がNoneなら末尾の文字列
+        self.parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"{name}: 書式指定は使えません: {{{field}}}")
+            self.parts.append((literal, field))
+        self.fields = frozenset(field for _, field in self.parts if field is not None)
+
+    @property
+    def key(self):
+        """メトリクス名などに使う「名前@版」"""
+        return f"{self.name}@{self.version}"
+
+    def render(self, **values):
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"{self.name}: 値がありません: {', '.join(sorted(missing))}")
+        return ''.join(literal + (str(values[field]) if field is not None else '') for literal, field in self.parts)
+
+
+TEMPLATES = {}
+
+
+def register(name, text):
+    template = PromptTemplate(name, text)
+    TEMPLATES[name] = template
+    return template
+
+
+def get(name):
+    return TEMPLATES[name]
+
+
+def versions():
+    """{テンプレート名: 版}"""
+    return {name: template.version for name, template in TEMPLATES.items()}
+
+
+ANALYSIS = register('analysis', '''
+以下はYouTube動画の字幕（コメディ/コント）です。
+このコンテンツが「なぜ面白いのか」をロジカルに分析してください。
+
+## 分析項目
+1. 擦り続けている概念/言葉
+2. ボケのパターン
+3. ツッコミのパターン
+4. 構造（導入→展開→オチ）
+5. このコンテンツの公式（○○×○○→○○）
+
+## 字幕テキスト
+{transcript}
+''')
+
+AUTHOR_PATTERN = register('author_pattern', '''
+以下は同じ作者による複数のコメディ動画の分析結果です。
+共通パターンを抽出してください。
+
+## 分析項目
+1. この作者の特徴的なボケのパターン
+2. この作者の特徴的なツッコミのパターン
+3. この作者がよく使う構造
+4. この作者の公式
+5. この作者のスタイルを再現するポイント
+
+## 各動画の分析結果
+{analyses}
+''')
+
+GENERATE_SKIT = register('generate_skit', '''
+あなたは「{author_name}」のゴーストライターです。
+セリフサンプルを完全に模倣して新しいコントを書いてください。
+
+## 絶対厳守ルール
+
+### 1. セリフサンプルの構造を完全コピー
+- ボケとツッコミの役割をサンプルと同じにする
+- ツッコミのスタイル（オウム返し、冷静な指摘、等）をサンプルと同じにする
+- 両方がボケているサンプルでない限り、片方は常識人
+
+### 2. 短く
+- 5〜8往復程度
+
+### 3. トーンを合わせる
+- セリフサンプルで「！」「？」が少なければ使わない
+- 淡々としていれば淡々と
+
+## テーマ
+{theme}
+
+## ★これを完全に模倣せよ★
+{transcripts}
+
+## 参考
+{analyses}
+
+{pattern}
+
+## 出力形式（厳守）
+【重要】キャラクター名は必ず「A」と「B」のみを使用すること。
+独自のキャラクター名（例：「審査官」「助手」「店員」等）は絶対に使用禁止。
+必ず「A: セリフ」「B: セリフ」の形式で1行で書く。改行してはいけない。
+
+タイトル: 〇〇
+
+A: ここにAのセリフを書く
+B: ここにBのセリフを書く
+A: 次のAのセリフ
+B: 次のBのセリフ
+''')
+
+CONVERT_CHARACTER = register('convert_character', '''
+以下のコントを、指定されたキャラクターの口調に変換してください。
+内容は変えず、口調だけを変えてください。
+
+## キャラA: {char_a_name}
+口調: {char_a_tone}
+例: {char_a_example}
+
+## キャラB: {char_b_name}
+口調: {char_b_tone}
+例: {char_b_example}
+
+## 元のコント
+{skit}
+
+## 出力形式（厳守）
+必ず「キャラ名: セリフ」を1行で書く。改行してはいけない。
+
+{char_a_name}: ここにセリフを書く
+{char_b_name}: ここにセリフを書く
+''')
+
+GLOBAL_ANALYSIS = register(
+    'global_analysis',
+    "以下は複数のコメディ作者のパターン分析結果です。全体を通して見られる面白いコメディの共通法則を抽出してください。\n\n{patterns}"
+)
+
+
+def recompute(db, gemini):
+    """古い版で作った動画分析・作者パターンを作り直し、(分析の件数, パターンの件数) を返す"""
+    analyses = 0
+    for row in db.get_stale_analyses(ANALYSIS.version):
+        transcript = db.get_transcript(row['video_id'], cleaned=True)
+        if not transcript:
+            continue
+        video = db.get_video(row['video_id'])
+        result = gemini.analyze_video(transcript, author_id=video['author_id'] if video else None)
+        if result['success']:
+            db.add_analysis(row['video_id'], result['analysis'], result['prompt_version'])
+            analyses += 1
+    patterns = 0
+    for row in db.get_stale_author_patterns(AUTHOR_PATTERN.version):
+        rows = db.get_analyses_by_author(row['author_id'])
+        analyses_text = "\n\n---\n\n".join([f"### {a['youtube_id']}\n\n{a['raw_analysis']}" for a in rows])
+        result = gemini.analyze_author_patterns(analyses_text, author_id=row['author_id'])
+        if result['success']:
+            db.save_author_pattern(row['author_id'], "", result['analysis'], result['prompt_version'])
+            patterns += 1
+    return analyses, patterns
+
+
+def main():
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="プロンプトの版と、古い版で作った結果を確認する")
+    parser.add_argument("--db", help="対象のSQLiteファイル（省略時はconfig.DATABASE_PATH）")
+    parser.add_argument("--recompute", action="store_true", help="古い版の動画分析・作者パターンを作り直す")
+    args = parser.parse_args()
+
+    db = Database(args.db) if args.db else Database()
+    try:
+        for name, template in TEMPLATES.items():
+            print(f"{name:<20}{template.version}")
+        stale = db.count_stale_results(versions())
+        print()
+        print(f"古い版の結果: 動画分析 {stale['analyses']}件 / 作者パターン {stale['author_patterns']}件 / コント {stale['generated_skits']}件")
+        if args.recompute:
+            from gemini_api import GeminiAPI
+            gemini = GeminiAPI(db=db)
+            analyses, patterns = recompute(db, gemini)
+            gemini.flush_usage()
+            print(f"作り直し: 動画分析 {analyses}件 / 作者パターン {patterns}件")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
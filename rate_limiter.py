@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """トークンバケット（rate: 1秒あたりの補充数, capacity: バースト上限）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def reserve(self):
+        """トークンを1つ取得する。取得できれば0、できなければ次に取得可能になるまでの秒数を返す"""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class AdaptiveRateLimiter:
+    """トークンバケット + AIMDによる同時実行数制御
+
+    429（レート制限）を受けたら同時実行数と送信レートを半減し、
+    正常応答ごとに同時実行数を少しずつ戻す。応答が基準より極端に遅い場合も軽く絞る。
+    """
+
+    def __init__(self, requests_per_minute, burst=None, max_concurrency=8, min_concurrency=1,
+                 slow_factor=3.0):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = self.max_rate / 16
+        self.bucket = TokenBucket(self.max_rate, burst or max(1, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.slow_factor = slow_factor
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        # acquire_async で待っている (イベントループ, asyncio.Event)。release は別スレッドからも呼ばれるので call_soon_threadsafe で起こす
+        self.async_waiters = []
+        self.latency_ewma = None
+
+        # 統計
+        self.requests = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _try_acquire(self):
+        """枠を取れたら0、取れなければ待つべき秒数を返す（cond保持中に呼ぶ）"""
+        if self.in_flight >= int(self.concurrency):
+            return None
+        wait = self.bucket.reserve()
+        if wait == 0:
+            self.in_flight += 1
+        return wait
+
+    def acquire(self):
+        """送信枠を取得するまでブロックする。待ち時間（秒）を返す"""
+        start = time.monotonic()
+        with self.cond:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    break
+                self.cond.wait(timeout=wait)
+        return self._record_wait(time.monotonic() - start)
+
+    async def acquire_async(self):
+        """acquire()のasync版。イベントループをブロックせずに、releaseかトークンの補充まで待つ"""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        while True:
+            event = asyncio.Event()
+            waiter = (loop, event)
+            with self.cond:
+                wait = self._try_acquire()
+                if wait == 0:
+                    break
+                self.async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(event.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.cond:
+                    self.async_waiters.remove(waiter)
+        return self._record_wait(time.monotonic() - start)
+
+    def _wake_async_waiters(self):
+        """acquire_async で待っているタスクを起こす（cond保持中に呼ぶ）"""
+        for loop, event in self.async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # ループが閉じられている（待っていたタスクはもう動かない）
+                pass
+
+    def _record_wait(self, waited):
+        with self.cond:
+            self.requests += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    def release(self, latency, throttled=False):
+        """リクエスト完了を通知し、結果に応じて同時実行数とレートを調整する"""
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+            else:
+                if self.latency_ewma is None:
+                    self.latency_ewma = latency
+                if latency > self.latency_ewma * self.slow_factor:
+                    self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+                else:
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                    self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 20))
+                self.latency_ewma = self.latency_ewma * 0.8 + latency * 0.2
+            self.cond.notify_all()
+            self._wake_async_waiters()
+
+    def stats(self):
+        with self.cond:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'in_flight': self.in_flight,
+                'concurrency': round(self.concurrency, 2),
+                'rate_per_minute': round(self.bucket.rate * 60, 2),
+                'wait_total': round(self.wait_total, 3),
+                'wait_max': round(self.wait_max, 3),
+                'wait_avg': round(self.wait_total / self.requests, 3) if self.requests else 0.0,
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            }
@@ -0,0 +1,114 @@
+import re
+import unicodedata
+
+# 行の種類
+LINE_TITLE = 'title'
+LINE_DIALOGUE = 'dialogue'
+LINE_DIRECTION = 'direction'
+LINE_TEXT = 'text'
+
+# 「タイトル: 〇〇」（「# タイトル：」「**タイトル:**」も可）
+TITLE_PATTERN = re.compile(r'[#*\s]*(?:タイトル|題名)\s*\**\s*[:：]\s*\**\s*(.*?)\s*\**$')
+TITLE_WORDS = ('タイトル', '題名')
+# 「A: セリフ」「**ずんだもん**：セリフ」「- B: セリフ」（話者は空白・括弧・コロンを含まない16文字まで）
+# 前後の空白を除いた行に使う。話者の文字クラスにコロンを含めないので最長一致でよい
+SPEAKER_PATTERN = re.compile(r'(?:[-・*]\s*)?\**([^\s:：（(「【\[［*]{1,16})\**\s*[:：]\s*\**\s*(.*)')
+# 行全体が括弧で囲まれたト書き「（二人で頭を下げる）」
+DIRECTION_OPENERS = '（(【[［'
+DIRECTION_LINE_PATTERN = re.compile(r'[（(【\[［]([^）)】\]］]*)[）)】\]］]$')
+# セリフ中のト書き「（笑いながら）」
+INLINE_DIRECTION_PATTERN = re.compile(r'[（(]([^）)]*)[）)]')
+
+
+class SkitLine:
+    __slots__ = ('kind', 'speaker', 'text', 'directions', 'line_no')
+
+    def __init__(self, kind, text, speaker=None, directions=(), line_no=0):
+        self.kind = kind
+        self.speaker = speaker
+        self.text = text
+        self.directions = directions
+        self.line_no = line_no
+
+    def __repr__(self):
+        if self.kind == LINE_DIALOGUE:
+            return f"SkitLine({self.line_no}, {self.speaker!r}: {self.text!r})"
+        return f"SkitLine({self.line_no}, {self.kind}, {self.text!r})"
+
+
+class ParsedSkit:
+    __slots__ = ('title', 'lines')
+
+    def __init__(self, title, lines):
+        self.title = title
+        self.lines = lines
+
+    @property
+    def dialogue(self):
+        return [line for line in self.lines if line.kind == LINE_DIALOGUE]
+
+    @property
+    def directions(self):
+        return [line for line in self.lines if line.kind == LINE_DIRECTION]
+
+    @property
+    def speakers(self):
+        """登場順の話者"""
+        return list(dict.fromkeys(line.speaker for line in self.lines if line.kind == LINE_DIALOGUE))
+
+
+_speaker_cache = {}
+
+
+def normalize_speaker(speaker):
+    """全角英字（Ａ／Ｂ）などを半角にそろえる（話者名は数種類しかないのでキャッシュする）"""
+    normalized = _speaker_cache.get(speaker)
+    if normalized is None:
+        normalized = _speaker_cache[speaker] = unicodedata.normalize('NFKC', speaker).strip()
+    return normalized
+
+
+def parse_skit(skit_text):
+    """コントのテキストを1回の走査で行の種類ごとに分解する
+
+    セリフ中の（）はト書きとしてdirectionsに分け、textからは除く。
+    """
+    title = None
+    lines = []
+    for line_no, raw in enumerate((skit_text or '').split('\n')):
+        stripped = raw.strip()
+        if not stripped:
+            continue
+        if stripped[0] in DIRECTION_OPENERS:
+            match = DIRECTION_LINE_PATTERN.match(stripped)
+            if match:
+                lines.append(SkitLine(LINE_DIRECTION, match.group(1).strip(), line_no=line_no))
+                continue
+        if TITLE_WORDS[0] in stripped or TITLE_WORDS[1] in stripped:
+            match = TITLE_PATTERN.match(stripped)
+            if match:
+                if title is None:
+                    title = match.group(1)
+                lines.append(SkitLine(LINE_TITLE, match.group(1), line_no=line_no))
+                continue
+        match = SPEAKER_PATTERN.match(stripped)
+        if match and match.group(2):
+            speaker = normalize_speaker(match.group(1))
+            text = match.group(2)
+            directions = ()
+            if '(' in text or '（' in text:
+                directions = tuple(d.strip() for d in INLINE_DIRECTION_PATTERN.findall(text))
+                text = INLINE_DIRECTION_PATTERN.sub('', text).strip()
+            if text:
+                lines.append(SkitLine(LINE_DIALOGUE, text, speaker, directions, line_no))
+                continue
+            if directions:
+                lines.append(SkitLine(LINE_DIRECTION, '、'.join(directions), speaker, line_no=line_no))
+                continue
+        lines.append(SkitLine(LINE_TEXT, stripped, line_no=line_no))
+    return ParsedSkit(title, lines)
+
+
+def parse_skits(skit_texts):
+    """複数のコントをまとめて解析する"""
+    return [parse_skit(text) for text in skit_texts]
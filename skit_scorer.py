@@ -0,0 +1,93 @@
+from skit_parser import parse_skit, LINE_DIALOGUE, LINE_TEXT
+
+EXCLAMATION_CHARS = '!！'
+QUESTION_CHARS = '?？'
+
+MIN_EXCHANGES = 5
+MAX_EXCHANGES = 8
+
+# 各項目の重み
+WEIGHTS = {
+    'format': 0.35,
+    'length': 0.25,
+    'alternation': 0.15,
+    'tone': 0.25,
+}
+
+
+def punctuation_rates(lines):
+    """1行あたりの「！」「？」の出現数"""
+    if not lines:
+        return 0.0, 0.0
+    exclamations = sum(sum(line.count(c) for c in EXCLAMATION_CHARS) for line in lines)
+    questions = sum(sum(line.count(c) for c in QUESTION_CHARS) for line in lines)
+    return exclamations / len(lines), questions / len(lines)
+
+
+def reference_tone(transcripts_text):
+    """サンプル字幕のトーン（！／？の頻度）"""
+    lines = [line.strip() for line in transcripts_text.split('\n') if line.strip() and not line.startswith('【')]
+    return punctuation_rates(lines)
+
+
+def _rate_similarity(value, reference):
+    return max(0.0, 1.0 - abs(value - reference) / max(reference, 0.2))
+
+
+def score_skit(skit, tone=(0.0, 0.0)):
+    """生成コントを採点する（0〜1）。toneはreference_tone()の結果"""
+    dialogue = []
+    other_speakers = 0
+    other_lines = 0
+    # タイトルとト書きは採点対象外
+    for line in parse_skit(skit).lines:
+        if line.kind == LINE_DIALOGUE:
+            if line.speaker in ('A', 'B'):
+                dialogue.append((line.speaker, line.text))
+            else:
+                other_speakers += 1
+        elif line.kind == LINE_TEXT:
+            other_lines += 1
+
+    total = len(dialogue) + other_speakers + other_lines
+    format_score = len(dialogue) / total if total else 0.0
+    if other_speakers:
+        format_score *= 0.5
+
+    exchanges = len(dialogue) / 2
+    if MIN_EXCHANGES <= exchanges <= MAX_EXCHANGES:
+        length_score = 1.0
+    elif exchanges < MIN_EXCHANGES:
+        length_score = exchanges / MIN_EXCHANGES
+    else:
+        length_score = max(0.0, 1.0 - (exchanges - MAX_EXCHANGES) / MAX_EXCHANGES)
+
+    if len(dialogue) > 1:
+        switches = sum(1 for prev, cur in zip(dialogue, dialogue[1:]) if prev[0] != cur[0])
+        alternation_score = switches / (len(dialogue) - 1)
+    else:
+        alternation_score = 0.0
+
+    exclamation, question = punctuation_rates([text for _, text in dialogue])
+    tone_score = (_rate_similarity(exclamation, tone[0]) + _rate_similarity(question, tone[1])) / 2
+
+    details = {
+        'format': format_score,
+        'length': length_score,
+        'alternation': alternation_score,
+        'tone': tone_score,
+        'exchanges': exchanges,
+    }
+    score = sum(details[key] * weight for key, weight in WEIGHTS.items())
+    return round(score, 3), details
+
+
+def rank_skits(skits, transcripts_text=''):
+    """候補を採点して高い順に並べる"""
+    tone = reference_tone(transcripts_text)
+    ranked = []
+    for skit in skits:
+        score, details = score_skit(skit, tone)
+        ranked.append({'skit': skit, 'score': score, 'details': details})
+    ranked.sort(key=lambda c: c['score'], reverse=True)
+    return ranked
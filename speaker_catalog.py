@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_CACHE_PATH = os.path.join(SCRIPT_DIR, "data", "speakers.json")
+
+logger = logging.getLogger(__name__)
+
+# エンジンにつながらず、キャッシュもない時のスピーカーID
+DEFAULT_SPEAKER_IDS = {
+    "ずんだもん": 3,
+    "四国めたん": 2,
+    "春日部つむぎ": 8,
+}
+
+# 口調変換に使うキャラクターごとの口調（エンジンからは取れないのでここで持つ）
+CHARACTER_TONES = {
+    "ずんだもん": {
+        "role": "ボケ",
+        "tone": "語尾に「〜のだ」「〜なのだ」を使う。子供っぽく無邪気。",
+        "example": "それはすごいのだ！ / わからないのだ… / やってみるのだ"
+    },
+    "四国めたん": {
+        "role": "ツッコミ",
+        "tone": "大人っぽく落ち着いている。丁寧語だが冷静にツッコむ。",
+        "example": "それはおかしいですね / なぜそうなるんですか / 意味がわかりません"
+    },
+    "春日部つむぎ": {
+        "role": "どちらでも",
+        "tone": "明るく元気。ギャルっぽい。語尾に「〜じゃん」「〜だよね」を使う。",
+        "example": "まじ？それやばくない？ / いいじゃんいいじゃん！ / ウケるんだけど"
+    },
+}
+DEFAULT_TONE = {"role": "どちらでも", "tone": "", "example": ""}
+
+# キャラクターごとの話し方。audio_queryの値をこれで上書きする（config.py の VOICEVOX_PRESETS で指定）
+# 例: VOICEVOX_PRESETS = {"ずんだもん": {"speedScale": 1.1, "intonationScale": 1.2}}
+PRESET_KEYS = ("speedScale", "pitchScale", "intonationScale", "volumeScale", "prePhonemeLength", "postPhonemeLength")
+try:
+    from config import VOICEVOX_PRESETS
+except ImportError:
+    VOICEVOX_PRESETS = {}
+
+# 話者名だけで選んだ時に使うスタイル。ほかのスタイルは「話者名（スタイル名）」として並べる
+DEFAULT_STYLE_NAME = "ノーマル"
+
+
+def build_index(speakers):
+    """/speakers の応答から ({キャラ名: スタイルID}, {キャラ名: 話者名}) を作る（読み上げ用のスタイルだけ）"""
+    speaker_ids = {}
+    base_names = {}
+    for speaker in speakers:
+        name = speaker.get("name")
+        styles = [s for s in speaker.get("styles", []) if s.get("type", "talk") == "talk" and "id" in s]
+        if not name or not styles:
+            continue
+        default = next((s for s in styles if s.get("name") == DEFAULT_STYLE_NAME), styles[0])
+        speaker_ids[name] = default["id"]
+        base_names[name] = name
+        for style in styles:
+            if style is not default:
+                label = f"{name}（{style.get('name')}）"
+                speaker_ids[label] = style["id"]
+                base_names[label] = name
+    return speaker_ids, base_names
+
+
+class SpeakerCatalog:
+    """キャラクター名 → スタイルIDの一覧
+
+    起動時はディスクのキャッシュ（なければDEFAULT_SPEAKER_IDS）を使い、refreshでエンジンの
+    バージョンがキャッシュと違う時だけ /speakers を取り直す。
+    """
+
+    def __init__(self, cache_path=CATALOG_CACHE_PATH):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.version = None
+        self.fetched_at = None
+        self.source = "default"
+        self.speaker_ids = dict(DEFAULT_SPEAKER_IDS)
+        self.base_names = {name: name for name in DEFAULT_SPEAKER_IDS}
+        self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("[speaker_catalog] cache unreadable: %s", e)
+            return
+        self._apply(data.get("speakers", []), data.get("version"), data.get("fetched_at"), "cache")
+
+    def _save_cache(self, speakers):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "fetched_at": self.fetched_at, "speakers": speakers},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.cache_path)
+
+    def _apply(self, speakers, version, fetched_at, source):
+        speaker_ids, base_names = build_index(speakers)
+        if not speaker_ids:
+            return False
+        with self.lock:
+            self.speaker_ids = speaker_ids
+            self.base_names = base_names
+            self.version = version
+            self.fetched_at = fetched_at
+            self.source = source
+        return True
+
+    def refresh(self, voicevox, force=False):
+        """エンジンのバージョンが変わっていれば（forceなら常に）/speakers を取り直す。取り直したらTrue"""
+        version = voicevox.get_version()
+        if version is None:
+            return False
+        if not force and self.source != "default" and version == self.version:
+            return False
+        speakers = voicevox.get_speakers()
+        if not speakers or not self._apply(speakers, version, time.time(), "engine"):
+            return False
+        try:
+            self._save_cache(speakers)
+        except OSError as e:
+            logger.warning("[speaker_catalog] cache not saved: %s", e)
+        logger.info("[speaker_catalog] loaded %d styles from engine %s", len(self.speaker_ids), version)
+        return True
+
+    def speaker_id(self, name):
+        return self.speaker_ids.get(name)
+
+    def names(self):
+        """選択肢の並び（口調の設定があるキャラを先に）"""
+        with self.lock:
+            names = list(self.speaker_ids)
+        toned = [name for name in CHARACTER_TONES if name in self.speaker_ids]
+        return toned + [name for name in names if name not in CHARACTER_TONES]
+
+    def preset(self, name):
+        """audio_queryに上書きする話し方（スタイル違いは元の話者の設定を使う）"""
+        preset = VOICEVOX_PRESETS.get(name) or VOICEVOX_PRESETS.get(self.base_names.get(name)) or {}
+        return {key: value for key, value in preset.items() if key in PRESET_KEYS}
+
+    def character_info(self, name):
+        """口調変換用の {name, role, tone, example}（スタイル違いは元の話者の口調を使う）"""
+        tone = CHARACTER_TONES.get(name) or CHARACTER_TONES.get(self.base_names.get(name)) or DEFAULT_TONE
+        return dict(tone, name=name)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """アプリ全体で共有するカタログ"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = SpeakerCatalog()
+        return _catalog
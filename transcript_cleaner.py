@@ -0,0 +1,206 @@
+"""字幕の整形: 効果音タグの除去、自動字幕の重複行の除去、文の区切り直し
+
+重複行の除去と短い断片の連結は自動生成字幕（track が generated）だけに行う。手動字幕は行をそのまま発言として残す
+（同じ行の繰り返しもネタの一部）。
+
+    python transcript_cleaner.py            # 整形版のない字幕を整形して保存し、削減量を表示
+    python transcript_cleaner.py --all      # 全字幕を整形し直す
+"""
+import argparse
+import re
+import time
+import unicodedata
+
+# [音楽] [拍手] ［Music］ など。笑いは掛け合いの分析に使うので（笑）にそろえて残す
+TAG_PATTERN = re.compile(r'[\[［]([^\]］]{1,12})[\]］]')
+LAUGH_TAGS = {'笑', '笑い', '笑い声', '爆笑', 'laughter', 'laughs', 'laughing'}
+LAUGH_MARK = '（笑）'
+MUSIC_SYMBOLS = re.compile(r'[♪♫♬]+')
+SPACES = re.compile(r'[ \t　]+')
+
+# 話者の切り替わり（YouTubeの字幕では「>>」や行頭の「-」で示される）
+TURN_PATTERN = re.compile(r'^(?:>>|＞＞|[-－―]\s)\s*')
+TURN_MARK = '- '
+# 「A: 」「Ａ：」「ずんだもん: 」のような話者名も切り替わりとして扱う（NFKC後なので半角の「:」だけ見ればよい）
+# 数字で始まるもの（時刻など）やURL（http://）は話者名とみなさない
+SPEAKER_PATTERN = re.compile(r'^([^\W\d_]{1,10})\s*:(?!//)\s*(?=\S)')
+# 重複行を除く字幕の種類（youtube_api.TRACK_GENERATED）
+GENERATED_TRACK = 'generated'
+
+# 文末とみなす記号
+SENTENCE_END_CHARS = '。！？!?'
+SENTENCE_END = re.compile(f'(?<=[{SENTENCE_END_CHARS}])')
+# 自動字幕の行の重なりとみなす最短の文字数
+MIN_OVERLAP = 3
+# これより短い断片は次の行とつなぐ（句読点のない自動字幕用）
+SHORT_FRAGMENT_CHARS = 12
+# つないだ行の長さの上限
+MAX_LINE_CHARS = 80
+
+
+def strip_tags(line):
+    """効果音タグを除き、(残りのテキスト, 除いたタグ数) を返す"""
+    removed = 0
+
+    def replace(match):
+        nonlocal removed
+        removed += 1
+        return LAUGH_MARK if match.group(1).strip().lower() in LAUGH_TAGS else ''
+
+    line = TAG_PATTERN.sub(replace, line)
+    line = MUSIC_SYMBOLS.sub('', line)
+    return SPACES.sub(' ', line).strip(), removed
+
+
+def _overlap(previous, current):
+    """previousの末尾とcurrentの先頭が重なる文字数（MIN_OVERLAP未満なら0）"""
+    for size in range(min(len(previous), len(current)), MIN_OVERLAP - 1, -1):
+        if previous.endswith(current[:size]):
+            return size
+    return 0
+
+
+def dedupe_rolling(lines):
+    """自動字幕の「前の行を含んで伸びていく行」「同じ行の繰り返し」を1つにまとめる
+
+    lines は (行頭の話者の印, テキスト) のリスト（印が空文字なら切り替わりなし）。まとめた行数も返す。
+    """
+    result = []
+    merged = 0
+    for turn, text in lines:
+        if result and not turn:
+            previous = result[-1][1]
+            if text == previous or previous.endswith(text):
+                merged += 1
+                continue
+            if text.startswith(previous):
+                result[-1] = (result[-1][0], text)
+                merged += 1
+                continue
+            size = _overlap(previous, text)
+            if size:
+                result[-1] = (result[-1][0], previous + text[size:])
+                merged += 1
+                continue
+        result.append((turn, text))
+    return result, merged
+
+
+def _join(left, right):
+    # 英数字どうしの間だけ空白を入れる
+    if left and right and left[-1].isascii() and left[-1].isalnum() and right[0].isascii() and right[0].isalnum():
+        return f"{left} {right}"
+    return left + right
+
+
+def resegment(lines, join_fragments=True):
+    """断片的な行を文にまとめ直す。話者の切り替わりをまたいではつながない
+
+    句読点があれば文末で区切り、句読点のない自動字幕はSHORT_FRAGMENT_CHARS未満の断片だけを次の行とつなぐ。
+    join_fragments=False（手動字幕）なら行をまたいではつながない。手動字幕の1行は1つの発言で、
+    印のない話者の切り替わり（「なんでやねん」の繰り返しなど）を1行にまとめてしまうため。
+    """
+    segments = []
+    buffer = ''
+    buffer_turn = ''
+
+    def flush(final):
+        nonlocal buffer, buffer_turn
+        sentences = [sentence.strip() for sentence in SENTENCE_END.split(buffer) if sentence.strip()]
+        # 文末で終わっていない最後の断片は、次の行とつなぐために残す
+        tail = '' if final or not sentences or buffer.rstrip()[-1] in SENTENCE_END_CHARS else sentences.pop()
+        for sentence in sentences:
+            segments.append((buffer_turn, sentence))
+            buffer_turn = ''
+        buffer = tail
+
+    for turn, text in lines:
+        if turn:
+            flush(final=True)
+            buffer_turn = turn
+        buffer = _join(buffer, text)
+        if not join_fragments or len(buffer) >= MAX_LINE_CHARS:
+            flush(final=True)
+        elif SENTENCE_END.search(buffer):
+            flush(final=False)
+        elif len(buffer) >= SHORT_FRAGMENT_CHARS:
+            flush(final=True)
+    flush(final=True)
+    return segments
+
+
+def split_turn(line):
+    """行頭の話者の印を分け、(印, 残りのテキスト) を返す。印は「- 」か「A: 」の形で、切り替わりでなければ空文字"""
+    match = TURN_PATTERN.match(line)
+    if match:
+        return TURN_MARK, line[match.end():]
+    match = SPEAKER_PATTERN.match(line)
+    if match:
+        return f"{match.group(1)}: ", line[match.end():]
+    return '', line
+
+
+def clean_transcript(text, track=None):
+    """字幕を整形し、{text, original_chars, cleaned_chars, removed_tags, merged_lines, lines} を返す
+
+    track は字幕の種類（youtube_api.TRACK_*）。generated のときだけ自動字幕の重複行をまとめ、短い断片を次の行とつなぐ。
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    lines = []
+    removed_tags = 0
+    for raw in text.split('\n'):
+        turn, line = split_turn(raw.strip())
+        line, removed = strip_tags(line)
+        removed_tags += removed
+        if not line:
+            continue
+        if line == LAUGH_MARK and lines:
+            # 笑いだけの行は直前の発言の後ろに付ける
+            if not lines[-1][1].endswith(LAUGH_MARK):
+                lines[-1] = (lines[-1][0], lines[-1][1] + LAUGH_MARK)
+            continue
+        lines.append((turn, line))
+
+    merged = 0
+    generated = track == GENERATED_TRACK
+    if generated:
+        lines, merged = dedupe_rolling(lines)
+    segments = resegment(lines, join_fragments=generated)
+    cleaned = '\n'.join(turn + line for turn, line in segments)
+    return {
+        'text': cleaned,
+        'original_chars': len(text),
+        'cleaned_chars': len(cleaned),
+        'removed_tags': removed_tags,
+        'merged_lines': merged,
+        'lines': len(segments),
+    }
+
+
+def reduction(original_chars, cleaned_chars):
+    """削減率（0〜1）"""
+    return 1 - cleaned_chars / original_chars if original_chars else 0.0
+
+
+def main():
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="保存済みの字幕を整形して整形版を保存する")
+    parser.add_argument("--db", help="対象のSQLiteファイル（省略時はconfig.DATABASE_PATH）")
+    parser.add_argument("--all", action="store_true", help="整形版がある字幕も整形し直す")
+    args = parser.parse_args()
+
+    db = Database(args.db) if args.db else Database()
+    start = time.perf_counter()
+    try:
+        count = db.clean_transcripts(only_missing=not args.all)
+        stats = db.get_transcript_cleaning_stats()
+    finally:
+        db.close()
+    print(f"整形: {count}件（{time.perf_counter() - start:.1f}秒）")
+    print(f"字幕 {stats['count']}件: {stats['original_chars']}文字 → {stats['cleaned_chars']}文字"
+          f"（-{reduction(stats['original_chars'], stats['cleaned_chars']):.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from image_cache import ThumbnailCache, make_bounce_frame
+
+try:
+    from audio_envelope import load_envelope
+    LIPSYNC_AVAILABLE = True
+except ImportError:
+    LIPSYNC_AVAILABLE = False
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CHARACTER_CONFIG_PATH = os.path.join(SCRIPT_DIR, "character_images.json")
+
+VIDEO_SIZE = (1280, 720)
+VIDEO_FPS = 20
+LINE_GAP = 0.3  # セリフ間の間隔（プレイヤーと同じ）
+PORTRAIT_SIZE = (400, 500)
+DIM_BRIGHTNESS = 0.4
+MOUTH_OPEN_THRESHOLD = 0.25
+TALK_BOUNCE_OFFSET = 10
+BACKGROUND_COLOR = "#1a1a2e"
+SPEAKER_COLORS = {"A": "#ffcc00", "B": "#00ccff"}
+SUBTITLE_FONT_SIZE = 36
+SPEAKER_FONT_SIZE = 28
+
+# 日本語フォント候補（見つからなければPILの既定フォント）
+FONT_CANDIDATES = [
+    "C:/Windows/Fonts/meiryo.ttc",
+    "C:/Windows/Fonts/msgothic.ttc",
+    "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+]
+
+# キャラ名 → 立ち絵の左右（プレイヤーと同じ）
+CHARACTER_MAPPING = {
+    "ずんだもん": "A",
+    "四国めたん": "B",
+    "春日部つむぎ": "A",
+}
+
+
+def load_font(size):
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
+
+
+def load_character_images():
+    if os.path.exists(CHARACTER_CONFIG_PATH):
+        with open(CHARACTER_CONFIG_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get("images", {})
+    return {}
+
+
+def wav_duration(path):
+    with wave.open(path, "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def mix_audio(files, output_path, gap=LINE_GAP):
+    """セリフのWAVを間隔を空けて1本に連結する（形式は先頭ファイルに合わせる）"""
+    with wave.open(files[0], "rb") as first:
+        params = first.getparams()
+    silence = b"\x00" * int(params.framerate * gap) * params.sampwidth * params.nchannels
+    with wave.open(output_path, "wb") as out:
+        out.setparams(params)
+        for path in files:
+            with wave.open(path, "rb") as wf:
+                if (wf.getframerate(), wf.getsampwidth(), wf.getnchannels()) != (params.framerate, params.sampwidth, params.nchannels):
+                    raise ValueError(f"音声形式が異なります: {path}")
+                out.writeframes(wf.readframes(wf.getnframes()))
+            out.writeframes(silence)
+
+
+def build_timeline(lines, fps=VIDEO_FPS):
+    """(状態, 秒数) のリストを作る。状態は (セリフ番号, 口が開いているか)。同じ状態が続く区間はまとめる"""
+    timeline = []
+
+    def push(state, duration):
+        if timeline and timeline[-1][0] == state:
+            timeline[-1] = (state, timeline[-1][1] + duration)
+        else:
+            timeline.append((state, duration))
+
+    for index, line in enumerate(lines):
+        duration = wav_duration(line["file"])
+        envelope = None
+        if LIPSYNC_AVAILABLE:
+            try:
+                envelope = load_envelope(line["file"], fps)
+            except Exception:
+                envelope = None
+        if envelope is None or len(envelope) == 0:
+            push((index, False), duration)
+        else:
+            frame_time = duration / len(envelope)
+            for value in envelope:
+                push((index, bool(value > MOUTH_OPEN_THRESHOLD)), frame_time)
+        push((index, False), LINE_GAP)
+    return timeline
+
+
+def wrap_text(draw, text, font, max_width):
+    lines = []
+    current = ""
+    for char in text:
+        if draw.textlength(current + char, font=font) > max_width:
+            lines.append(current)
+            current = char
+        else:
+            current += char
+    if current:
+        lines.append(current)
+    return lines
+
+
+def compose_frame(job):
+    """1つの状態の静止画を作ってPNGに保存する（プロセスプールで実行）"""
+    output_path, line, side, mouth_open, images = job
+    width, height = VIDEO_SIZE
+    canvas = Image.new("RGBA", VIDEO_SIZE, BACKGROUND_COLOR)
+    cache = ThumbnailCache()
+
+    for char_side, x in (("A", 60), ("B", width - 60 - PORTRAIT_SIZE[0])):
+        path = images.get(char_side)
+        if not path or not os.path.exists(path):
+            continue
+        normal, dim = cache.get(path, PORTRAIT_SIZE, DIM_BRIGHTNESS)
+        if char_side != side:
+            portrait = dim
+        elif mouth_open:
+            talk_path = images.get(f"{char_side}_talk")
+            if talk_path and os.path.exists(talk_path):
+                portrait, _ = cache.get(talk_path, PORTRAIT_SIZE, DIM_BRIGHTNESS)
+            else:
+                portrait = make_bounce_frame(normal, TALK_BOUNCE_OFFSET)
+        else:
+            portrait = normal
+        portrait = portrait.convert("RGBA")
+        canvas.alpha_composite(portrait, (x, 20 + PORTRAIT_SIZE[1] - portrait.height))
+
+    # 字幕
+    draw = ImageDraw.Draw(canvas)
+    box_top = height - 180
+    draw.rectangle([40, box_top, width - 40, height - 20], fill="#000000")
+    speaker_font = load_font(SPEAKER_FONT_SIZE)
+    subtitle_font = load_font(SUBTITLE_FONT_SIZE)
+    draw.text((70, box_top + 12), line["character"], font=speaker_font, fill=SPEAKER_COLORS.get(side, "#ffcc00"))
+    y = box_top + 56
+    for text_line in wrap_text(draw, line["text"], subtitle_font, width - 140)[:2]:
+        draw.text((70, y), text_line, font=subtitle_font, fill="#ffffff")
+        y += SUBTITLE_FONT_SIZE + 10
+
+    canvas.convert("RGB").save(output_path)
+    return output_path
+
+
+def load_skit_lines(audio_dir):
+    with open(os.path.join(audio_dir, "skit_info.json"), "r", encoding="utf-8") as f:
+        skit_info = json.load(f)
+    return [
+        {"file": os.path.join(audio_dir, info["file"]), "character": info["character"], "text": info["text"]}
+        for info in skit_info
+    ]
+
+
+def render_video(audio_dir, output_path, ffmpeg="ffmpeg", workers=None, character_images=None):
+    """skit_info.jsonのあるフォルダから動画を書き出す"""
+    if shutil.which(ffmpeg) is None:
+        return {"success": False, "error": "ffmpegが見つかりません"}
+    lines = load_skit_lines(audio_dir)
+    if not lines:
+        return {"success": False, "error": "セリフがありません"}
+    images = character_images if character_images is not None else load_character_images()
+
+    with tempfile.TemporaryDirectory(prefix="skit_render_") as work_dir:
+        mixed_path = os.path.join(work_dir, "mixed.wav")
+        mix_audio([line["file"] for line in lines], mixed_path)
+        timeline = build_timeline(lines)
+
+        # 縮小済み立ち絵を先に作っておき、ワーカーはディスクキャッシュを読むだけにする
+        cache = ThumbnailCache()
+        for path in images.values():
+            if path and os.path.exists(path):
+                cache.get(path, PORTRAIT_SIZE, DIM_BRIGHTNESS)
+
+        # 変化のある状態だけ合成する
+        states = sorted({state for state, _ in timeline})
+        frame_paths = {state: os.path.join(work_dir, f"frame_{state[0]:03d}_{int(state[1])}.png") for state in states}
+        jobs = []
+        for (index, mouth_open) in states:
+            line = lines[index]
+            side = CHARACTER_MAPPING.get(line["character"], "A" if index % 2 == 0 else "B")
+            jobs.append((frame_paths[(index, mouth_open)], line, side, mouth_open, images))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(compose_frame, jobs))
+
+        # concat demuxer用のリスト（最後のファイルは2回書くのがffmpegの作法）
+        list_path = os.path.join(work_dir, "frames.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for state, duration in timeline:
+                f.write(f"file '{frame_paths[state]}'\nduration {duration:.4f}\n")
+            f.write(f"file '{frame_paths[timeline[-1][0]]}'\n")
+
+        command = [
+            ffmpeg, "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", mixed_path,
+            "-r", str(VIDEO_FPS), "-pix_fmt", "yuv420p", "-c:v", "libx264", "-tune", "stillimage",
+            "-c:a", "aac", "-shortest", output_path,
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            return {"success": False, "error": result.stderr.strip()[-500:]}
+
+    return {"success": True, "output": output_path, "frames": len(states), "segments": len(timeline)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("使い方: python video_renderer.py <音声フォルダ> <出力.mp4>")
+        sys.exit(1)
+    outcome = render_video(sys.argv[1], sys.argv[2])
+    if outcome["success"]:
+        print(f"書き出し完了: {outcome['output']}（合成フレーム {outcome['frames']}枚）")
+    else:
+        print(f"エラー: {outcome['error']}")
+        sys.exit(1)
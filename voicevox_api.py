@@ -1,200 +1,660 @@
-import requests
+import asyncio
+import importlib.util
+import io
 import json
 import logging
 import os
+import re
+import threading
+import time
+import wave
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import metrics
+from engine_pool import EnginePool
+from skit_parser import parse_skit
+from speaker_catalog import get_catalog
 
 VOICEVOX_BASE_URL = "http://localhost:50021"
 
-# ログ設定
-LOG_DIR = os.path.dirname(os.path.abspath(__file__))
-LOG_FILE = os.path.join(LOG_DIR, "voicevox_debug.log")
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 複数のエンジンを別ポートで動かしている場合は config.py に VOICEVOX_URLS = [...] を書く
+try:
+    from config import VOICEVOX_URLS
+except ImportError:
+    VOICEVOX_URLS = [VOICEVOX_BASE_URL]
+
+# ログの出力先・レベルは log_config.setup_logging() で設定する
 logger = logging.getLogger(__name__)
 
-# キャラクターIDマッピング
-SPEAKER_IDS = {
-    "ずんだもん": 3,
-    "四国めたん": 2,
-    "春日部つむぎ": 8,
-}
+# requests・aiohttp・numpyは読み込みが重いので、ここでは有無だけ確認して使う時に読み込む
+# 非同期HTTP用（aiohttpがなければ同期版をスレッドプールで実行）
+AIOHTTP_AVAILABLE = importlib.util.find_spec("aiohttp") is not None
+
+# 口パク用エンベロープ（numpyが必要）
+ENVELOPE_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+# 非同期版の同時リクエスト上限
+VOICEVOX_ASYNC_LIMIT = 64
+
+# この文字数を超えるセリフは文ごとに分けて並列に合成し、WAVをつなぐ
+CHUNK_MAX_CHARS = 40
+# 文の区切り（句点・感嘆符・疑問符・三点リーダ・改行）と、長すぎる文を分ける読点
+SENTENCE_PATTERN = re.compile(r'[^。！？!?…\n]+[。！？!?…]*|[。！？!?…]+')
+CLAUSE_PATTERN = re.compile(r'[^、，,]+[、，,]*')
+
+# 同時に合成するセリフ数と、セリフ内の文の同時合成数（プールを分けてデッドロックを避ける）
+LINE_WORKERS = 4
+CHUNK_WORKERS = 4
+# エンジン1つあたりに保持するHTTP接続数（セリフ・文の同時合成数に、一括生成で並ぶ分の余裕を足す）
+HTTP_POOL_SIZE = 2 * (LINE_WORKERS + CHUNK_WORKERS)
+# audio_query→synthesisが失敗した時のやり直し回数と初回の待ち時間（秒、回ごとに倍）
+LINE_RETRIES = 2
+RETRY_DELAY = 0.5
+
+# コント全体の合成を話者ごとの /multi_synthesis（ZIPで返る）にまとめるか。1リクエストあたりのクエリ数の上限
+# まとめると往復は減るが、全クエリがそろうまで合成を始められず、1リクエスト内は順に合成される。
+# アプリのようにコントを1本ずつ合成する場合はセリフごとの方が2割ほど速く、複数のコントを同時に合成する場合で
+# ほぼ同じ（代役エンジン・1リクエスト20msでの計測）。往復の遅いリモートのエンジンでは config.py に MULTI_SYNTHESIS = True を書く
+try:
+    from config import MULTI_SYNTHESIS
+except ImportError:
+    MULTI_SYNTHESIS = False
+MULTI_SYNTHESIS_BATCH = 16
 
-class VoicevoxAPI:
-    def __init__(self, base_url=VOICEVOX_BASE_URL):
-        self.base_url = base_url
-        logger.info(f"VoicevoxAPI initialized: base_url={base_url}")
 
-    def is_available(self):
-        """VOICEVOXが起動しているか確認"""
+class VoicevoxAPI:
+    def __init__(self, base_url=None, catalog=None):
+        """base_url: エンジンのURL（複数ならリスト）。省略時はVOICEVOX_URLS
+        catalog: キャラクター名 → スタイルID（省略時は speaker_catalog.get_catalog()）
+        """
+        urls = [base_url] if isinstance(base_url, str) else list(base_url or VOICEVOX_URLS)
+        self.pool = EnginePool(urls, self.check_engine)
+        self.catalog = catalog or get_catalog()
+        self.base_url = self.pool.urls[0]
+        self.multi_synthesis_supported = None
+        self._http = None
+        self._http_lock = threading.Lock()
+        self._session = None
+        self._semaphore = None
+        metrics.registry.register_collector('voicevox.engines', self.pool.stats)
+        logger.info("VoicevoxAPI initialized: engines=%s", self.pool.urls)
+
+    def _get_http(self):
+        """接続を使い回すrequests.Session（スレッド間で共有。リクエストごとにTCP接続を張らない）"""
+        with self._http_lock:
+            if self._http is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=max(1, len(self.pool.engines)), pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._http = session
+            return self._http
+
+    def check_engine(self, url):
+        """1つのエンジンが起動しているか確認"""
         try:
-            logger.debug(f"Checking VOICEVOX availability: {self.base_url}/version")
-            response = requests.get(f"{self.base_url}/version", timeout=2)
-            logger.info(f"VOICEVOX version check: status={response.status_code}, body={response.text[:100]}")
+            with metrics.timer('voicevox.version'):
+                response = self._get_http().get(f"{url}/version", timeout=2)
+            logger.info("VOICEVOX version check: %s status=%s", url, response.status_code)
             return response.status_code == 200
         except Exception as e:
-            logger.error(f"VOICEVOX not available: {e}")
+            logger.error("VOICEVOX not available: %s %s", url, e)
             return False
 
+    def is_available(self):
+        """VOICEVOXが起動しているか確認（エンジンが複数なら1つでも使えればTrue）"""
+        return self.pool.check_all()
+
+    def _request(self, method, path, timeout, **kwargs):
+        """空いているエンジンに送り、つながらなければ別のエンジンへ送り直す"""
+        import requests
+        if self.pool.needs_recheck():
+            self.pool.recheck_due()
+        tried = []
+        last_error = None
+        while True:
+            engine = self.pool.acquire(exclude=tried)
+            if engine is None:
+                raise last_error
+            ok = False
+            try:
+                response = self._get_http().request(method, f"{engine.url}{path}", timeout=timeout, **kwargs)
+                ok = True
+                return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logger.warning("[%s] engine %s failed: %s", path, engine.url, e)
+                metrics.increment('voicevox.failovers')
+                tried.append(engine)
+                last_error = e
+            finally:
+                self.pool.release(engine, ok)
+
+    def _get_json(self, path):
+        """GETしてJSONを返す（失敗したらNone）"""
+        try:
+            response = self._request("GET", path, 10)
+            if response.status_code == 200:
+                return response.json()
+            logger.error("[%s] FAILED - status: %s", path, response.status_code)
+        except Exception as e:
+            logger.error("[%s] EXCEPTION: %s", path, e)
+        return None
+
+    def get_version(self):
+        """エンジンのバージョン文字列"""
+        return self._get_json("/version")
+
+    def get_speakers(self):
+        """/speakers の応答（話者とスタイルの一覧）"""
+        return self._get_json("/speakers")
+
     def get_audio_query(self, text, speaker_id):
         """音声合成用のクエリを生成"""
         try:
-            url = f"{self.base_url}/audio_query"
             params = {"text": text, "speaker": speaker_id}
-            logger.info(f"[audio_query] URL: {url}")
-            logger.info(f"[audio_query] params: {params}")
-            logger.debug(f"[audio_query] text: {text[:50]}...")
-
-            response = requests.post(url, params=params, timeout=30)
-
-            logger.info(f"[audio_query] status: {response.status_code}")
-            logger.debug(f"[audio_query] headers: {dict(response.headers)}")
+            with metrics.timer('voicevox.audio_query'):
+                response = self._request("POST", "/audio_query", 30, params=params)
 
             if response.status_code == 200:
                 query = response.json()
-                logger.info(f"[audio_query] SUCCESS - query keys: {list(query.keys())}")
+                logger.debug("[audio_query] speaker=%s chars=%d", speaker_id, len(text), extra={"sampled": True})
                 return {"success": True, "query": query}
             else:
-                logger.error(f"[audio_query] FAILED - status: {response.status_code}, body: {response.text[:200]}")
+                metrics.increment('voicevox.audio_query.failures')
+                logger.error("[audio_query] FAILED - status: %s, body: %.200s", response.status_code, response.text)
                 return {"success": False, "error": f"Status {response.status_code}: {response.text[:100]}"}
         except Exception as e:
-            logger.exception(f"[audio_query] EXCEPTION: {e}")
+            logger.exception("[audio_query] EXCEPTION: %s", e)
             return {"success": False, "error": str(e)}
 
     def synthesize(self, query, speaker_id):
         """音声を合成"""
         try:
-            url = f"{self.base_url}/synthesis"
             params = {"speaker": speaker_id}
             data = json.dumps(query)
 
-            logger.info(f"[synthesis] URL: {url}")
-            logger.info(f"[synthesis] params: {params}")
-            logger.debug(f"[synthesis] query data length: {len(data)} bytes")
-
-            response = requests.post(url, params=params, data=data, timeout=60)
-
-            logger.info(f"[synthesis] status: {response.status_code}")
-            logger.debug(f"[synthesis] headers: {dict(response.headers)}")
+            with metrics.timer('voicevox.synthesis'):
+                response = self._request("POST", "/synthesis", 60, params=params, data=data)
 
             if response.status_code == 200:
-                content_length = len(response.content)
-                logger.info(f"[synthesis] SUCCESS - audio size: {content_length} bytes")
+                logger.debug("[synthesis] speaker=%s bytes=%d", speaker_id, len(response.content), extra={"sampled": True})
                 return {"success": True, "audio": response.content}
             else:
-                logger.error(f"[synthesis] FAILED - status: {response.status_code}, body: {response.text[:200]}")
+                metrics.increment('voicevox.synthesis.failures')
+                logger.error("[synthesis] FAILED - status: %s, body: %.200s", response.status_code, response.text)
                 return {"success": False, "error": f"Status {response.status_code}: {response.text[:100]}"}
         except Exception as e:
-            logger.exception(f"[synthesis] EXCEPTION: {e}")
+            logger.exception("[synthesis] EXCEPTION: %s", e)
+            return {"success": False, "error": str(e)}
+
+    def _with_retry(self, func, *args):
+        """func(*args) が失敗したらLINE_RETRIES回までやり直す"""
+        for attempt in range(LINE_RETRIES + 1):
+            result = func(*args)
+            if result["success"]:
+                return result
+            if attempt < LINE_RETRIES:
+                metrics.increment('voicevox.retries')
+                logger.warning("[%s] retry %d/%d: %s", func.__name__, attempt + 1, LINE_RETRIES, result["error"])
+                time.sleep(RETRY_DELAY * (2 ** attempt))
+        return result
+
+    def _query(self, text, speaker_id, preset=None):
+        """audio_queryを作り、キャラクターの話し方（preset）を反映する"""
+        result = self._with_retry(self.get_audio_query, text, speaker_id)
+        if result["success"] and preset:
+            result["query"].update(preset)
+        return result
+
+    def _speak(self, text, speaker_id, preset=None):
+        """audio_query→synthesisを1回分"""
+        query_result = self._query(text, speaker_id, preset)
+        if not query_result["success"]:
+            return query_result
+        result = self._with_retry(self.synthesize, query_result["query"], speaker_id)
+        if result["success"]:
+            result["query"] = query_result["query"]
+        return result
+
+    def multi_synthesize(self, queries, speaker_id):
+        """同じ話者の複数のクエリを1リクエストで合成する（/multi_synthesis）。audioはWAVのリスト"""
+        try:
+            with metrics.timer('voicevox.multi_synthesis'):
+                response = self._request("POST", "/multi_synthesis", 60 + 10 * len(queries), params={"speaker": speaker_id},
+                                         data=json.dumps(queries), headers={"Content-Type": "application/json"})
+            if response.status_code == 200:
+                # ZIPの中身は 001.wav, 002.wav, ... とクエリの順に並ぶ
+                with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+                    wavs = [archive.read(name) for name in sorted(archive.namelist())]
+                if len(wavs) != len(queries):
+                    return {"success": False, "error": f"multi_synthesis returned {len(wavs)}/{len(queries)} files"}
+                return {"success": True, "audio": wavs}
+            if response.status_code in (404, 405):
+                # 古いエンジン。以降はセリフごとの合成にする
+                self.multi_synthesis_supported = False
+                logger.warning("[multi_synthesis] not supported by engine, falling back to /synthesis")
+            metrics.increment('voicevox.multi_synthesis.failures')
+            logger.error("[multi_synthesis] FAILED - status: %s, body: %.200s", response.status_code, response.text)
+            return {"success": False, "error": f"Status {response.status_code}: {response.text[:100]}"}
+        except Exception as e:
+            logger.exception("[multi_synthesis] EXCEPTION: %s", e)
             return {"success": False, "error": str(e)}
 
     def text_to_speech(self, text, character_name):
-        """テキストから音声を生成"""
-        logger.info(f"[text_to_speech] character: {character_name}, text: {text[:30]}...")
+        """テキストから音声を生成
 
-        speaker_id = SPEAKER_IDS.get(character_name)
+        CHUNK_MAX_CHARSを超えるテキストは文ごとに並列で合成し、サンプル単位でつなぐ。
+        """
+        speaker_id = self.catalog.speaker_id(character_name)
         if speaker_id is None:
-            logger.error(f"[text_to_speech] Unknown character: {character_name}")
-            return {"success": False, "error": f"Unknown character: {character_name}"}
+            logger.error("[text_to_speech] Unknown character: %s", character_name)
+            return {"success": False, "error": f"未知のキャラクター: {character_name}"}
+
+        preset = self.catalog.preset(character_name)
+        chunks = split_sentences(text)
+        if len(chunks) == 1:
+            return self._speak(text, speaker_id, preset)
+
+        metrics.increment('voicevox.chunked_lines')
+        futures = [_get_chunk_executor().submit(self._speak, chunk, speaker_id, preset) for chunk in chunks]
+        return combine_chunks([future.result() for future in futures])
+
+    async def _get_session(self):
+        """イベントループ上で共有するaiohttpセッション"""
+        import aiohttp
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=VOICEVOX_ASYNC_LIMIT)
+            )
+        return self._session
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(VOICEVOX_ASYNC_LIMIT)
+        return self._semaphore
+
+    async def _post_async(self, path, timeout, as_json=False, **kwargs):
+        """_postのasync版。(ステータス, 200ならJSON/バイト列・それ以外は本文のテキスト) を返す"""
+        import aiohttp
+        if self.pool.needs_recheck():
+            await asyncio.get_running_loop().run_in_executor(None, self.pool.recheck_due)
+        session = await self._get_session()
+        tried = []
+        last_error = None
+        while True:
+            engine = self.pool.acquire(exclude=tried)
+            if engine is None:
+                raise last_error
+            ok = False
+            try:
+                async with session.post(f"{engine.url}{path}", timeout=aiohttp.ClientTimeout(total=timeout),
+                                        **kwargs) as response:
+                    status = response.status
+                    if status == 200:
+                        body = await (response.json() if as_json else response.read())
+                    else:
+                        body = await response.text()
+                ok = True
+                return status, body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                logger.warning("[%s] engine %s failed: %s", path, engine.url, e)
+                metrics.increment('voicevox.failovers')
+                tried.append(engine)
+                last_error = e
+            finally:
+                self.pool.release(engine, ok)
+
+    async def get_audio_query_async(self, text, speaker_id):
+        """get_audio_queryのasync版"""
+        if not AIOHTTP_AVAILABLE:
+            async with self._get_semaphore():
+                return await asyncio.get_running_loop().run_in_executor(None, self.get_audio_query, text, speaker_id)
+        try:
+            params = {"text": text, "speaker": speaker_id}
+            with metrics.timer('voicevox.audio_query'):
+                status, body = await self._post_async("/audio_query", 30, as_json=True, params=params)
+            if status == 200:
+                return {"success": True, "query": body}
+            metrics.increment('voicevox.audio_query.failures')
+            logger.error("[audio_query_async] FAILED - status: %s, body: %.200s", status, body)
+            return {"success": False, "error": f"Status {status}: {body[:100]}"}
+        except Exception as e:
+            logger.exception("[audio_query_async] EXCEPTION: %s", e)
+            return {"success": False, "error": str(e)}
 
-        logger.info(f"[text_to_speech] speaker_id: {speaker_id}")
+    async def synthesize_async(self, query, speaker_id):
+        """synthesizeのasync版"""
+        if not AIOHTTP_AVAILABLE:
+            async with self._get_semaphore():
+                return await asyncio.get_running_loop().run_in_executor(None, self.synthesize, query, speaker_id)
+        try:
+            with metrics.timer('voicevox.synthesis'):
+                status, body = await self._post_async("/synthesis", 60, params={"speaker": speaker_id},
+                                                      data=json.dumps(query), headers={"Content-Type": "application/json"})
+            if status == 200:
+                return {"success": True, "audio": body}
+            metrics.increment('voicevox.synthesis.failures')
+            logger.error("[synthesis_async] FAILED - status: %s, body: %.200s", status, body)
+            return {"success": False, "error": f"Status {status}: {body[:100]}"}
+        except Exception as e:
+            logger.exception("[synthesis_async] EXCEPTION: %s", e)
+            return {"success": False, "error": str(e)}
 
-        # クエリ生成
-        query_result = self.get_audio_query(text, speaker_id)
-        if not query_result["success"]:
-            return query_result
+    async def _speak_async(self, text, speaker_id, preset=None):
+        """_speakのasync版"""
+        for attempt in range(LINE_RETRIES + 1):
+            result = await self.get_audio_query_async(text, speaker_id)
+            if result["success"]:
+                query = result["query"]
+                if preset:
+                    query.update(preset)
+                result = await self.synthesize_async(query, speaker_id)
+                if result["success"]:
+                    result["query"] = query
+                    return result
+            if attempt < LINE_RETRIES:
+                metrics.increment('voicevox.retries')
+                logger.warning("[speak_async] retry %d/%d: %s", attempt + 1, LINE_RETRIES, result["error"])
+                await asyncio.sleep(RETRY_DELAY * (2 ** attempt))
+        return result
+
+    async def text_to_speech_async(self, text, character_name):
+        """text_to_speechのasync版"""
+        speaker_id = self.catalog.speaker_id(character_name)
+        if speaker_id is None:
+            return {"success": False, "error": f"未知のキャラクター: {character_name}"}
+        preset = self.catalog.preset(character_name)
+        chunks = split_sentences(text)
+        if len(chunks) == 1:
+            return await self._speak_async(text, speaker_id, preset)
+        metrics.increment('voicevox.chunked_lines')
+        results = await asyncio.gather(*(self._speak_async(chunk, speaker_id, preset) for chunk in chunks))
+        return combine_chunks(results)
+
+    async def close_async(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _synthesize_batched(self, dialogue, executor):
+        """セリフごとにaudio_queryを作り、合成は話者ごとの /multi_synthesis にまとめる
+
+        HTTPの往復はセリフ数×2から、セリフ数＋バッチ数になる。/multi_synthesis は1リクエスト内を順に合成するので、
+        バッチはワーカー（とエンジン）全部に行き渡る数に分け、話者ごとにクエリがそろった時点で投げる。
+        バッチが失敗したセリフはセリフごとの /synthesis でやり直す。
+        """
+        results = [None] * len(dialogue)
+        presets = {}
+        speakers = {}
+        for n, (_, character, text) in enumerate(dialogue):
+            speaker_id = self.catalog.speaker_id(character)
+            if speaker_id is None:
+                results[n] = {"success": False, "error": f"未知のキャラクター: {character}"}
+                continue
+            if character not in presets:
+                presets[character] = self.catalog.preset(character)
+            speakers.setdefault(speaker_id, []).append((n, character, split_sentences(text)))
+
+        # 話者ごとに続けてクエリを投げる（先の話者のクエリが先にそろう）
+        pending = [(speaker_id, [(n, [executor.submit(self._query, chunk, speaker_id, presets[character]) for chunk in chunks])
+                                 for n, character, chunks in lines])
+                   for speaker_id, lines in speakers.items()]
+        total = sum(len(chunks) for lines in speakers.values() for _, _, chunks in lines)
+        parallel = max(LINE_WORKERS, len(self.pool.engines))
+        batch_size = max(1, min(MULTI_SYNTHESIS_BATCH, -(-total // parallel)))
+
+        queries = {}
+        batches = []
+        for speaker_id, lines in pending:
+            items = []
+            for n, futures in lines:
+                query_results = [future.result() for future in futures]
+                failed = next((r for r in query_results if not r["success"]), None)
+                if failed:
+                    results[n] = failed
+                    continue
+                queries[n] = [r["query"] for r in query_results]
+                items.extend((n, c, query) for c, query in enumerate(queries[n]))
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                future = executor.submit(self.multi_synthesize, [query for _, _, query in batch], speaker_id)
+                batches.append((speaker_id, batch, future))
+
+        audio = {}
+        fallbacks = []
+        for speaker_id, batch, future in batches:
+            result = future.result()
+            if result["success"]:
+                for (n, c, _), wav in zip(batch, result["audio"]):
+                    audio[(n, c)] = {"success": True, "audio": wav}
+            else:
+                fallbacks.extend(((n, c), executor.submit(self._with_retry, self.synthesize, query, speaker_id))
+                                 for n, c, query in batch)
+        for key, future in fallbacks:
+            audio[key] = future.result()
 
-        # 音声合成
-        return self.synthesize(query_result["query"], speaker_id)
+        for n, line_queries in queries.items():
+            chunk_results = [dict(audio[(n, c)], query=query) for c, query in enumerate(line_queries)]
+            results[n] = combine_chunks(chunk_results) if len(chunk_results) > 1 else chunk_results[0]
+        return results
 
-    def generate_skit_audio(self, skit_text, output_dir, char_mapping=None):
+    def generate_skit_audio(self, skit_text, output_dir, char_mapping=None, multi_synthesis=MULTI_SYNTHESIS):
         """コント全体の音声を生成
 
         Args:
             skit_text: コントのテキスト
             output_dir: 出力ディレクトリ
             char_mapping: キャラクター名のマッピング（例: {"A": "ずんだもん", "B": "四国めたん"}）
-        """
-        import re
-
-        logger.info(f"[generate_skit_audio] START - output_dir: {output_dir}")
-        logger.info(f"[generate_skit_audio] char_mapping: {char_mapping}")
-        logger.debug(f"[generate_skit_audio] skit_text:\n{skit_text[:500]}...")
-
-        os.makedirs(output_dir, exist_ok=True)
-
-        # セリフをパース（キャラ名: セリフ の形式）
-        lines = skit_text.strip().split("\n")
-        logger.info(f"[generate_skit_audio] Total lines: {len(lines)}")
-
-        audio_files = []
-        audio_index = 0  # 実際の音声ファイル連番
-
-        for i, line in enumerate(lines):
-            logger.debug(f"[generate_skit_audio] Line {i}: {line[:50]}...")
+            multi_synthesis: 合成を話者ごとの /multi_synthesis にまとめる（非対応のエンジンでは自動でセリフごと）
 
-            # キャラ名: セリフ の形式をパース
-            match = re.match(r'^(.+?)[:：]\s*(.+)$', line)
-            if not match:
-                logger.debug(f"[generate_skit_audio] Line {i}: No match, skipping")
-                continue
-
-            character = match.group(1).strip()
-            text = match.group(2).strip()
-
-            logger.info(f"[generate_skit_audio] Line {i}: character={character}, text={text[:30]}...")
+        失敗したセリフは飛ばして "failed" に入れる。全セリフが失敗した時だけ success=False。
+        """
+        logger.info("[generate_skit_audio] START - output_dir: %s, char_mapping: %s", output_dir, char_mapping)
 
-            # キャラクターマッピングを適用
-            if char_mapping and character in char_mapping:
-                mapped_character = char_mapping[character]
-                logger.info(f"[generate_skit_audio] Line {i}: Mapping '{character}' -> '{mapped_character}'")
-                character = mapped_character
+        clear_skit_audio(output_dir)
 
-            if character not in SPEAKER_IDS:
-                logger.warning(f"[generate_skit_audio] Line {i}: Unknown character '{character}', skipping")
-                continue
+        dialogue = parse_skit_dialogue(skit_text, char_mapping, self.catalog)
 
-            # 音声生成
-            result = self.text_to_speech(text, character)
-            if not result["success"]:
-                logger.error(f"[generate_skit_audio] Line {i}: FAILED - {result['error']}")
-                return {"success": False, "error": f"Line {i+1}: {result['error']}"}
-
-            # ファイル保存（連番を使用）
-            filename = f"{audio_index:03d}_{character}.wav"
-            filepath = os.path.join(output_dir, filename)
-            with open(filepath, "wb") as f:
-                f.write(result["audio"])
-
-            logger.info(f"[generate_skit_audio] Audio {audio_index}: Saved to {filepath}")
-
-            audio_files.append({
-                "file": filepath,
-                "character": character,
-                "text": text
-            })
-            audio_index += 1  # 連番をインクリメント
-
-        # セリフ情報をJSONファイルとして保存
-        import json
-        skit_info_path = os.path.join(output_dir, "skit_info.json")
-        skit_info = []
-        for audio in audio_files:
-            skit_info.append({
-                "file": os.path.basename(audio["file"]),
-                "character": audio["character"],
-                "text": audio["text"]
-            })
-        with open(skit_info_path, "w", encoding="utf-8") as f:
-            json.dump(skit_info, f, ensure_ascii=False, indent=2)
-        logger.info(f"[generate_skit_audio] Saved skit info to {skit_info_path}")
-
-        logger.info(f"[generate_skit_audio] COMPLETE - {len(audio_files)} files generated")
-        return {"success": True, "files": audio_files}
+        # セリフごとに並列で合成し（1本の遅いセリフが全体を待たせない）、保存は元の順番で行う
+        with ThreadPoolExecutor(max_workers=LINE_WORKERS, thread_name_prefix="voicevox-line") as executor:
+            if multi_synthesis and self.multi_synthesis_supported is not False:
+                results = self._synthesize_batched(dialogue, executor)
+            else:
+                futures = [executor.submit(self.text_to_speech, text, character) for _, character, text in dialogue]
+                results = (future.result() for future in futures)
+
+            audio_files = []
+            failed = []
+            for (i, character, text), result in zip(dialogue, results):
+                if not result["success"]:
+                    # 失敗したセリフは飛ばして残りを続ける
+                    logger.error("[generate_skit_audio] Line %d: FAILED - %s", i, result['error'])
+                    failed.append({"line": i + 1, "character": character, "text": text, "error": result["error"]})
+                    continue
+
+                # ファイル保存（連番を使用）
+                audio_files.append(save_line_audio(output_dir, len(audio_files), character, text, result))
+
+        if dialogue and not audio_files:
+            return {"success": False, "error": f"Line {failed[0]['line']}: {failed[0]['error']}", "failed": failed}
+
+        write_skit_info(output_dir, audio_files)
+
+        logger.info("[generate_skit_audio] COMPLETE - %d files generated, %d failed", len(audio_files), len(failed))
+        return {"success": True, "files": audio_files, "failed": failed}
+
+
+_chunk_executor = None
+_chunk_executor_lock = threading.Lock()
+
+
+def _get_chunk_executor():
+    """長いセリフの文を合成するスレッドプール（全インスタンスで共有）"""
+    global _chunk_executor
+    with _chunk_executor_lock:
+        if _chunk_executor is None:
+            _chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="voicevox-chunk")
+        return _chunk_executor
+
+
+def split_sentences(text, max_chars=CHUNK_MAX_CHARS):
+    """長いテキストを文（それでも長い文は読点）で区切り、max_chars以下のかたまりにまとめる
+
+    区切れない長い文はそのまま1かたまりにする。短いテキストは [text] を返す。
+    """
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    for sentence in SENTENCE_PATTERN.findall(text):
+        if len(sentence) > max_chars:
+            pieces.extend(CLAUSE_PATTERN.findall(sentence))
+        else:
+            pieces.append(sentence)
+
+    chunks = []
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if chunks and len(chunks[-1]) + len(piece) <= max_chars:
+            chunks[-1] += piece
+        else:
+            chunks.append(piece)
+    return chunks or [text]
+
+
+def join_wavs(wavs):
+    """同じ形式のWAVを、サンプルをそのまま並べて1つのWAVにする"""
+    if len(wavs) == 1:
+        return wavs[0]
+    params = None
+    frames = []
+    for data in wavs:
+        with wave.open(io.BytesIO(data), "rb") as wf:
+            current = (wf.getnchannels(), wf.getsampwidth(), wf.getframerate())
+            if params is None:
+                params = current
+            elif current != params:
+                raise ValueError(f"WAVの形式が異なります: {params} / {current}")
+            frames.append(wf.readframes(wf.getnframes()))
+
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wf:
+        wf.setnchannels(params[0])
+        wf.setsampwidth(params[1])
+        wf.setframerate(params[2])
+        wf.writeframes(b"".join(frames))
+    return output.getvalue()
+
+
+def merge_queries(queries):
+    """文ごとのaudio_queryを1つにまとめる（口パク用エンベロープをつないだ音声に合わせるため）
+
+    文の境目には、前の文の後ろの無音と次の文の前の無音を合わせた長さのポーズを入れる。
+    """
+    if len(queries) == 1:
+        return queries[0]
+    merged = dict(queries[0])
+    merged["accent_phrases"] = []
+    for i, query in enumerate(queries):
+        scale = query.get("speedScale") or 1.0
+        phrases = [dict(phrase) for phrase in query.get("accent_phrases", [])]
+        if i > 0 and merged["accent_phrases"] and phrases:
+            # 長さはspeedScaleで割って使われるので、まとめたクエリ（先頭の文）のスケールに合わせる
+            gap = (queries[i - 1].get("postPhonemeLength", 0) + query.get("prePhonemeLength", 0)) / scale
+            gap *= merged.get("speedScale") or 1.0
+            previous = merged["accent_phrases"][-1]
+            previous["pause_mora"] = {"text": "、", "consonant": None, "consonant_length": None,
+                                      "vowel": "pau", "vowel_length": gap + ((previous.get("pause_mora") or {}).get("vowel_length") or 0),
+                                      "pitch": 0.0}
+        merged["accent_phrases"].extend(phrases)
+    merged["postPhonemeLength"] = queries[-1].get("postPhonemeLength", merged.get("postPhonemeLength"))
+    return merged
+
+
+def combine_chunks(results):
+    """文ごとの合成結果を1つの結果にまとめる（どれか失敗したらその結果を返す）"""
+    for result in results:
+        if not result["success"]:
+            return result
+    try:
+        audio = join_wavs([result["audio"] for result in results])
+    except (wave.Error, ValueError) as e:
+        logger.error("[combine_chunks] join failed: %s", e)
+        return {"success": False, "error": f"音声の連結に失敗しました: {e}"}
+    return {"success": True, "audio": audio, "query": merge_queries([result["query"] for result in results]),
+            "chunks": len(results)}
+
+
+def parse_skit_dialogue(skit_text, char_mapping=None, catalog=None):
+    """コントを (行番号, キャラクター, セリフ) に分解する
+
+    ト書き（括弧内）は読み上げない。マッピング適用後も未知のキャラのセリフは残し、
+    合成時に失敗として報告させる（黙って飛ばさない）。
+    catalog は合成に使うのと同じキャラクター一覧（省略時は speaker_catalog.get_catalog()）。
+    """
+    catalog = catalog or get_catalog()
+    dialogue = []
+    for line in parse_skit(skit_text.strip()).dialogue:
+        character = line.speaker
+
+        # キャラクターマッピングを適用
+        if char_mapping and character in char_mapping:
+            character = char_mapping[character]
+
+        if catalog.speaker_id(character) is None:
+            logger.warning("[parse_skit_dialogue] Line %d: Unknown character '%s'", line.line_no, character)
+
+        dialogue.append((line.line_no, character, line.text))
+    return dialogue
+
+
+# 出力フォルダに前回の生成で残るファイル（セリフのWAV、口パク用エンベロープ、セリフ情報）
+SKIT_AUDIO_FILE = re.compile(r'^\d+_.+\.(?:wav|env\d+\.npy)$')
+SKIT_INFO_NAME = "skit_info.json"
+
+
+def clear_skit_audio(output_dir):
+    """出力フォルダを作り、前回の生成で残ったファイルを消す
+
+    セリフ数が減ったり途中で失敗したりした時に、古いWAVがプレイヤー（ファイル名から並べる）で再生されないようにする。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name == SKIT_INFO_NAME or SKIT_AUDIO_FILE.match(name):
+            os.remove(os.path.join(output_dir, name))
+
+
+def save_line_audio(output_dir, audio_index, character, text, result):
+    """1セリフ分の音声を連番ファイルとして保存する"""
+    filename = f"{audio_index:03d}_{character}.wav"
+    filepath = os.path.join(output_dir, filename)
+    with open(filepath, "wb") as f:
+        f.write(result["audio"])
+
+    logger.debug("[save_line_audio] Audio %d: Saved to %s", audio_index, filepath, extra={"sampled": True})
+
+    # 口パク用エンベロープをモーラ長から作ってWAVの横にキャッシュ
+    if ENVELOPE_AVAILABLE and result.get("query"):
+        from audio_envelope import envelope_from_query, save_envelope
+        save_envelope(filepath, envelope_from_query(result["query"]))
+
+    return {"file": filepath, "character": character, "text": text}
+
+
+def write_skit_info(output_dir, audio_files):
+    """セリフ情報をJSONファイルとして保存"""
+    skit_info_path = os.path.join(output_dir, SKIT_INFO_NAME)
+    skit_info = []
+    for audio in audio_files:
+        skit_info.append({
+            "file": os.path.basename(audio["file"]),
+            "character": audio["character"],
+            "text": audio["text"]
+        })
+    with open(skit_info_path, "w", encoding="utf-8") as f:
+        json.dump(skit_info, f, ensure_ascii=False, indent=2)
+    logger.info("[write_skit_info] Saved skit info to %s", skit_info_path)
+    return skit_info_path
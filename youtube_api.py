@@ -1,9 +1,86 @@
-﻿import re
-from youtube_transcript_api import YouTubeTranscriptApi
+﻿import asyncio
+import json
+import os
+import re
+import time
+import metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSCRIPT_CACHE_DIR = os.path.join(SCRIPT_DIR, "data", "transcript_cache")
+
+# 字幕の言語の優先順（config.py の TRANSCRIPT_LANGUAGES で変えられる）。
+# 手動字幕 → 自動生成字幕 → 先頭の言語への自動翻訳 の順に探す
+try:
+    from config import TRANSCRIPT_LANGUAGES
+except ImportError:
+    TRANSCRIPT_LANGUAGES = ['ja']
+
+TRACK_MANUAL = 'manual'
+TRACK_GENERATED = 'generated'
+TRACK_TRANSLATED = 'translated'
+
+# 言語の推定用（ひらがな・カタカナ / ハングル）
+KANA_PATTERN = re.compile(r'[\u3040-\u30ff]')
+HANGUL_PATTERN = re.compile(r'[\uac00-\ud7af]')
+
+
+def guess_language(text):
+    """字幕本文から言語をおおまかに推定する（言語コードのない字幕用）"""
+    sample = text[:2000]
+    if not sample.strip():
+        return None
+    if len(KANA_PATTERN.findall(sample)) >= len(sample) * 0.05:
+        return 'ja'
+    if len(HANGUL_PATTERN.findall(sample)) >= len(sample) * 0.05:
+        return 'ko'
+    return None
+
+
+def _translation_codes(transcript):
+    codes = set()
+    for language in getattr(transcript, 'translation_languages', None) or []:
+        code = language.get('language_code') if isinstance(language, dict) else getattr(language, 'language_code', None)
+        if code:
+            codes.add(code)
+    return codes
+
+
+def pick_transcript(transcripts, languages):
+    """字幕の一覧から使う字幕を選び、(字幕, 種類, 翻訳先の言語) を返す。なければ (None, None, None)"""
+    transcripts = list(transcripts)
+    for generated, track in ((False, TRACK_MANUAL), (True, TRACK_GENERATED)):
+        for language in languages:
+            for transcript in transcripts:
+                if transcript.language_code == language and bool(transcript.is_generated) == generated:
+                    return transcript, track, None
+    # 希望の言語がなければ、翻訳できる字幕（手動字幕を優先）を先頭の言語に翻訳する
+    for transcript in sorted(transcripts, key=lambda t: bool(t.is_generated)):
+        if getattr(transcript, 'is_translatable', False):
+            for language in languages:
+                if language in _translation_codes(transcript):
+                    return transcript, TRACK_TRANSLATED, language
+    return None, None, None
+
 
 class YouTubeAPI:
-    def __init__(self):
-        self.api = YouTubeTranscriptApi()
+    def __init__(self, api=None, db=None, cache_dir=None, languages=None):
+        """db・cache_dirを渡すと、字幕は DB → ディスク上の取得結果 → YouTube の順に探す
+
+        languages: 字幕の言語の優先順（省略時はTRANSCRIPT_LANGUAGES）
+        """
+        # api はベンチマーク等で字幕の取得元を差し替える時だけ渡す
+        self._api = api
+        self.db = db
+        self.cache_dir = cache_dir
+        self.languages = list(languages or TRANSCRIPT_LANGUAGES)
+
+    @property
+    def api(self):
+        """youtube_transcript_apiは初回取得時に読み込む"""
+        if self._api is None:
+            from youtube_transcript_api import YouTubeTranscriptApi
+            self._api = YouTubeTranscriptApi()
+        return self._api
 
     def get_video_id(self, url):
         patterns = [r'v=([^&]+)', r'youtu\.be/([^?]+)', r'shorts/([^?]+)']
@@ -13,10 +90,94 @@ class YouTubeAPI:
                 return match.group(1)
         return url
 
-    def fetch_transcript(self, video_id):
+    def _cache_path(self, video_id):
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_-]', '_', video_id) + '.json')
+
+    def _read_cache(self, video_id, max_age):
         try:
-            transcript_list = self.api.fetch(video_id, languages=['ja'])
-            transcript_text = '\n'.join([entry.text for entry in transcript_list])
-            return {'success': True, 'transcript': transcript_text, 'count': len(transcript_list)}
+            with open(self._cache_path(video_id), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if max_age is not None and time.time() - cached.get('fetched_at', 0) > max_age:
+            return None
+        return cached
+
+    def _write_cache(self, video_id, language, track, snippets):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(video_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'video_id': video_id, 'language': language, 'track': track, 'fetched_at': time.time(),
+                       'snippets': snippets}, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def _fetch_remote(self, video_id):
+        """YouTubeから取得し、(言語, 種類, [{text, start, duration}]) を返す
+
+        字幕の一覧を1回取得してから選ぶので、言語ごとに取得を試して失敗を重ねることはない。
+        """
+        if hasattr(self.api, 'list'):
+            transcripts = self.api.list(video_id)
+            transcript, track, target = pick_transcript(transcripts, self.languages)
+            if transcript is None:
+                available = ', '.join(f"{t.language_code}{'(自動)' if t.is_generated else ''}" for t in transcripts)
+                raise LookupError(f"{'/'.join(self.languages)} の字幕がありません（あるのは: {available or 'なし'}）")
+            if target:
+                transcript = transcript.translate(target)
+            fetched = transcript.fetch()
+            language = target or transcript.language_code
+        else:
+            # 一覧を取れない取得元（古いyoutube_transcript_apiや代役）
+            fetched = self.api.fetch(video_id, languages=self.languages)
+            language, track = getattr(fetched, 'language_code', None), None
+        metrics.increment(f'youtube.transcript_track.{track or "unknown"}')
+        snippets = [{'text': s.text, 'start': getattr(s, 'start', None), 'duration': getattr(s, 'duration', None)}
+                    for s in fetched]
+        if language is None:
+            language = guess_language('\n'.join(s['text'] for s in snippets))
+        return language, track, snippets
+
+    @metrics.timed('youtube.fetch_transcript')
+    def fetch_transcript(self, video_id, force_refresh=False, max_age=None):
+        """字幕を取得する。force_refreshなら手元の字幕を使わずに取り直す
+
+        max_age（秒）を指定すると、それより古いディスク上の取得結果は使わない。
+        結果の source は 'db' / 'cache' / 'network' のいずれか。
+        """
+        if not force_refresh:
+            if self.db is not None:
+                row = self.db.get_transcript_by_youtube_id(video_id)
+                if row and row['content']:
+                    metrics.increment('youtube.transcript_cache.db_hits')
+                    return {'success': True, 'transcript': row['content'], 'count': row['content'].count('\n') + 1,
+                            'language': row['language'], 'track': row['track'], 'source': 'db'}
+            if self.cache_dir:
+                cached = self._read_cache(video_id, max_age)
+                if cached:
+                    metrics.increment('youtube.transcript_cache.disk_hits')
+                    snippets = cached['snippets']
+                    return {'success': True, 'transcript': '\n'.join(s['text'] for s in snippets),
+                            'count': len(snippets), 'language': cached.get('language'), 'track': cached.get('track'),
+                            'source': 'cache'}
+        metrics.increment('youtube.transcript_cache.misses')
+        try:
+            language, track, snippets = self._fetch_remote(video_id)
         except Exception as e:
+            metrics.increment('youtube.fetch_transcript.failures')
             return {'success': False, 'error': str(e)}
+        if self.cache_dir:
+            try:
+                self._write_cache(video_id, language, track, snippets)
+            except OSError:
+                pass
+        transcript_text = '\n'.join(s['text'] for s in snippets)
+        return {'success': True, 'transcript': transcript_text, 'count': len(snippets), 'language': language,
+                'track': track, 'source': 'network'}
+
+    async def fetch_transcript_async(self, video_id, force_refresh=False):
+        """fetch_transcriptのasync版（youtube_transcript_apiは同期APIのため共有I/Oスレッドプールで実行）"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch_transcript, video_id, force_refresh)
+
+    async def fetch_transcripts_async(self, video_ids, force_refresh=False):
+        """複数動画の字幕を並行取得する"""
+        return await asyncio.gather(*[self.fetch_transcript_async(v, force_refresh) for v in video_ids])